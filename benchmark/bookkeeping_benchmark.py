@@ -0,0 +1,145 @@
+'''
+Per-step cost of the bookkeeping of StrSumo.run (everything but make_decisions and the simulation
+step itself) for 1k to 100k vehicles in the simulation, on a synthetic TraCI stand-in registered as
+the "stub" simulation backend: all vehicles are in the simulation from the start, MOVE_FRACTION of
+them change edges every step and DEPARTURES_PER_STEP leave and enter. NUM_CONTROLLED of them are
+controlled; the route controller returns no decisions.
+
+Compared are the subscription based state tracking only the controlled vehicles (the default), the
+subscription based state subscribed to every vehicle (as StrSumo did before), the polling state,
+the local edge counts (local_edge_counts: every vehicle subscribed to its road instead of every edge
+to its vehicle number) and a controller that does not use the edge counts at all. Run from the main repository:
+    python benchmark/bookkeeping_benchmark.py [net file] [number of vehicles ...]
+'''
+import contextlib
+import os
+import random
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# only sumolib and traci are imported, no SUMO installation is needed
+os.environ.setdefault("SUMO_HOME", "")
+import traci.constants as tc
+from core.Util import ConnectionInfo, Vehicle
+from core.profiling import StepProfiler
+from core.simulation_backend import register_backend, use_backend
+from core.state_sync import TraciStateSync
+from core.STR_SUMO import StrSumo
+from controller.RouteController import RouteController
+
+NET_FILE = "./configurations/maps/test.net.xml"
+VEHICLE_COUNTS = [1000, 10000, 100000]
+NUM_CONTROLLED = 100
+NUM_STEPS = 50
+MOVE_FRACTION = 0.01
+DEPARTURES_PER_STEP = 10
+BOOKKEEPING_PHASES = ["state_update", "edge_counts", "vehicle_scan", "change_target", "arrivals"]
+MODES = ["tracked", "all", "polling", "local", "no counts"]
+
+
+class FleetStub:
+    """
+    TraCI stand-in with num_vehicles vehicles on random edges of edge_list, offering the calls of
+    StrSumo.run and core/state_sync.py.
+    """
+    def __init__(self, edge_list, num_vehicles, num_steps, seed=0):
+        self.rng = random.Random(seed)
+        self.edge_list = edge_list
+        self.num_steps = num_steps
+        self.time = 0.0
+        self.road_ids = {str(i): self.rng.choice(edge_list) for i in range(num_vehicles)}
+        self.next_id = num_vehicles
+        self.counts = dict.fromkeys(edge_list, 0)
+        for edge in self.road_ids.values():
+            self.counts[edge] += 1
+        self.departed = list(self.road_ids)
+        self.arrived = []
+        self.vehicle_subscriptions = set()
+        self.simulation = _Namespace(
+            subscribe=lambda variables, begin=None, end=None: None, getSubscriptionResults=self.simulation_results,
+            getMinExpectedNumber=lambda: len(self.road_ids) if self.time < self.num_steps else 0,
+            getTime=lambda: self.time, getArrivedIDList=lambda: tuple(self.arrived))
+        self.vehicle = _Namespace(
+            getIDList=lambda: tuple(self.road_ids), getIDCount=lambda: len(self.road_ids),
+            subscribe=lambda vehicle_id, variables, begin=None, end=None: self.vehicle_subscriptions.add(vehicle_id),
+            getAllSubscriptionResults=self.vehicle_results, getRoadID=self.road_ids.__getitem__,
+            getSpeed=lambda vehicle_id: 10.0, getMaxSpeed=lambda vehicle_id: 30.0,
+            setColor=lambda vehicle_id, color: None, changeTarget=lambda vehicle_id, edge: None)
+        self.edge = _Namespace(
+            subscribe=lambda edge, variables, begin=None, end=None: None, getAllSubscriptionResults=self.edge_results,
+            getLastStepVehicleNumber=self.counts.__getitem__)
+
+    def simulation_results(self):
+        return {tc.VAR_TIME: self.time, tc.VAR_DEPARTED_VEHICLES_IDS: tuple(self.departed),
+                tc.VAR_ARRIVED_VEHICLES_IDS: tuple(self.arrived)}
+
+    def vehicle_results(self):
+        return {vehicle_id: {tc.VAR_ROAD_ID: self.road_ids[vehicle_id], tc.VAR_SPEED: 10.0, tc.VAR_MAXSPEED: 30.0}
+                for vehicle_id in self.vehicle_subscriptions}
+
+    def edge_results(self):
+        return {edge: {tc.LAST_STEP_VEHICLE_NUMBER: count} for edge, count in self.counts.items()}
+
+    def simulationStep(self, step=0.0):
+        rng = self.rng
+        vehicle_ids = list(self.road_ids)
+        for vehicle_id in rng.sample(vehicle_ids, int(len(vehicle_ids) * MOVE_FRACTION)):
+            self.counts[self.road_ids[vehicle_id]] -= 1
+            self.road_ids[vehicle_id] = rng.choice(self.edge_list)
+            self.counts[self.road_ids[vehicle_id]] += 1
+        # the first NUM_CONTROLLED vehicles stay
+        self.arrived = rng.sample(vehicle_ids[NUM_CONTROLLED:], DEPARTURES_PER_STEP)
+        for vehicle_id in self.arrived:
+            self.counts[self.road_ids.pop(vehicle_id)] -= 1
+            self.vehicle_subscriptions.discard(vehicle_id)
+        self.departed = []
+        for _ in range(DEPARTURES_PER_STEP):
+            vehicle_id = str(self.next_id)
+            self.next_id += 1
+            self.road_ids[vehicle_id] = rng.choice(self.edge_list)
+            self.counts[self.road_ids[vehicle_id]] += 1
+            self.departed.append(vehicle_id)
+        self.time += 1.0
+
+
+class _Namespace:
+    def __init__(self, **functions):
+        self.__dict__.update(functions)
+
+
+class NoDecisions(RouteController):
+    def make_decisions(self, vehicles, connection_info):
+        return {}
+
+
+class NoDecisionsWithoutCounts(NoDecisions):
+    uses_edge_counts = False
+
+
+def bookkeeping_time(connection_info, num_vehicles, mode):
+    """
+    :param mode: one of MODES
+    :return: mean seconds per step of the bookkeeping phases
+    """
+    stub = FleetStub(connection_info.edge_list, num_vehicles, NUM_STEPS)
+    register_backend("stub", stub)
+    use_backend("stub")
+    controlled = {str(i): Vehicle(str(i), connection_info.edge_list[0], 0.0, 1000.0) for i in range(NUM_CONTROLLED)}
+    profiler = StepProfiler()
+    controller = NoDecisionsWithoutCounts(connection_info) if mode == "no counts" else NoDecisions(connection_info)
+    simulation = StrSumo(controller, connection_info, controlled, use_subscriptions=mode != "polling",
+                         summary_file=os.devnull, verbose=False, profiler=profiler, local_edge_counts=mode == "local")
+    if mode == "all":
+        simulation.state = connection_info.state_sync = TraciStateSync(connection_info.edge_list)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        simulation.run()
+    return sum(profiler.phases[phase].summary()["mean"] for phase in BOOKKEEPING_PHASES) * 1e-9
+
+
+if __name__ == "__main__":
+    net_file = sys.argv[1] if len(sys.argv) > 1 else NET_FILE
+    counts = [int(count) for count in sys.argv[2:]] or VEHICLE_COUNTS
+    connection_info = ConnectionInfo(net_file)
+    print("{:>10}".format("vehicles") + "".join("{:>16}".format(mode + " ms") for mode in MODES))
+    for num_vehicles in counts:
+        row = [bookkeeping_time(connection_info, num_vehicles, mode) * 1e3 for mode in MODES]
+        print("{:>10}".format(num_vehicles) + "".join("{:16.3f}".format(value) for value in row))
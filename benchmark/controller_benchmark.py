@@ -0,0 +1,286 @@
+'''
+Throughput and latency of RouteController.make_decisions without SUMO: the maps are loaded into
+ConnectionInfo, and every call gets a synthetic batch of vehicles (random sources with a
+reachable destination) after a synthetic edge-count snapshot has been stored with
+set_edge_vehicle_counts, the way StrSumo does it every step. The values the controllers read from
+the simulation (time, vehicle count, maximum speeds) come from SyntheticState, set as
+connection_info.state_sync and registered as the "stub" simulation backend for controllers
+calling traci directly.
+
+Measured for DijkstraPolicy, RandomPolicy and MikeGorithm per map and batch size, and for
+RouteController.compute_local_target on the shortest-path decision lists. The route plan cache of
+the controllers is off: the synthetic vehicles never move, so every plan would be reused and
+make_decisions would not search at all. The results are written
+as json; with --compare the medians are checked against an earlier result file and the script
+exits with 1 if one got slower than --tolerance. Run from the main repository:
+    python benchmark/controller_benchmark.py [--output results.json] [--compare baseline.json]
+'''
+import contextlib
+import glob
+import json
+import optparse
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# only sumolib and traci are imported, no SUMO installation is needed
+os.environ.setdefault("SUMO_HOME", "")
+from core.Util import ConnectionInfo, Vehicle
+from core.profiling import Histogram
+from core.shortest_path_engine import INFINITY, ShortestPathEngine, get_routing_graph
+from core.simulation_backend import register_backend, use_backend
+from controller.RouteController import RandomPolicy
+from controller.DijkstraController import DijkstraPolicy
+from controller.myAlgo import MikeGorithm
+
+MAPS = sorted(glob.glob("./configurations/maps/*.net.xml"))
+CONTROLLERS = {"dijkstra": lambda connection_info: DijkstraPolicy(connection_info, plan_cache=False),
+               "random": RandomPolicy,
+               "mike": lambda connection_info: MikeGorithm(connection_info, plan_drift_threshold=None)}
+BATCH_SIZES = [1, 16, 128]
+LOCAL_TARGET = "compute_local_target"
+
+
+class SyntheticState:
+    """
+    Stands in for core.state_sync.TraciStateSync, and through the namespaces simulation, vehicle
+    and edge for the traci calls of the controllers.
+    :param edge_list: [edge_id] in the order of the counts given to set_counts
+    """
+    def __init__(self, edge_list):
+        self.edge_list = edge_list
+        self.time = 0.0
+        self.vehicle_ids = set()
+        self.vehicle_road_ids = {}
+        self.vehicle_speeds = {}
+        self.vehicle_max_speeds = {}
+        self.edge_vehicle_counts = {}
+        self.simulation = _Namespace(getTime=lambda: self.time)
+        self.vehicle = _Namespace(getIDCount=lambda: len(self.vehicle_ids), getIDList=lambda: list(self.vehicle_ids),
+                                  getRoadID=self.road_id, getSpeed=self.speed, getMaxSpeed=self.max_speed)
+        self.edge = _Namespace(getLastStepVehicleNumber=self.edge_vehicle_count)
+
+    def add_vehicles(self, vehicles, max_speeds):
+        for vehicle, max_speed in zip(vehicles, max_speeds):
+            self.vehicle_ids.add(vehicle.vehicle_id)
+            self.vehicle_road_ids[vehicle.vehicle_id] = vehicle.current_edge
+            self.vehicle_speeds[vehicle.vehicle_id] = vehicle.current_speed
+            self.vehicle_max_speeds[vehicle.vehicle_id] = max_speed
+
+    def set_counts(self, counts):
+        self.edge_vehicle_counts = dict(zip(self.edge_list, counts.tolist()))
+
+    def road_id(self, vehicle_id):
+        return self.vehicle_road_ids[vehicle_id]
+
+    def speed(self, vehicle_id):
+        return self.vehicle_speeds[vehicle_id]
+
+    def max_speed(self, vehicle_id):
+        return self.vehicle_max_speeds[vehicle_id]
+
+    def edge_vehicle_count(self, edge_id):
+        return self.edge_vehicle_counts.get(edge_id, 0)
+
+
+class _Namespace:
+    def __init__(self, **functions):
+        self.__dict__.update(functions)
+
+
+def synthetic_vehicles(connection_info, count, rng):
+    """
+    :return: [Vehicle] on random edges, each with a destination reachable from its edge
+    """
+    graph = get_routing_graph(connection_info)
+    engine = ShortestPathEngine(graph)
+    edge_list = connection_info.edge_list
+    vehicles = []
+    while len(vehicles) < count:
+        destination = edge_list[rng.randint(len(edge_list))]
+        distance = engine.reverse_tree(graph.edge_index_dict[destination]).distance
+        sources = [edge for edge in edge_list
+                   if edge != destination and distance[graph.edge_index_dict[edge]] != INFINITY]
+        if not sources:
+            continue
+        for _ in range(min(8, count - len(vehicles))):
+            vehicle = Vehicle("synthetic_{}".format(len(vehicles)), destination, 0.0, float(rng.randint(100, 1000)))
+            vehicle.current_edge = sources[rng.randint(len(sources))]
+            vehicle.current_speed = float(rng.uniform(0.0, 15.0))
+            vehicles.append(vehicle)
+    return vehicles
+
+
+def count_snapshots(num_edges, steps, changed_fraction, rng):
+    """
+    :return: [NumPy array of vehicle counts in edge_list order], one per step; changed_fraction of
+             the edges change by one vehicle from one step to the next
+    """
+    counts = rng.poisson(2.0, num_edges).astype(np.int64)
+    snapshots = []
+    for _ in range(steps):
+        changed = rng.randint(num_edges, size=max(1, int(num_edges * changed_fraction)))
+        counts = counts.copy()
+        counts[changed] = np.maximum(counts[changed] + rng.choice([-1, 1], size=len(changed)), 0)
+        snapshots.append(counts)
+    return snapshots
+
+
+def summarize(map_file, controller, batch_size, latency, num_vehicles):
+    summary = latency.summary()
+    return {"map": os.path.basename(map_file), "controller": controller, "batch_size": batch_size,
+            "calls": summary["count"], "vehicles": num_vehicles,
+            "latency_ns": {"mean": summary["mean"], "min": summary["min"], "max": summary["max"],
+                           "percentiles": summary["percentiles"]},
+            "vehicles_per_second": num_vehicles / (summary["total"] * 1e-9) if summary["total"] else None}
+
+
+def benchmark_controller(name, map_file, batch_size, steps, changed_fraction, seed):
+    """
+    Runs make_decisions of a fresh controller on steps batches of batch_size vehicles.
+    :return: result row, see summarize
+    """
+    rng = np.random.RandomState(seed)
+    random.seed(seed)  # RandomPolicy
+    connection_info = ConnectionInfo(map_file)
+    state = SyntheticState(connection_info.edge_list)
+    connection_info.state_sync = state
+    register_backend("stub", state)
+    use_backend("stub")
+    pool = synthetic_vehicles(connection_info, max(4 * batch_size, 64), rng)
+    state.add_vehicles(pool, rng.uniform(10.0, 30.0, len(pool)).tolist())
+    snapshots = count_snapshots(len(connection_info.edge_list), steps, changed_fraction, rng)
+    controller = CONTROLLERS[name](connection_info)
+    latency = Histogram()
+    num_vehicles = 0
+    # RandomPolicy prints every vehicle
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for step, counts in enumerate(snapshots):
+            state.time = float(step)
+            state.set_counts(counts)
+            connection_info.set_edge_vehicle_counts(counts)
+            batch = [pool[i] for i in rng.choice(len(pool), batch_size, replace=False)]
+            start = time.perf_counter_ns()
+            controller.make_decisions(batch, connection_info)
+            latency.record(time.perf_counter_ns() - start)
+            num_vehicles += batch_size
+    return summarize(map_file, name, batch_size, latency, num_vehicles)
+
+
+def benchmark_local_target(map_file, calls, seed):
+    """
+    Runs compute_local_target on the shortest-path decision lists of synthetic vehicles.
+    :return: result row with batch_size 1, see summarize
+    """
+    rng = np.random.RandomState(seed)
+    connection_info = ConnectionInfo(map_file)
+    controller = DijkstraPolicy(connection_info)
+    graph = controller.router.graph
+    pool = synthetic_vehicles(connection_info, 256, rng)
+    decision_lists = []
+    for vehicle in pool:
+        _, arcs = controller.router.search(graph.edge_index_dict[vehicle.current_edge],
+                                           graph.edge_index_dict[vehicle.destination])
+        decision_lists.append(graph.arcs_to_directions(arcs) if arcs is not None else [])
+    latency = Histogram()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(calls):
+            vehicle = pool[i % len(pool)]
+            decision_list = decision_lists[i % len(pool)]
+            start = time.perf_counter_ns()
+            controller.compute_local_target(decision_list, vehicle)
+            latency.record(time.perf_counter_ns() - start)
+    return summarize(map_file, LOCAL_TARGET, 1, latency, calls)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(maps, controllers, batch_sizes, steps, changed_fraction, seed):
+    """
+    :return: {"commit", "python", "numpy", "platform", "settings", "results": [result row]}
+    """
+    results = []
+    for map_file in maps:
+        for name in controllers:
+            for batch_size in batch_sizes:
+                results.append(benchmark_controller(name, map_file, batch_size, steps, changed_fraction, seed))
+                print_row(results[-1])
+        results.append(benchmark_local_target(map_file, steps * max(batch_sizes), seed))
+        print_row(results[-1])
+    return {"commit": git_commit(), "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(),
+            "settings": {"steps": steps, "changed_fraction": changed_fraction, "seed": seed},
+            "results": results}
+
+
+def print_row(row):
+    percentiles = row["latency_ns"]["percentiles"]
+    print("{:28}{:22}{:>6}{:12.1f}{:12.1f}{:12.1f}{:14.0f}".format(
+        row["map"], row["controller"], row["batch_size"], percentiles["50"] / 1000.0, percentiles["90"] / 1000.0,
+        percentiles["99"] / 1000.0, row["vehicles_per_second"]))
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: [(map, controller, batch size, ratio of the medians)] of the rows slower than baseline by more than tolerance
+    """
+    key = lambda row: (row["map"], row["controller"], row["batch_size"])
+    baseline_rows = {key(row): row for row in baseline["results"]}
+    regressions = []
+    for row in results["results"]:
+        old = baseline_rows.get(key(row))
+        if old is None:
+            continue
+        ratio = row["latency_ns"]["percentiles"]["50"] / max(old["latency_ns"]["percentiles"]["50"], 1)
+        print("{:28}{:22}{:>6}{:10.2f}x".format(row["map"], row["controller"], row["batch_size"], ratio))
+        if ratio > 1.0 + tolerance:
+            regressions.append(key(row) + (ratio,))
+    return regressions
+
+
+def get_options():
+    opt_parser = optparse.OptionParser()
+    opt_parser.add_option("--map", action="append", dest="maps", default=None,
+                          help="net file to measure, repeat for several (default: configurations/maps)")
+    opt_parser.add_option("--controller", action="append", dest="controllers", default=None,
+                          help="one of {} (default: all)".format(", ".join(CONTROLLERS)))
+    opt_parser.add_option("--steps", type="int", dest="steps", default=200,
+                          help="calls of make_decisions per controller, map and batch size")
+    opt_parser.add_option("--changed-fraction", type="float", dest="changed_fraction", default=0.05,
+                          help="fraction of the edges whose vehicle count changes between two calls")
+    opt_parser.add_option("--seed", type="int", dest="seed", default=0)
+    opt_parser.add_option("--output", dest="output", default="controller_benchmark.json",
+                          help="json file the results are written to")
+    opt_parser.add_option("--compare", dest="compare", default=None,
+                          help="json file of an earlier run to compare the median latencies with")
+    opt_parser.add_option("--tolerance", type="float", dest="tolerance", default=0.2,
+                          help="allowed slowdown of the median latency with --compare")
+    options, args = opt_parser.parse_args()
+    return options
+
+
+if __name__ == "__main__":
+    options = get_options()
+    print("{:28}{:22}{:>6}{:>12}{:>12}{:>12}{:>14}".format("map", "controller", "batch", "p50 us", "p90 us",
+                                                          "p99 us", "vehicles/s"))
+    results = run_benchmarks(options.maps or MAPS, options.controllers or list(CONTROLLERS), BATCH_SIZES,
+                             options.steps, options.changed_fraction, options.seed)
+    with open(options.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("results written to {}".format(options.output))
+    if options.compare is not None:
+        with open(options.compare) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        if regressions:
+            print("slower than {} by more than {:.0%}: {}".format(options.compare, options.tolerance, regressions))
+            sys.exit(1)
@@ -0,0 +1,103 @@
+'''
+Time and peak Python memory (tracemalloc) of writing the route file of a run:
+    - streaming: core/demand_generation.py, random trips merged with the controlled vehicles in one pass
+    - minidom: the previous insertion of the controlled vehicles into the parsed background route
+      file followed by toprettyxml, without generating the background file (randomTrips.py before);
+      quadratic, so only run up to MAX_MINIDOM vehicles
+Run from the main repository:
+    python benchmark/demand_benchmark.py [net file] [number of background vehicles ...]
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.dom.minidom
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from core.Util import ConnectionInfo
+from core import demand_generation
+
+NET_FILE = "./configurations/maps/test.net.xml"
+VEHICLE_COUNTS = [1000, 10000, 100000]
+MAX_MINIDOM = 10000
+NUM_CONTROLLED = 100
+LATEST_RELEASE_TIME = 50.0
+
+
+def controlled_vehicles(connection_info, first_id):
+    rng = random.Random(1)
+    release_period = LATEST_RELEASE_TIME / NUM_CONTROLLED
+    return [(str(first_id + i), i * release_period, str(i * release_period), [rng.choice(connection_info.edge_list)])
+            for i in range(NUM_CONTROLLED)]
+
+
+def streaming(connection_info, num_vehicles, route_file):
+    period = LATEST_RELEASE_TIME / num_vehicles
+    background = demand_generation.random_trips(connection_info, 0.0, LATEST_RELEASE_TIME, period, random.Random(0))
+    controlled = controlled_vehicles(connection_info, demand_generation.trip_count(0.0, LATEST_RELEASE_TIME, period))
+    demand_generation.write_route_file(route_file, demand_generation.merge_by_depart(background, controlled))
+
+
+def minidom(connection_info, background_file, route_file):
+    # the loop of the previous generate_vehicles
+    doc = xml.dom.minidom.parse(background_file)
+    root = doc.documentElement
+    vs = root.getElementsByTagName("vehicle")
+    index = 0
+    id_now = int(vs.item(len(vs) - 1).getAttribute('id')) + 1
+    for vehicle_id, release_time, depart_text, edges in controlled_vehicles(connection_info, id_now):
+        for i in range(index, len(vs)):
+            if float(vs.item(i).getAttribute('depart')) <= release_time:
+                index = i
+            else:
+                break
+        temp_v = doc.createElement('vehicle')
+        temp_v.setAttribute('depart', depart_text)
+        temp_v.setAttribute('id', vehicle_id)
+        temp_r = doc.createElement('route')
+        temp_r.setAttribute('edges', edges[0])
+        temp_v.appendChild(temp_r)
+        if index == len(vs) - 1:
+            root.appendChild(temp_v)
+        else:
+            root.insertBefore(temp_v, vs[index + 1])
+        vs = root.getElementsByTagName("vehicle")
+    with open(route_file, 'w') as f:
+        f.write(doc.toprettyxml())
+
+
+def measure(function, *args):
+    """
+    :return: (seconds, peak bytes), from two runs since tracemalloc slows the run down
+    """
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    net_file = sys.argv[1] if len(sys.argv) > 1 else NET_FILE
+    counts = [int(count) for count in sys.argv[2:]] or VEHICLE_COUNTS
+    connection_info = ConnectionInfo(net_file)
+    print("{:>10}{:>16}{:>16}{:>16}{:>16}".format("vehicles", "streaming s", "streaming MB", "minidom s", "minidom MB"))
+    with tempfile.TemporaryDirectory() as directory:
+        for num_vehicles in counts:
+            streaming_time, streaming_peak = measure(streaming, connection_info, num_vehicles,
+                                                     os.path.join(directory, "streamed.rou.xml"))
+            row = "{:>10}{:16.3f}{:16.1f}".format(num_vehicles, streaming_time, streaming_peak / 1e6)
+            if num_vehicles <= MAX_MINIDOM:
+                # the background vehicles alone, as written by randomTrips.py before
+                background_file = os.path.join(directory, "background.rou.xml")
+                period = LATEST_RELEASE_TIME / num_vehicles
+                demand_generation.write_route_file(background_file, demand_generation.random_trips(
+                    connection_info, 0.0, LATEST_RELEASE_TIME, period, random.Random(0)))
+                minidom_time, minidom_peak = measure(minidom, connection_info, background_file,
+                                                     os.path.join(directory, "minidom.rou.xml"))
+                row += "{:16.3f}{:16.1f}".format(minidom_time, minidom_peak / 1e6)
+            print(row)
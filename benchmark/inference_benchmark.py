@@ -0,0 +1,73 @@
+'''
+Latency of the Q-learning model: Keras vs. the NumPy runtime of core/numpy_model.py, for the
+model shipped in test/ and the batch sizes seen by QLearningPolicy (one vehicle per call in the
+sequential mode, all deciding vehicles per call in the batched mode). Keras is only measured when
+it is installed. Run from the main repository:
+    python benchmark/inference_benchmark.py [repetitions]
+'''
+import importlib.util
+import os
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from core.numpy_model import NumpyModel, PRECISIONS, load_numpy_model, save_numpy_model
+
+KERAS_MODEL = "./test/rl-high-all-fixed-late.h5"
+NUMPY_MODEL = "./test/rl-high-all-fixed-late.npz"
+BATCH_SIZES = [1, 16, 128]
+
+
+def measure(predict, states, repetitions):
+    predict(states)  # warm up
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        predict(states)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def random_states(count):
+    rng = np.random.RandomState(0)
+    states = rng.rand(count, 154) * 0.2
+    states[:, 0] = rng.randint(0, 708, count)
+    states[:, 1:7] = rng.randint(0, 2, (count, 6))
+    return states
+
+
+if __name__ == "__main__":
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    models = {}
+    start = time.perf_counter()
+    reference = load_numpy_model(NUMPY_MODEL)
+    print("numpy load:     {:8.1f} ms".format((time.perf_counter() - start) * 1000))
+    layers = [(kind, kernel, bias, activation.__name__, float(alpha))
+              for kind, kernel, bias, activation, alpha in reference.layers]
+    with tempfile.TemporaryDirectory() as directory:
+        for precision in PRECISIONS:
+            weights_file = os.path.join(directory, precision + ".npz")
+            save_numpy_model(layers, weights_file, precision)
+            models["numpy " + precision] = load_numpy_model(weights_file).predict
+            print("{:8} file:  {:8.1f} kB".format(precision, os.path.getsize(weights_file) / 1024))
+
+    if importlib.util.find_spec("keras") is not None:
+        start = time.perf_counter()
+        from keras.models import load_model
+        keras_model = load_model(KERAS_MODEL, compile=False)
+        print("keras import and load: {:8.1f} ms".format((time.perf_counter() - start) * 1000))
+        if len(keras_model.input_shape) == 3:
+            # legacy .h5 files load with an extra time axis in Keras 3
+            models["keras"] = lambda states: keras_model.predict(states[:, None, :], verbose=0)[:, 0, :]
+        else:
+            models["keras"] = lambda states: keras_model.predict(states, verbose=0)
+    else:
+        print("keras is not installed, measuring the NumPy runtime only")
+
+    print("median latency per call in ms, {} repetitions".format(repetitions))
+    print("{:16}".format("batch size") + "".join("{:>10}".format(b) for b in BATCH_SIZES))
+    for name, predict in models.items():
+        latencies = [measure(predict, random_states(b), repetitions) * 1000 for b in BATCH_SIZES]
+        print("{:16}".format(name) + "".join("{:10.3f}".format(latency) for latency in latencies))
@@ -0,0 +1,103 @@
+'''
+Wall time of a StrSumo run with DijkstraPolicy on the queue-based simulator of
+core/meso_simulator.py, and on SUMO through traci when a sumo binary is found (SUMO_HOME/bin or
+PATH), with the same random route file. Also times the simulator alone, without StrSumo.
+Run from the main repository:
+    python benchmark/meso_benchmark.py [net file] [number of vehicles]
+'''
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from core.Util import ConnectionInfo, Vehicle
+from core.shortest_path_engine import ShortestPathEngine, get_routing_graph
+from core.meso_simulator import MesoSimulation
+from core.simulation_backend import traci, use_backend, MESO, TRACI
+from core.STR_SUMO import StrSumo
+from controller.DijkstraController import DijkstraPolicy
+from sumolib import checkBinary
+
+NET_FILE = "./configurations/maps/test.net.xml"
+NUM_CONTROLLED = 20
+LATEST_DEPART = 50.0
+
+
+def write_routes(route_file, connection_info, num_vehicles, seed=0, num_controlled=NUM_CONTROLLED,
+                 latest_depart=LATEST_DEPART):
+    """
+    Random routes departing within latest_depart seconds; num_controlled vehicles spread over the
+    departures only get their start edge, like the controlled vehicles of target_vehicles_generator.
+    :return: {vehicle_id: Vehicle} of the controlled vehicles
+    """
+    rng = random.Random(seed)
+    graph = get_routing_graph(connection_info)
+    engine = ShortestPathEngine(graph)
+    controlled = {}
+    with open(route_file, 'w') as f:
+        f.write("<routes>\n")
+        i = 0
+        while i < num_vehicles:
+            source, destination = rng.sample(connection_info.edge_list, 2)
+            _, arcs = engine.search(graph.edge_index_dict[source], graph.edge_index_dict[destination])
+            if arcs is None:
+                continue
+            depart = i * latest_depart / num_vehicles
+            if i % (num_vehicles // num_controlled) == 0 and len(controlled) < num_controlled:
+                route = [source]
+                controlled[str(i)] = Vehicle(str(i), destination, depart, rng.randint(500, 1000))
+            else:
+                route = graph.arcs_to_edges(graph.edge_index_dict[source], arcs)
+            f.write('    <vehicle id="{}" depart="{:.2f}">\n        <route edges="{}"/>\n    </vehicle>\n'.format(
+                i, depart, " ".join(route)))
+            i += 1
+        f.write("</routes>\n")
+    return controlled
+
+
+def time_str_sumo(backend, sumo_command, net_file, route_file, num_vehicles, directory):
+    connection_info = ConnectionInfo(net_file)
+    # rewritten with the same seed for fresh controlled vehicles
+    vehicles = write_routes(route_file, connection_info, num_vehicles)
+    use_backend(backend)
+    simulation = StrSumo(DijkstraPolicy(connection_info), connection_info, vehicles,
+                         summary_file=os.path.join(directory, "data.csv"), verbose=False)
+    start = time.perf_counter()
+    traci.start(sumo_command)
+    try:
+        result = simulation.run()
+    finally:
+        traci.close()
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    net_file = sys.argv[1] if len(sys.argv) > 1 else NET_FILE
+    num_vehicles = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "benchmark.rou.xml")
+        write_routes(route_file, ConnectionInfo(net_file), num_vehicles)
+        simulation = MesoSimulation(ConnectionInfo(net_file), [route_file])
+        start = time.perf_counter()
+        steps = 0
+        while simulation.min_expected_number() > 0:
+            simulation.step()
+            steps += 1
+        elapsed = time.perf_counter() - start
+        print("meso alone:    {:8.3f} s, {} steps, {:8.0f} steps/s, {} teleports".format(
+            elapsed, steps, steps / elapsed, simulation.teleports))
+
+        sumo_command = [checkBinary('sumo'), "-n", net_file, "-r", route_file, "--no-step-log", "true"]
+        meso_time, meso_result = time_str_sumo(MESO, sumo_command, net_file, route_file, num_vehicles,
+                                              directory)
+        print("StrSumo meso:  {:8.3f} s, (total time, arrived, deadlines missed) = {}".format(meso_time, meso_result))
+        if shutil.which(sumo_command[0]) is not None:
+            sumo_time, sumo_result = time_str_sumo(TRACI, sumo_command, net_file, route_file, num_vehicles,
+                                                  directory)
+            print("StrSumo SUMO:  {:8.3f} s, (total time, arrived, deadlines missed) = {}".format(sumo_time,
+                                                                                                sumo_result))
+            print("speedup:       {:8.1f}x".format(sumo_time / meso_time))
+        else:
+            print("no sumo binary found, skipping the SUMO run")
@@ -0,0 +1,71 @@
+'''
+Latency of make_decisions of MikeGorithm and DijkstraPolicy run directly and through ParallelPolicy
+with 2 and 4 worker processes, for growing batches, with the synthetic vehicles and edge-count
+snapshots of controller_benchmark.py and the route plan cache off. The workers only pay off once
+a batch takes longer to decide than to be sent to them and back, and not with fewer CPUs than
+workers. Run from the main repository:
+    python benchmark/parallel_benchmark.py [net file] [batch size ...]
+'''
+import os
+import sys
+import time
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# only sumolib and traci are imported, no SUMO installation is needed
+os.environ.setdefault("SUMO_HOME", "")
+from core.Util import ConnectionInfo
+from controller.DijkstraController import DijkstraPolicy
+from controller.myAlgo import MikeGorithm
+from controller.ParallelController import ParallelPolicy
+from controller_benchmark import SyntheticState, synthetic_vehicles, count_snapshots
+
+NET_FILE = "./configurations/maps/test.net.xml"
+BATCH_SIZES = [16, 128, 1024]
+WORKER_COUNTS = [0, 2, 4]
+STEPS = 20
+CONTROLLERS = {"mike": (MikeGorithm, {"plan_drift_threshold": None}),
+               "dijkstra": (DijkstraPolicy, {"plan_cache": False})}
+
+
+def median_latency(connection_info, policy, pool, snapshots, batch_size, rng):
+    """
+    :return: median seconds per make_decisions call
+    """
+    latencies = []
+    for counts in snapshots:
+        connection_info.set_edge_vehicle_counts(counts)
+        batch = [pool[i] for i in rng.choice(len(pool), batch_size, replace=False)]
+        start = time.perf_counter()
+        policy.make_decisions(batch, connection_info)
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies))
+
+
+if __name__ == "__main__":
+    net_file = sys.argv[1] if len(sys.argv) > 1 else NET_FILE
+    batch_sizes = [int(size) for size in sys.argv[2:]] or BATCH_SIZES
+    connection_info = ConnectionInfo(net_file)
+    rng = np.random.RandomState(0)
+    pool = synthetic_vehicles(connection_info, 2 * max(batch_sizes), rng)
+    state = SyntheticState(connection_info.edge_list)
+    state.add_vehicles(pool, rng.uniform(10.0, 30.0, len(pool)).tolist())
+    connection_info.state_sync = state
+    snapshots = count_snapshots(len(connection_info.edge_list), STEPS, 0.05, rng)
+    print("CPUs: {}".format(os.cpu_count()))
+    print("{:>10}{:>8}".format("controller", "batch") +
+          "".join("{:>14}".format("{} workers ms".format(n) if n else "serial ms") for n in WORKER_COUNTS))
+    for name, (policy_class, policy_kwargs) in CONTROLLERS.items():
+        for batch_size in batch_sizes:
+            row = []
+            for num_workers in WORKER_COUNTS:
+                if num_workers:
+                    policy = ParallelPolicy(connection_info, policy_class, num_workers, **policy_kwargs)
+                    # start the workers outside of the measurement
+                    policy.make_decisions(pool[:num_workers * 4], connection_info)
+                else:
+                    policy = policy_class(connection_info, **policy_kwargs)
+                row.append(median_latency(connection_info, policy, pool, snapshots, batch_size,
+                                          np.random.RandomState(1)))
+                if num_workers:
+                    policy.close()
+            print("{:>10}{:>8}".format(name, batch_size) + "".join("{:14.2f}".format(1e3 * value) for value in row))
@@ -0,0 +1,72 @@
+'''
+Wall time and results of StrSumo with DijkstraPolicy in serial mode and pipelined
+(pipeline_lag 1 and 2: make_decisions of a step runs in a worker thread while the simulation
+advances, its decisions are applied lag steps later) on every bundled map, with the same random
+route file per map. Drift is the difference to the serial run in total time, arrived vehicles,
+vehicles arrived at their destination and missed deadlines.
+
+The pipeline only saves the overlap of make_decisions with the simulation step. Through traci the
+simulation step waits on the SUMO socket with the GIL released, so the worker runs alongside; the
+queue-based simulator of core/meso_simulator.py is pure Python and holds the GIL, so there the
+saving is close to none and the run shows the cost of the thread hand-off. SUMO is used when a sumo
+binary is found (SUMO_HOME/bin or PATH), the meso backend otherwise. Run from the main repository:
+    python benchmark/pipeline_benchmark.py [number of vehicles] [net file ...]
+'''
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from core.Util import ConnectionInfo
+from core.simulation_backend import traci, use_backend, MESO, TRACI
+from core.STR_SUMO import StrSumo
+from controller.DijkstraController import DijkstraPolicy
+from sumolib import checkBinary
+from meso_benchmark import write_routes
+
+NET_FILES = sorted(glob.glob("./configurations/maps/*.net.xml"))
+LAGS = [0, 1, 2]
+
+
+def run(net_file, route_file, num_vehicles, lag, directory):
+    """
+    :return: (seconds, (total time, arrived, arrived at destination, deadlines missed), stale decisions)
+    """
+    connection_info = ConnectionInfo(net_file)
+    # rewritten with the same seed for fresh controlled vehicles
+    vehicles = write_routes(route_file, connection_info, num_vehicles)
+    simulation = StrSumo(DijkstraPolicy(connection_info), connection_info, vehicles,
+                         summary_file=os.path.join(directory, "data.csv"), verbose=False, pipeline_lag=lag)
+    start = time.perf_counter()
+    traci.start([checkBinary('sumo'), "-n", net_file, "-r", route_file, "--no-step-log", "true"])
+    try:
+        total_time, arrived, deadlines_missed = simulation.run()
+    finally:
+        traci.close()
+    elapsed = time.perf_counter() - start
+    at_destination = sum(vehicle.local_destination == vehicle.destination for vehicle in vehicles.values())
+    return elapsed, (total_time, arrived, at_destination, deadlines_missed), simulation.num_stale_decisions
+
+
+if __name__ == "__main__":
+    num_vehicles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    net_files = sys.argv[2:] or NET_FILES
+    backend = TRACI if shutil.which(checkBinary('sumo')) is not None else MESO
+    use_backend(backend)
+    print("backend: {}".format(backend))
+    print("{:>20}{:>5}{:>10}{:>10}{:>34}{:>8}".format("map", "lag", "wall s", "saved", "drift (time, arr, dest, missed)",
+                                                    "stale"))
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "benchmark.rou.xml")
+        for net_file in net_files:
+            serial_time, serial_result = None, None
+            for lag in LAGS:
+                elapsed, result, stale = run(net_file, route_file, num_vehicles, lag, directory)
+                if lag == 0:
+                    serial_time, serial_result = elapsed, result
+                drift = tuple(value - serial_value for value, serial_value in zip(result, serial_result))
+                print("{:>20}{:>5}{:10.3f}{:9.1f}%{:>34}{:>8}".format(
+                    os.path.basename(net_file)[:-len(".net.xml")], lag, elapsed,
+                    100 * (serial_time - elapsed) / serial_time, str(drift), stale))
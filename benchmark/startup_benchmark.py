@@ -0,0 +1,59 @@
+'''
+Startup time of ConnectionInfo plus target_vehicles_generator on a net file:
+    - parse: both parse the net file with sumolib, as before the compiled network cache
+    - cold: the compiled network is built and saved (first run after the net file changed)
+    - warm: the compiled network is loaded from <net file>.compiled
+Run from the main repository:
+    python benchmark/startup_benchmark.py [net file] [repetitions]
+'''
+import os
+import statistics
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from core.Util import ConnectionInfo
+from core import network_map_data_structures
+from core.compiled_network import load_compiled_network
+from core.target_vehicles_generation_protocols import target_vehicles_generator
+
+
+def startup_parse(net_file):
+    ConnectionInfo(net_file, use_cache=False)
+    net = network_map_data_structures.getNetInfo(net_file)
+    network_map_data_structures.getEdgesInfo(net)
+
+
+def startup_cold(net_file):
+    with tempfile.TemporaryDirectory() as directory:
+        load_compiled_network(net_file, os.path.join(directory, "net.compiled"))
+    ConnectionInfo(net_file)
+    target_vehicles_generator(net_file)
+
+
+def startup_warm(net_file):
+    ConnectionInfo(net_file)
+    target_vehicles_generator(net_file)
+
+
+def measure(function, net_file, repetitions):
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function(net_file)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    net_file = sys.argv[1] if len(sys.argv) > 1 else "./configurations/maps/test.net.xml"
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    # make sure the warm runs find the compiled network
+    load_compiled_network(net_file)
+    parse_time = measure(startup_parse, net_file, repetitions)
+    cold_time = measure(startup_cold, net_file, repetitions)
+    warm_time = measure(startup_warm, net_file, repetitions)
+    print("{}: median of {} runs".format(net_file, repetitions))
+    print("parse: {:8.1f} ms".format(parse_time * 1000))
+    print("cold:  {:8.1f} ms".format(cold_time * 1000))
+    print("warm:  {:8.1f} ms ({:.0f}x faster than parse)".format(warm_time * 1000, parse_time / warm_time))
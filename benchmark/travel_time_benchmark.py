@@ -0,0 +1,66 @@
+'''
+Average travel time per controlled vehicle of DijkstraPolicy (shortest distance) and
+TravelTimePolicy (shortest smoothed travel time, see core/travel_time.py) on every bundled map,
+with the same random route files per map and seed. Routing on time only helps where the shortest
+paths congest and a detour exists, so the gain depends on the map and the load: with a light load
+there is nothing to avoid, with a heavy one every path is jammed. Wall ms is the time per step of
+the run, including the per-step update of the travel-time model. SUMO is used when a sumo binary
+is found (SUMO_HOME/bin or PATH), the meso backend otherwise. Run from the main repository:
+    python benchmark/travel_time_benchmark.py [number of vehicles] [net file ...]
+'''
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from core.Util import ConnectionInfo
+from core.simulation_backend import traci, use_backend, MESO, TRACI
+from core.STR_SUMO import StrSumo
+from controller.DijkstraController import DijkstraPolicy, TravelTimePolicy
+from sumolib import checkBinary
+from meso_benchmark import write_routes
+
+NET_FILES = sorted(glob.glob("./configurations/maps/*.net.xml"))
+CONTROLLERS = {"dijkstra": DijkstraPolicy, "traveltime": TravelTimePolicy}
+NUM_CONTROLLED = 200
+LATEST_DEPART = 600.0
+SEEDS = [0, 1, 2]
+
+
+def run(net_file, route_file, num_vehicles, policy_class, seed, directory):
+    """
+    :return: (total time, arrived, wall seconds per step)
+    """
+    connection_info = ConnectionInfo(net_file)
+    vehicles = write_routes(route_file, connection_info, num_vehicles, seed, NUM_CONTROLLED, LATEST_DEPART)
+    simulation = StrSumo(policy_class(connection_info), connection_info, vehicles,
+                         summary_file=os.path.join(directory, "data.csv"), verbose=False)
+    start = time.perf_counter()
+    traci.start([checkBinary('sumo'), "-n", net_file, "-r", route_file, "--no-step-log", "true"])
+    try:
+        total_time, arrived, _ = simulation.run()
+        steps = traci.simulation.getTime()
+    finally:
+        traci.close()
+    return total_time, arrived, (time.perf_counter() - start) / max(steps, 1)
+
+
+if __name__ == "__main__":
+    num_vehicles = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    net_files = sys.argv[2:] or NET_FILES
+    backend = TRACI if shutil.which(checkBinary('sumo')) is not None else MESO
+    use_backend(backend)
+    print("backend: {}".format(backend))
+    print("{:>20}{:>12}{:>26}{:>10}{:>10}".format("map", "controller", "s per vehicle by seed", "arrived", "wall ms"))
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "benchmark.rou.xml")
+        for net_file in net_files:
+            for name, policy_class in CONTROLLERS.items():
+                results = [run(net_file, route_file, num_vehicles, policy_class, seed, directory) for seed in SEEDS]
+                print("{:>20}{:>12}{:>26}{:>10}{:10.2f}".format(
+                    os.path.basename(net_file)[:-len(".net.xml")], name,
+                    " ".join("{:.1f}".format(total_time / max(arrived, 1)) for total_time, arrived, _ in results),
+                    sum(arrived for _, arrived, _ in results),
+                    1e3 * sum(wall for _, _, wall in results) / len(results)))
@@ -1,85 +1,120 @@
 from controller.RouteController import RouteController
-from core.Util import ConnectionInfo, Vehicle
+from core.Util import ConnectionInfo, Vehicle, FullRoute
+from core.shortest_path_engine import INFINITY
+from core.routers import make_router, TREE
 import numpy as np
-import traci
+from core.simulation_backend import traci
 import math
-import copy
+
+# relative change of the travel time of an edge from which TravelTimePolicy passes it on to the router
+DEFAULT_WEIGHT_TOLERANCE = 0.05
+# change of the summed travel time in seconds of the remaining path up to which TravelTimePolicy keeps a planned path
+DEFAULT_PLAN_DRIFT_THRESHOLD = 5.0
 
 
 class DijkstraPolicy(RouteController):
+    # routes on the edge lengths only
+    uses_edge_counts = False
 
-    def __init__(self, connection_info):
-        super().__init__(connection_info)
+    def __init__(self, connection_info, search_mode=TREE, full_route=False, plan_cache=True):
+        """
+        :param connection_info: information about the map (roads, junctions, etc)
+        :param search_mode: shortest-path search to use, one of core.routers.SEARCH_MODES
+        :param full_route: return the whole shortest path as FullRoute, so that a vehicle is only re-decided
+                           when it leaves it, instead of a local target on every edge change
+        :param plan_cache: reuse the path found for a vehicle while it stays on it (see RouteController.plan_path);
+                           the edge lengths never change, so the reused path is still a shortest path
+        """
+        super().__init__(connection_info, plan_drift_threshold=0.0 if plan_cache else None)
         self.updatedMean = []
+        self.full_route = full_route
+        # edge lengths never change, so whatever the router precomputes stays valid for the whole run
+        self.router = make_router(connection_info, search_mode)
+
     def make_decisions(self, vehicles, connection_info):
         """
         make_decisions algorithm uses Dijkstra's Algorithm to find the shortest path to each individual vehicle's destination
+        With the default search mode, one reverse search is done per destination and vehicles sharing a
+        destination walk up the same cached tree
         :param vehicles: list of vehicles on the map
         :param connection_info: information about the map (roads, junctions, etc)
         """
         local_targets = {}
-        sumDeadline = 0
+        if not vehicles:
+            return local_targets
+        sumDeadline = sum(vehicle.deadline for vehicle in vehicles)
+        currentCount = max(self.get_vehicle_count(), 1)
+        graph = self.router.graph
+        weights = self.update_weights()
         for vehicle in vehicles:
             #print("{}: current - {}, destination - {}".format(vehicle.vehicle_id, vehicle.current_edge, vehicle.destination))
-            decision_list = []
-            unvisited = {edge: 1000000000 for edge in self.connection_info.edge_list} # map of unvisited edges
-            visited = {} # map of visited edges
-            current_edge = vehicle.current_edge
+            distance, edges, decision_list = self.plan_path(vehicle, graph, self.router.search, weights)
 
-            current_distance = self.connection_info.edge_length_dict[current_edge]
-            unvisited[current_edge] = current_distance
-            path_lists = {edge: [] for edge in self.connection_info.edge_list} #stores shortest path to each edge using directions
-            while True:
-                if current_edge not in self.connection_info.outgoing_edges_dict.keys():
-                    continue
-                for direction, outgoing_edge in self.connection_info.outgoing_edges_dict[current_edge].items():
-                    if outgoing_edge not in unvisited:
-                        continue
-                    edge_length = self.connection_info.edge_length_dict[outgoing_edge]
-                    new_distance = current_distance + edge_length
-                    maxSpeed = traci.vehicle.getMaxSpeed(vehicle.vehicle_id)
-                    newDeadline = new_distance/maxSpeed
-                    # Calculate the new mean deadline and save it
-                    # copy the list
-                    vCopy = vehicles.copy()
-                    # save the current vehicle id to change its value
-                    idCopy = vehicle.vehicle_id
-                    # Replace the current vehicle id with the new deadline and calc a new mean
-                    for vehicle in vCopy:
-                        if vehicle.vehicle_id == idCopy:
-                            vehicle.deadline = newDeadline
-                    #vCopy.vehicle.deadline = newDeadline
-                    
-                    for vehicle in vCopy:
-                        sumDeadline = sumDeadline + vehicle.deadline
-                        # print("SUM OF DEADLINE: " + str(sumDeadline))
-                    currentCount = traci.vehicle.getIDCount()
-                    newMeanDeadline = sumDeadline/currentCount
-                    # Save the new mean
-                    self.updatedMean.append(newMeanDeadline)
+            if distance != INFINITY:
+                # Replace the vehicle's deadline with the travel time of the chosen path and save the new mean
+                newDeadline = self.path_travel_time(vehicle, distance)
+                self.updatedMean.append((sumDeadline - vehicle.deadline + newDeadline)/currentCount)
 
-                    if new_distance < unvisited[outgoing_edge]:
-                        unvisited[outgoing_edge] = new_distance
-                        current_path = copy.deepcopy(path_lists[current_edge])
-                        current_path.append(direction)
-                        path_lists[outgoing_edge] = copy.deepcopy(current_path)
-                        #print("{} + {} : {} + {}".format(path_lists[current_edge], direction, path_edge_lists[current_edge], outgoing_edge))
+            if self.full_route and edges is not None:
+                local_targets[vehicle.vehicle_id] = FullRoute([graph.edge_ids[edge] for edge in edges])
+            else:
+                local_targets[vehicle.vehicle_id] = self.compute_local_target(decision_list, vehicle)
+        return local_targets
 
-                visited[current_edge] = current_distance
-                del unvisited[current_edge]
-                if not unvisited:
-                    break
-                if current_edge==vehicle.destination:
-                    break
-                possible_edges = [edge for edge in unvisited.items() if edge[1]]
-                current_edge, current_distance = sorted(possible_edges, key=lambda x: x[1])[0]
-                #print('{}:{}------------'.format(current_edge, current_distance))
-            #current_edge = vehicle.current_edge
+    def update_weights(self):
+        """
+        :return: the weights the router searches with, by edge index
+        """
+        return self.router.graph.edge_lengths
 
+    def path_travel_time(self, vehicle, cost):
+        """
+        :param cost: cost of the path of vehicle from its current edge, without the current edge
+        :return: travel time in seconds of the path including the current edge
+        """
+        return (self.connection_info.edge_length_dict[vehicle.current_edge] + cost) / self.get_max_speed(vehicle.vehicle_id)
 
-            for direction in path_lists[vehicle.destination]:
-                decision_list.append(direction)
 
-            local_targets[vehicle.vehicle_id] = self.compute_local_target(decision_list, vehicle)
-        return local_targets
-    
+class TravelTimePolicy(DijkstraPolicy):
+    """
+    Dijkstra on the travel times of the edges (connection_info.edge_travel_times) instead of their lengths;
+    StrSumo keeps the travel times up to date from the mean speeds in the simulation (see core/travel_time.py).
+    The travel time of an edge is passed on to the router once it differs from the one the router has by more
+    than weight_tolerance, so the shortest paths are only repaired where the traffic changed noticeably.
+    """
+    uses_travel_times = True
+
+    def __init__(self, connection_info, search_mode=TREE, full_route=False,
+                 weight_tolerance=DEFAULT_WEIGHT_TOLERANCE, plan_drift_threshold=DEFAULT_PLAN_DRIFT_THRESHOLD):
+        """
+        :param connection_info: information about the map (roads, junctions, etc)
+        :param search_mode: shortest-path search to use, one of core.routers.SEARCH_MODES
+        :param full_route: see DijkstraPolicy
+        :param weight_tolerance: relative change of the travel time of an edge from which the router gets it
+        :param plan_drift_threshold: see RouteController.plan_path, in seconds; None to search for every decision
+        """
+        super().__init__(connection_info, search_mode, full_route)
+        self.plan_drift_threshold = plan_drift_threshold
+        self.weight_tolerance = weight_tolerance
+        self.weights = None  # [travel time] by edge index, as given to the router
+        self.routed_travel_times = None  # the same as NumPy array
+
+    def update_weights(self):
+        travel_times = self.connection_info.edge_travel_times
+        if self.weights is None:
+            self.weights = travel_times.tolist()
+            self.routed_travel_times = travel_times.copy()
+            self.router.set_weights(self.weights)
+            return self.weights
+        routed = self.routed_travel_times
+        changed = np.flatnonzero(np.abs(travel_times - routed) > self.weight_tolerance * routed)
+        if len(changed):
+            routed[changed] = travel_times[changed]
+            changed = changed.tolist()
+            for i, travel_time in zip(changed, routed[changed].tolist()):
+                self.weights[i] = travel_time
+            self.router.set_weights(self.weights, changed)
+        return self.weights
+
+    def path_travel_time(self, vehicle, cost):
+        return self.weights[self.connection_info.edge_index_dict[vehicle.current_edge]] + cost
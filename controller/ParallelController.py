@@ -0,0 +1,154 @@
+import os
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from controller.RouteController import RouteController
+from core.Util import ConnectionInfo
+
+# state of a worker process, set by _init_worker
+_worker = None
+
+
+class DecisionState:
+    """
+    The values of the current step a policy reads through the RouteController get_... helpers in a
+    worker process (see core/state_sync.py), sent with every batch.
+    :param time: simulation time in seconds
+    :param vehicle_count: number of vehicles in the simulation
+    :param max_speeds: {vehicle_id: maximum speed} of the vehicles of the batch
+    """
+    def __init__(self, time, vehicle_count, max_speeds):
+        self.time = time
+        # only the number of vehicles is known, which is all get_vehicle_count asks for
+        self.vehicle_ids = range(vehicle_count)
+        self.max_speeds = max_speeds
+
+    def max_speed(self, vehicle_id):
+        return self.max_speeds[vehicle_id]
+
+
+def _init_worker(net_file, policy_class, policy_kwargs, shared_name, num_edges):
+    global _worker
+    connection_info = ConnectionInfo(net_file)
+    shared = shared_memory.SharedMemory(name=shared_name)
+    counts, travel_times = _shared_arrays(shared, num_edges)
+    _worker = (connection_info, policy_class(connection_info, **policy_kwargs), shared, counts, travel_times)
+
+
+def _decide(vehicles, forgotten, time, vehicle_count, max_speeds):
+    """
+    make_decisions of the policy of the worker on its share of the batch, after forgetting the arrived vehicles
+    forgotten.
+    :return: ({vehicle_id: decision}, [vehicle_id] replans the policy requested)
+    """
+    connection_info, policy, _, counts, travel_times = _worker
+    for vehicle_id in forgotten:
+        policy.forget(vehicle_id)
+    connection_info.state_sync = DecisionState(time, vehicle_count, max_speeds)
+    connection_info.set_edge_vehicle_counts(counts[connection_info.edge_list_indices])
+    connection_info.edge_travel_times[:] = travel_times
+    decisions = policy.make_decisions(vehicles, connection_info)
+    replan_requests = list(policy.replan_requests)
+    policy.replan_requests.clear()
+    return decisions, replan_requests
+
+
+def _shared_arrays(shared, num_edges):
+    """
+    :return: (vehicle counts, travel times) by edge index in the shared memory block
+    """
+    return (np.ndarray((num_edges,), dtype=np.int64, buffer=shared.buf),
+            np.ndarray((num_edges,), dtype=np.float64, buffer=shared.buf, offset=num_edges * 8))
+
+
+def _release(workers, shared):
+    for worker in workers:
+        worker.shutdown()
+    shared.close()
+    shared.unlink()
+
+
+class ParallelPolicy(RouteController):
+    """
+    Runs make_decisions of another policy on num_workers processes: the batch of vehicles is split
+    by vehicle id, so that a vehicle is always decided by the same worker and the route plan cache
+    of the policy (RouteController.plan_path) keeps working, and the decisions are merged into one
+    {vehicle_id: decision}.
+
+    Every worker loads the map once, from the compiled network stored next to the net file (see
+    core/compiled_network.py), and builds its own policy and routing graph from it; nothing of the
+    map is sent with a batch. The vehicle counts and travel times of every step are written once
+    into shared memory arrays that all workers read, so a batch only carries the vehicles, the simulation time,
+    the vehicle count and the maximum speeds of its vehicles. The policy must read the simulation
+    through the get_... helpers of RouteController, not through traci, and whatever it records
+    besides its decisions and request_replan (e.g. updatedMean) stays in the workers. forget is passed on
+    to the worker of the vehicle with its next batch.
+
+    Splitting pays off for batches that take longer to decide than to send to a worker and back,
+    i.e. for large batches with slow policies. Call close() when done, or the workers are shut
+    down when the ParallelPolicy is garbage collected.
+    :param connection_info: object containing network information
+    :param policy_class: RouteController subclass to run, called as policy_class(connection_info, **policy_kwargs)
+                         in every worker
+    :param num_workers: number of worker processes, default: number of CPUs
+    """
+    def __init__(self, connection_info, policy_class, num_workers=None, **policy_kwargs):
+        super().__init__(connection_info)
+        self.uses_edge_counts = policy_class.uses_edge_counts
+        self.uses_travel_times = policy_class.uses_travel_times
+        self.num_workers = num_workers or os.cpu_count() or 1
+        # [vehicle_id] by worker, forgotten since the last batch sent to it
+        self.forgotten = [[] for _ in range(self.num_workers)]
+        num_edges = len(connection_info.edge_vehicle_counts)
+        self.shared = shared_memory.SharedMemory(create=True, size=max(num_edges, 1) * 16)
+        self.shared_counts, self.shared_travel_times = _shared_arrays(self.shared, num_edges)
+        self.shared_counts[:] = 0
+        # one single-process pool per worker, so that every vehicle goes to the same process
+        self.workers = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                            initargs=(connection_info.net_filename, policy_class, policy_kwargs,
+                                                      self.shared.name, num_edges))
+                        for _ in range(self.num_workers)]
+        self._finalizer = weakref.finalize(self, _release, self.workers, self.shared)
+
+    def close(self):
+        """
+        Shuts the workers down and frees the shared memory.
+        """
+        self._finalizer()
+
+    def forget(self, vehicle_id):
+        super().forget(vehicle_id)
+        self.forgotten[self.worker_of(vehicle_id)].append(vehicle_id)
+
+    def worker_of(self, vehicle_id):
+        return zlib.crc32(vehicle_id.encode()) % self.num_workers
+
+    def make_decisions(self, vehicles, connection_info):
+        """
+        :param vehicles: list of vehicles to make routing decisions for
+        :param connection_info: object containing network information, with the vehicle counts of the step
+        :return: {vehicle_id: decision} of the policy for all vehicles
+        """
+        forgotten = self.forgotten
+        if not vehicles and not any(forgotten):
+            return {}
+        self.shared_counts[:] = connection_info.edge_vehicle_counts
+        self.shared_travel_times[:] = connection_info.edge_travel_times
+        shares = [[] for _ in range(self.num_workers)]
+        for vehicle in vehicles:
+            shares[self.worker_of(vehicle.vehicle_id)].append(vehicle)
+        time = self.get_time()
+        vehicle_count = self.get_vehicle_count()
+        futures = [worker.submit(_decide, share, worker_forgotten, time, vehicle_count,
+                                 {vehicle.vehicle_id: self.get_max_speed(vehicle.vehicle_id) for vehicle in share})
+                   for worker, share, worker_forgotten in zip(self.workers, shares, forgotten)
+                   if share or worker_forgotten]
+        self.forgotten = [[] for _ in range(self.num_workers)]
+        local_targets = {}
+        for future in futures:
+            decisions, replan_requests = future.result()
+            local_targets.update(decisions)
+            self.replan_requests.update(replan_requests)
+        return local_targets
@@ -1,17 +1,45 @@
 from controller.RouteController import RouteController
 from core.Util import ConnectionInfo, Vehicle
-from keras.models import load_model
 import numpy as np
-import traci
+from core.numpy_model import load_numpy_model
+from core.simulation_backend import traci
 
 
 class QLearningPolicy(RouteController):
-    def __init__(self, connection_info, model_file):
+    """
+    Routing policy using a trained agent; the state of a decision is the index of the edge, the six
+    available directions (1/0) and the density of every edge in edge_list.
+    :param connection_info: object containing network information
+    :param model_file: the trained model; a .npz weights file exported with core/numpy_model.py runs
+                       in plain NumPy, any other file is loaded with keras
+    :param batched: decide all vehicles of a step together, with one model call per hop depth
+                    instead of one per hop of every vehicle
+    :param verbose: in batched mode, print every choice and every impossible turn like the sequential mode
+    """
+    def __init__(self, connection_info, model_file, batched=True, verbose=False):
         super().__init__(connection_info)
-        self.model = load_model(model_file)
+        if model_file.endswith(".npz"):
+            self.model = load_numpy_model(model_file)
+        else:
+            # keras (and TensorFlow) is only imported for keras model files
+            from keras.models import load_model
+            self.model = load_model(model_file)
+        self.batched = batched
+        self.verbose = verbose
+        # available directions of every edge by edge index, the same for every step
+        self.edge_actions = np.zeros((len(connection_info.edge_index_dict), len(self.direction_choices)))
+        for edge, edge_index in connection_info.edge_index_dict.items():
+            for i, c in enumerate(self.direction_choices):
+                if c in connection_info.outgoing_edges_dict[edge]:
+                    self.edge_actions[edge_index, i] = 1
+        # number of model calls of the last make_decisions
+        self.model_calls = 0
 
     def make_decisions(self, vehicles, connection_info: ConnectionInfo):
+        if self.batched:
+            return self.make_batched_decisions(vehicles, connection_info)
         local_targets = {}
+        self.model_calls = 0
 
         for vehicle in vehicles:
 
@@ -58,8 +86,74 @@ class QLearningPolicy(RouteController):
 
 
 
+    def make_batched_decisions(self, vehicles, connection_info: ConnectionInfo):
+        """
+        Same decisions as the sequential mode: the density block is built once for the step, the
+        states of all vehicles still deciding are stacked into one matrix and every hop depth is
+        one model call.
+        :param vehicles: list of vehicles to make routing decisions for
+        :param connection_info: object containing network information
+        :return: local_targets: {vehicle_id, target_edge}
+        """
+        local_targets = {}
+        self.model_calls = 0
+        densities = connection_info.edge_densities[connection_info.edge_list_indices]
+        num_actions = len(self.direction_choices)
+
+        # per deciding vehicle: [vehicle, edge reached so far, decisions, total length]
+        deciding = []
+        for vehicle in vehicles:
+            if vehicle.destination == vehicle.current_edge:
+                continue
+            if connection_info.edge_length_dict[vehicle.current_edge] <= 0.0:
+                local_targets[vehicle.vehicle_id] = self.compute_local_target([], vehicle)
+                continue
+            deciding.append([vehicle, vehicle.current_edge, [], 0.0])
+        while deciding:
+            edge_indices = np.array([connection_info.edge_index_dict[d[1]] for d in deciding])
+            states = np.empty((len(deciding), 1 + num_actions + len(densities)))
+            states[:, 0] = edge_indices
+            states[:, 1:1 + num_actions] = self.edge_actions[edge_indices]
+            states[:, 1 + num_actions:] = densities
+            actions = self.act_batch(states)
+
+            still_deciding = []
+            for d, action in zip(deciding, actions):
+                vehicle, start_edge, decision_list, total_length = d
+                action = self.direction_choices[action]
+                if action not in connection_info.outgoing_edges_dict[start_edge]:
+                    if self.verbose:
+                        print("Impossible turns made for vehicle #" + str(vehicle.vehicle_id) + " : " + action + " @ " + str(start_edge))
+                    continue
+
+                if self.verbose:
+                    print("Choice for " + str(start_edge) + " is: " + action)
+
+                target_edge = connection_info.outgoing_edges_dict[start_edge][action]
+                decision_list.append(action)
+                total_length += self.connection_info.edge_length_dict[target_edge]
+                if total_length < connection_info.edge_length_dict[vehicle.current_edge]:
+                    still_deciding.append([vehicle, target_edge, decision_list, total_length])
+                else:
+                    local_targets[vehicle.vehicle_id] = self.compute_local_target(decision_list, vehicle)
+            deciding = still_deciding
+
+        return local_targets
+
+    def act_batch(self, states):
+        """
+        :param states: one state per row
+        :return: the best available action of every row
+        """
+        self.model_calls += 1
+        act_values = self.model.predict(states)
+        # actions that are not available get a very low value
+        mod_values = act_values - 10000 * (1 - states[:, 1:7])
+        return np.argmax(mod_values, axis=1)
+
     # this function reacheds the Neural Network trained before and let it make a decision for the situation now
     def act(self, state):
+        self.model_calls += 1
         act_values = self.model.predict(state)
         state_vals = state[0][1:7]
         state_vals = state_vals.reshape(act_values.shape)
@@ -82,10 +176,9 @@ class QLearningPolicy(RouteController):
                 state.append(0)
                 # 0 means this action cannot be chosen.
         # put the congestion ratio of all edges into the state.
-        for edge_now in self.connection_info.edge_list:
-            car_num = traci.edge.getLastStepVehicleNumber(edge_now)
-            density = car_num / self.connection_info.edge_length_dict[edge_now]
-            state.append(density)
+        # the densities of the current step are stored by StrSumo.get_edge_vehicle_counts
+        densities = self.connection_info.edge_densities[self.connection_info.edge_list_indices]
+        state = np.concatenate((state, densities))
 
         state = np.reshape(state, [1, len(state)])
         return state
@@ -8,7 +8,8 @@ if 'SUMO_HOME' in os.environ:
     sys.path.append(tools)
 else:
     sys.exit("No environment variable SUMO_HOME!")
-import traci
+from core.simulation_backend import traci
+from core.shortest_path_engine import INFINITY
 import sumolib
 import controller.algoHelper as algoHelper
 
@@ -19,6 +20,25 @@ RIGHT = "r"
 SLIGHT_LEFT = "L"
 SLIGHT_RIGHT = "R"
 
+
+class RoutePlan:
+    """
+    Cached path of a vehicle, see RouteController.plan_path.
+    :param destination: edge id the path leads to
+    :param edges: [edge index] from the edge the path was planned on
+    :param directions: [direction] between consecutive edges
+    :param planned_weights: [weight] of the edges when the path was planned
+    """
+    __slots__ = ["destination", "edges", "directions", "planned_weights", "position"]
+
+    def __init__(self, destination, edges, directions, planned_weights):
+        self.destination = destination
+        self.edges = edges
+        self.directions = directions
+        self.planned_weights = planned_weights
+        self.position = 0
+
+
 class RouteController(ABC):
     """
     Base class for routing policy
@@ -28,8 +48,11 @@ class RouteController(ABC):
     the 'Your algo...' comments.
 
     make_decisions takes in a list of vehicles and network information (connection_info).
-        Using this data, it should return a dictionary of {vehicle_id: decision}, where "decision"
-        is one of the directions defined by SUMO (see constants above). Any scheduling algorithm
+        Using this data, it should return a dictionary of {vehicle_id: local target edge}, computed from
+        the directions defined by SUMO (see constants above) by compute_local_target, or of
+        {vehicle_id: FullRoute} to set the whole route of the vehicle at once; a vehicle on a full route
+        is only passed to make_decisions again once it leaves the route, after request_replan or after
+        StrSumo's replan_interval. Any scheduling algorithm
         may be injected into the simulation, as long as it is wrapped by the RouteController class
         and implements the make_decisions method.
 
@@ -39,13 +62,115 @@ class RouteController(ABC):
                             - edge_index_dict {edge_index_dict} keep track of edge ids by an index
                             - edge_vehicle_count {edge_id: number of vehicles at edge}
                             - edge_list [edge_id]
+                            - edge_lengths, edge_speeds, edge_travel_times, edge_vehicle_counts, edge_densities:
+                              NumPy arrays by edge index
+                            - state_sync: state of the current simulation step, read through the
+                              get_... helpers below which fall back to TraCI calls without it
+    Policies that never read the vehicle counts of the edges (edge_vehicle_count, edge_vehicle_counts,
+    edge_densities, changed_edges) set uses_edge_counts to False, and StrSumo does not collect them.
+    Policies routing on the travel times of the edges (edge_travel_times) set uses_travel_times to True,
+    and StrSumo keeps them up to date with a TravelTimeModel (see core/travel_time.py).
+
+    :param plan_drift_threshold: change of the summed weight of the remaining path (in the units of the
+                                 weights) up to which plan_path reuses the path planned for a vehicle,
+                                 None to search every time
 
     """
-    def __init__(self, connection_info: ConnectionInfo):
+    uses_edge_counts = True
+    uses_travel_times = False
+
+    def __init__(self, connection_info: ConnectionInfo, plan_drift_threshold=None):
         self.connection_info = connection_info
         self.direction_choices = [STRAIGHT, TURN_AROUND,  SLIGHT_RIGHT, RIGHT, SLIGHT_LEFT, LEFT]
         # Create a value for removed vehicles
         self.gotStuck = 0
+        # vehicles to pass to make_decisions again although they follow their full route
+        self.replan_requests = set()
+        # route plan cache of plan_path
+        self.plan_drift_threshold = plan_drift_threshold
+        self.plans = {}  # {vehicle_id: RoutePlan}
+        self.plan_hits = 0
+        self.plan_misses = 0
+
+    def request_replan(self, vehicle_id):
+        """
+        Asks StrSumo to pass vehicle_id to make_decisions in the next step, also if it follows a FullRoute.
+        """
+        self.replan_requests.add(vehicle_id)
+
+    def forget(self, vehicle_id):
+        """
+        Drops what the policy keeps about vehicle_id, called by StrSumo when the vehicle has arrived.
+        Policies keeping more per-vehicle state extend it.
+        """
+        self.plans.pop(vehicle_id, None)
+        self.replan_requests.discard(vehicle_id)
+
+    def get_vehicle_count(self):
+        """
+        :return: number of vehicles in the simulation
+        """
+        state = self.connection_info.state_sync
+        if state is None:
+            return traci.vehicle.getIDCount()
+        return len(state.vehicle_ids)
+
+    def get_max_speed(self, vehicle_id):
+        state = self.connection_info.state_sync
+        if state is None:
+            return traci.vehicle.getMaxSpeed(vehicle_id)
+        return state.max_speed(vehicle_id)
+
+    def get_time(self):
+        """
+        :return: simulation time in seconds
+        """
+        state = self.connection_info.state_sync
+        if state is None:
+            return traci.simulation.getTime()
+        return state.time
+
+    def plan_path(self, vehicle, graph, search, weights):
+        """
+        Path of vehicle from its current edge to its destination, taken from the path planned for it earlier
+        while the vehicle is still on that path and the current weights of the remaining edges sum to within
+        plan_drift_threshold of their sum when it was planned. Otherwise search is called and its
+        path is cached (counted in plan_misses; plan_hits counts the reused paths).
+        :param graph: RoutingGraph of the router
+        :param search: function (source edge index, destination edge index) -> (cost, [arc_index])
+        :param weights: cost of entering each edge by edge index, the weights search uses
+        :return: (cost, [edge index], [direction]) from the current edge, the cost without the current edge;
+                 (INFINITY, None, []) if the destination cannot be reached
+        """
+        source = graph.edge_index_dict[vehicle.current_edge]
+        threshold = self.plan_drift_threshold
+        if threshold is not None:
+            plan = self.plans.get(vehicle.vehicle_id)
+            if plan is not None and plan.destination == vehicle.destination:
+                try:
+                    position = plan.edges.index(source, plan.position)
+                except ValueError:
+                    # left the planned path
+                    position = None
+                if position is not None:
+                    cost = sum(weights[edge] for edge in plan.edges[position + 1:])
+                    planned_cost = sum(plan.planned_weights[position + 1:])
+                    if abs(cost - planned_cost) <= threshold:
+                        plan.position = position
+                        self.plan_hits += 1
+                        return cost, plan.edges[position:], plan.directions[position:]
+        cost, arcs = search(source, graph.edge_index_dict[vehicle.destination])
+        if threshold is not None:
+            self.plan_misses += 1
+        if arcs is None:
+            self.plans.pop(vehicle.vehicle_id, None)
+            return INFINITY, None, []
+        edges = [source] + [graph.adjacency_target[arc] for arc in arcs]
+        directions = graph.arcs_to_directions(arcs)
+        if threshold is not None:
+            self.plans[vehicle.vehicle_id] = RoutePlan(vehicle.destination, edges, directions,
+                                                       [weights[edge] for edge in edges])
+        return cost, edges, directions
 
     def compute_local_target(self, decision_list, vehicle):
         current_target_edge = vehicle.current_edge
@@ -97,6 +222,8 @@ class RandomPolicy(RouteController):
     Utilizes a random decision policy until vehicle destination is within reach,
     then targets the vehicle destination.
     """
+    uses_edge_counts = False
+
     def __init__(self, connection_info):
         super().__init__(connection_info)
 
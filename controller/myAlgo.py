@@ -9,11 +9,13 @@ from core.Util import *
 from controller.RouteController import RouteController
 from core.Util import ConnectionInfo, Vehicle
 import numpy as np
-import traci
+from core.simulation_backend import traci
 import math
 import copy
 import csv
 from controller.algoHelper import getDeadline
+from core.shortest_path_engine import INFINITY
+from core.routers import make_router, DYNAMIC
 
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -22,6 +24,9 @@ else:
     sys.exit("No environment variable SUMO_HOME!")
 import sumolib
 
+# change of the summed congestion ratio (vehicles per metre) on the remaining path up to which a planned path is kept
+DEFAULT_PLAN_DRIFT_THRESHOLD = 0.1
+
 STRAIGHT = "s"
 TURN_AROUND = "t"
 LEFT = "l"
@@ -37,11 +42,16 @@ class MikeGorithm(RouteController):
     Utilizes a random decision policy until vehicle destination is within reach,
     then targets the vehicle destination.
     """
-    def __init__(self, connection_info):
-        super().__init__(connection_info)
+    def __init__(self, connection_info, search_mode=DYNAMIC, plan_drift_threshold=DEFAULT_PLAN_DRIFT_THRESHOLD):
+        # plan_drift_threshold: see RouteController.plan_path, None to search for every decision
+        super().__init__(connection_info, plan_drift_threshold)
         self.meanDeadline = []
         self.simSteps = []
         self.updatedMean = []
+        # shortest-path search to use, one of core.routers.SEARCH_MODES
+        # the default repairs the shortest paths only where the vehicle counts changed
+        self.router = make_router(connection_info, search_mode)
+        self.weights = None
 
     def make_decisions(self, vehicles, connection_info):
         """
@@ -85,7 +95,7 @@ class MikeGorithm(RouteController):
         vSorted = sorted(vehicles, key= lambda d: d.deadline, reverse=True)
         currentMeanDeadline = 0
         sumDeadline = 0
-        currentCount = traci.vehicle.getIDCount()
+        currentCount = self.get_vehicle_count()
         # Make sure count is at least 1
         if currentCount < 1:
             currentCount =1
@@ -100,71 +110,32 @@ class MikeGorithm(RouteController):
         # print("MEAN DEADLINE IS: " + str(currentMeanDeadline))
         # Append the current mean deadline and the sim time to the arrays
         self.meanDeadline.append(currentMeanDeadline)
-        self.simSteps.append(traci.simulation.getTime())
+        self.simSteps.append(self.get_time())
+        # Congestion weighted cost of entering every edge: edge length plus the congestion ratio (number of cars/edge length)
+        # After the first call only the edges whose count changed since the last step are updated
+        # The arrays of connection_info are indexed like the routing graph
+        graph = self.router.graph
+        congestion_weights = self.connection_info.edge_lengths + self.connection_info.edge_densities
+        if self.weights is None:
+            self.weights = congestion_weights.tolist()
+            changed_edges = None
+        else:
+            changed_edges = [graph.edge_index_dict[edge] for edge in self.connection_info.changed_edges]
+            for i, weight in zip(changed_edges, congestion_weights[changed_edges].tolist()):
+                self.weights[i] = weight
+        self.router.set_weights(self.weights, changed_edges)
         for vehicle in vSorted:
-            maxSpeed = traci.vehicle.getMaxSpeed(vehicle.vehicle_id)
+            maxSpeed = self.get_max_speed(vehicle.vehicle_id)
             # print("MAX SPEED = " + str(maxSpeed))
             #print("{}: current - {}, destination - {}".format(vehicle.vehicle_id, vehicle.current_edge, vehicle.destination))
-            decision_list = []
-            unvisited = {edge: 1000000000 for edge in self.connection_info.edge_list} # map of unvisited edges
-            visited = {} # map of visited edges
-            current_edge = vehicle.current_edge
-
-            current_distance = self.connection_info.edge_length_dict[current_edge]
-            unvisited[current_edge] = current_distance
-            path_lists = {edge: [] for edge in self.connection_info.edge_list} #stores shortest path to each edge using directions
-            while True:
-                if current_edge not in self.connection_info.outgoing_edges_dict.keys():
-                    continue
-                for direction, outgoing_edge in self.connection_info.outgoing_edges_dict[current_edge].items():
-                    if outgoing_edge not in unvisited:
-                        continue
-                    # Get the congestion ratio of the current edge
-                    # number of cars/edge length
-                    edge_length = self.connection_info.edge_length_dict[outgoing_edge]
-                    carNum = self.connection_info.edge_vehicle_count[outgoing_edge]
-                    # print("CAR NUM IS: " + str(carNum))
-                    # Calculate congestion ratio
-                    congestionRatio = carNum/edge_length
-                    # print("CONGESTION RATIO: " + str(congestionRatio))
-                    # Add the congestion ratio to the current edge length
-                    new_distance = current_distance + edge_length + congestionRatio
-                    # add the new_distance/vehicle speed to new mean deadline
-                    newDeadline = new_distance/maxSpeed
-                    # copy the list
-                    vCopy = vSorted.copy()
-                    # save the current vehicle id to change its value
-                    idCopy = vehicle.vehicle_id
-                    # Replace the current vehicle id with the new deadline and calc a new mean
-                    for vehicle in vCopy:
-                        if vehicle.vehicle_id == idCopy:
-                            vehicle.deadline = newDeadline
-                    #vCopy.vehicle.deadline = newDeadline
-                    for vehicle in vCopy:
-                        sumDeadline = sumDeadline + vehicle.deadline
-                        # print("SUM OF DEADLINE: " + str(sumDeadline))
-                    currentCount = traci.vehicle.getIDCount()
-                    newMeanDeadline = sumDeadline/currentCount
-                    # Save the new mean
-                    self.updatedMean.append(newMeanDeadline)
-                    # Change the herusitic here for choosing next edge
-                    if new_distance < unvisited[outgoing_edge]:
-                        unvisited[outgoing_edge] = new_distance
-                        current_path = copy.deepcopy(path_lists[current_edge])
-                        current_path.append(direction)
-                        path_lists[outgoing_edge] = copy.deepcopy(current_path)
-                        #print("{} + {} : {} + {}".format(path_lists[current_edge], direction, path_edge_lists[current_edge], outgoing_edge))
-
-                visited[current_edge] = current_distance
-                del unvisited[current_edge]
-                if not unvisited:
-                    break
-                if current_edge==vehicle.destination:
-                    break
-                possible_edges = [edge for edge in unvisited.items() if edge[1]]
-                current_edge, current_distance = sorted(possible_edges, key=lambda x: x[1])[0]
-                #print('{}:{}------------'.format(current_edge, current_distance))
-            #current_edge = vehicle.current_edge
+            new_distance, _, decision_list = self.plan_path(vehicle, graph, self.router.search, self.weights)
+            if new_distance != INFINITY:
+                # add the new_distance/vehicle speed to new mean deadline
+                new_distance += self.connection_info.edge_length_dict[vehicle.current_edge]
+                newDeadline = new_distance/maxSpeed
+                # Replace the current vehicle's deadline with the new deadline and save the new mean
+                newMeanDeadline = (sumDeadline - vehicle.deadline + newDeadline)/currentCount
+                self.updatedMean.append(newMeanDeadline)
 
 
 
@@ -6,6 +6,9 @@ from core.Util import *
 from core.target_vehicles_generation_protocols import *
 # CSV for data capture
 import csv
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -13,15 +16,20 @@ if 'SUMO_HOME' in os.environ:
 else:
     sys.exit("No environment variable SUMO_HOME!")
 
-import traci
+from core.simulation_backend import traci
 import sumolib
 from controller.RouteController import *
+from core.state_sync import TraciStateSync, TraciPollingState
+from core.result_sinks import make_trip_sink
+from core.travel_time import TravelTimeModel
 
 """
 SUMO Selfless Traffic Routing (STR) Testbed
 """
 
 MAX_SIMULATION_STEPS = 2000
+# relative to the working directory
+SUMMARY_FILE = 'data.csv'
 
 # TODO: decide which file to put these in. Right now they're also defined in RouteController!!
 STRAIGHT = "s"
@@ -34,14 +42,78 @@ SLIGHT_RIGHT = "R"
 # TODO: Create data writing sections to fill csv
 
 class StrSumo:
-    def __init__(self, route_controller, connection_info, controlled_vehicles):
+    def __init__(self, route_controller, connection_info, controlled_vehicles, use_subscriptions=True,
+                 summary_file=SUMMARY_FILE, trip_sink=None, verbose=True, profiler=None, replan_interval=None,
+                 pipeline_lag=0, local_edge_counts=False, reconcile_interval=None, travel_time_model=None):
         """
         :param route_controller: object that implements the scheduling algorithm for controlled vehicles
         :param connection_info: object that includes the map information
         :param controlled_vehicles: a dictionary that includes the vehicles under control
+        :param use_subscriptions: fetch the per-step state through TraCI subscriptions (one bulk
+                                  response per step) instead of one TraCI call per value
+        :param summary_file: csv file the totals of the run are written to
+        :param trip_sink: TripRecordSink, or the name of a .csv/.jsonl/.parquet file, receiving one record
+                          per arriving controlled vehicle (see core/result_sinks.py); None for no records
+        :param verbose: print every arriving controlled vehicle
+        :param profiler: StepProfiler timing the phases of every step (see core/profiling.py), None for no timing
+        :param replan_interval: steps after which a vehicle following a FullRoute decision is passed to
+                                make_decisions again on its next edge change, None to keep the route until the
+                                vehicle leaves it or the controller asks for a replan
+        :param pipeline_lag: 0 to run make_decisions between the steps (serial); n >= 1 to run make_decisions of
+                             step t in a worker thread while the simulation advances and apply its decisions in
+                             step t + n, which only overlaps make_decisions with the simulation step (the worker
+                             finishes before the state of the next step is read) and drops the decisions of the
+                             vehicles that changed edges in between; needs use_subscriptions, as the worker reads
+                             the vehicles through the state (a TraCI connection is not thread-safe)
+        :param local_edge_counts: count the vehicles per edge from the road changes, departures and arrivals of
+                                  the vehicles (see core.state_sync.EdgeOccupancy) instead of asking SUMO for the
+                                  vehicle number of every edge; needs use_subscriptions. Not counted at all if the
+                                  route controller does not use the counts (RouteController.uses_edge_counts)
+        :param reconcile_interval: with local_edge_counts, steps between two comparisons of the local counts with
+                                   the vehicle numbers of SUMO, which resets the counts to SUMO's and adds the
+                                   difference to edge_count_drift; None to never compare
+        :param travel_time_model: TravelTimeModel (see core/travel_time.py) updated every step from the mean speeds
+                                  and occupancies of the edges; by default a new one if the route controller
+                                  routes on travel times (RouteController.uses_travel_times), else None
         """
         self.direction_choices = [STRAIGHT, TURN_AROUND, SLIGHT_RIGHT, RIGHT, SLIGHT_LEFT, LEFT]
         self.connection_info = connection_info
+        self.summary_file = summary_file
+        if isinstance(trip_sink, str):
+            trip_sink = make_trip_sink(trip_sink)
+        self.trip_sink = trip_sink
+        self.verbose = verbose
+        self.profiler = profiler
+        self.replan_interval = replan_interval
+        self.pipeline_lag = pipeline_lag
+        # vehicles passed to make_decisions, route writes (changeTarget and setRoute), and pipelined decisions
+        # dropped because the vehicle had changed edges or arrived, of the last run
+        self.num_decisions = 0
+        self.num_route_writes = 0
+        self.num_stale_decisions = 0
+        self.uses_edge_counts = route_controller.uses_edge_counts
+        if local_edge_counts and not use_subscriptions:
+            raise ValueError("local_edge_counts needs use_subscriptions")
+        if pipeline_lag > 0 and not use_subscriptions:
+            raise ValueError("pipeline_lag needs use_subscriptions")
+        self.local_edge_counts = local_edge_counts and self.uses_edge_counts
+        self.reconcile_interval = reconcile_interval
+        # vehicles the local edge counts were off by at the reconciliations of the last run, summed over the edges
+        self.edge_count_drift = 0
+        self.num_reconciliations = 0
+        if travel_time_model is None and route_controller.uses_travel_times:
+            travel_time_model = TravelTimeModel(connection_info)
+        self.travel_time_model = travel_time_model
+        edge_speeds = travel_time_model is not None
+        # only the controlled vehicles are looked at, the others are counted through the edges
+        edge_list = connection_info.edge_list if self.uses_edge_counts or edge_speeds else []
+        if use_subscriptions:
+            self.state = TraciStateSync(edge_list, tracked_vehicles=controlled_vehicles,
+                                        local_edge_counts=self.local_edge_counts, edge_speeds=edge_speeds)
+        else:
+            self.state = TraciPollingState(edge_list, tracked_vehicles=controlled_vehicles, edge_speeds=edge_speeds)
+        # the controllers read vehicle and edge values of the current step from here
+        connection_info.state_sync = self.state
         self.route_controller = route_controller
         self.controlled_vehicles =  controlled_vehicles # dictionary of Vehicles by id
         #print(self.controlled_vehicles)
@@ -55,7 +127,7 @@ class StrSumo:
         """
         # Create the csv file
         print("Creating csv file")
-        csvFile = open('/home/mike/RTOS/Selfless-Traffic-Routing-Testbed/data.csv', 'w')
+        csvFile = open(self.summary_file, 'w')
         
         # Create the csv writer
         writer = csv.writer(csvFile)
@@ -72,78 +144,130 @@ class StrSumo:
         
         step = 0
         vehicles_to_direct = [] #  the batch of controlled vehicles passed to make_decisions()
-        vehicle_IDs_in_simulation = []
+        # controlled vehicles in the simulation, in order of departure, kept up to date from the departed
+        # and arrived vehicles of every step so that a step does no work per uncontrolled vehicle
+        controlled_in_simulation = {}
+        profiler = self.profiler
+        controller_name = type(self.route_controller).__name__
+        replan_requests = self.route_controller.replan_requests
+        self.num_decisions = 0
+        self.num_route_writes = 0
+        self.num_stale_decisions = 0
+        self.edge_count_drift = 0
+        self.num_reconciliations = 0
+        # pipelined mode: the batch being decided by the worker and the decided batches waiting for their step,
+        # both as (step to apply in, decisions or their future, {vehicle_id: edge decided on})
+        worker = ThreadPoolExecutor(max_workers=1) if self.pipeline_lag > 0 else None
+        in_flight = None
+        decided = deque()
 
         try:
             while traci.simulation.getMinExpectedNumber() > 0:
-                vehicle_ids = set(traci.vehicle.getIDList())
+                if profiler is not None:
+                    profiler.start_step(step)
+                if in_flight is not None:
+                    apply_step, future, decided_edges = in_flight
+                    decided.append((apply_step, future.result(), decided_edges))
+                    in_flight = None
+                    if profiler is not None:
+                        profiler.end_phase("decision_wait")
+                state = self.state
+                state.update()
+                for vehicle_id in state.departed_ids:
+                    if vehicle_id in self.controlled_vehicles:
+                        controlled_in_simulation[vehicle_id] = self.controlled_vehicles[vehicle_id]
+                        if vehicle_id not in state.arrived_ids:
+                            traci.vehicle.setColor(vehicle_id, (255, 0, 0)) # set color so we can visually track controlled vehicles
+                        self.controlled_vehicles[vehicle_id].start_time = float(step)#Use the detected release time as start time
+                arrived_controlled = [vehicle_id for vehicle_id in state.arrived_ids
+                                      if controlled_in_simulation.pop(vehicle_id, None) is not None]
+                # before the next make_decisions is submitted, which may run in the pipeline worker
+                for vehicle_id in arrived_controlled:
+                    self.route_controller.forget(vehicle_id)
+                if profiler is not None:
+                    profiler.end_phase("state_update")
 
                 # store edge vehicle counts in connection_info.edge_vehicle_count
-                self.get_edge_vehicle_counts()
+                if self.uses_edge_counts:
+                    self.get_edge_vehicle_counts(step)
+                if self.travel_time_model is not None:
+                    self.get_edge_travel_times()
+                if profiler is not None:
+                    profiler.end_phase("edge_counts")
                 #initialize vehicles to be directed
                 vehicles_to_direct = []
-                # iterate through vehicles currently in simulation
-                for vehicle_id in vehicle_ids:
-
-                    #should not be added because there is no corresponding -1, this makes edge_vehicle_count becomes the total number of vehicles that used to be on this edge.
-                    #self.connection_info.edge_vehicle_count[traci.vehicle.getRoadID(vehicle_id)] += 1
-                    
-                    
-
-                    # handle newly arrived controlled vehicles
-                    if vehicle_id not in vehicle_IDs_in_simulation and vehicle_id in self.controlled_vehicles:
-                        vehicle_IDs_in_simulation.append(vehicle_id)
-                        traci.vehicle.setColor(vehicle_id, (255, 0, 0)) # set color so we can visually track controlled vehicles
-                        self.controlled_vehicles[vehicle_id].start_time = float(step)#Use the detected release time as start time
+                edge_index_dict = self.connection_info.edge_index_dict
+                # iterate through the controlled vehicles currently in simulation
+                for vehicle_id, vehicle in controlled_in_simulation.items():
+                    current_edge = state.road_id(vehicle_id)
 
-                    if vehicle_id in self.controlled_vehicles.keys():
-                        current_edge = traci.vehicle.getRoadID(vehicle_id)
+                    if current_edge not in edge_index_dict:
+                        continue
+                    elif current_edge == vehicle.destination:
+                        continue
 
-                        if current_edge not in self.connection_info.edge_index_dict.keys():
+                    #print("{} now on: {}, records on {}; {} ".format(vehicle_id, current_edge, vehicle.current_edge, current_edge!=vehicle.current_edge))
+                    if current_edge != vehicle.current_edge or vehicle_id in replan_requests:
+                        vehicle.current_edge = current_edge
+                        if self.follows_route(vehicle, step, replan_requests):
                             continue
-                        elif current_edge == self.controlled_vehicles[vehicle_id].destination:
-                            continue
-
-                        #print("{} now on: {}, records on {}; {} ".format(vehicle_id, current_edge, self.controlled_vehicles[vehicle_id].current_edge, current_edge!=self.controlled_vehicles[vehicle_id].current_edge))
-                        if current_edge != self.controlled_vehicles[vehicle_id].current_edge:
-                            self.controlled_vehicles[vehicle_id].current_edge = current_edge
-                            self.controlled_vehicles[vehicle_id].current_speed = traci.vehicle.getSpeed(vehicle_id)
-                            vehicles_to_direct.append(self.controlled_vehicles[vehicle_id])
+                        replan_requests.discard(vehicle_id)
+                        vehicle.current_speed = state.speed(vehicle_id)
+                        vehicles_to_direct.append(vehicle)
                 #print(len(vehicles_to_direct))
-                vehicle_decisions_by_id = self.route_controller.make_decisions(vehicles_to_direct, self.connection_info)
-                for vehicle_id, local_target_edge in vehicle_decisions_by_id.items():
-                    # if decision not in self.connection_info.outgoing_edges_dict[self.controlled_vehicles[vehicle_id].current_edge]:
-                    #     raise ValueError(f'{decision} does not lead to a valid edge from edge '
-                    #                      f'{self.controlled_vehicles[vehicle_id].current_edge}')
-                    #
-                    # current_edge_of_vehicle = self.controlled_vehicles[vehicle_id].current_edge
-                    # target_edge = self.connection_info.outgoing_edges_dict[current_edge_of_vehicle][decision]
-                    if vehicle_id in traci.vehicle.getIDList():
-                        #print("Changing the target of {} to {} with length {}".format(vehicle_id, local_target_edge, self.connection_info.edge_length_dict[local_target_edge]))
-                        traci.vehicle.changeTarget(vehicle_id, local_target_edge)
-                        self.controlled_vehicles[vehicle_id].local_destination = local_target_edge
-
-                arrived_at_destination = traci.simulation.getArrivedIDList()
-
-                for vehicle_id in arrived_at_destination:
-                    if vehicle_id in self.controlled_vehicles:
-                        #print the raw result out to the terminal
-                        arrived_at_destination = False
-                        if self.controlled_vehicles[vehicle_id].local_destination == self.controlled_vehicles[vehicle_id].destination:
-                            arrived_at_destination = True
-                        time_span = step - self.controlled_vehicles[vehicle_id].start_time
-                        total_time += time_span
-                        miss = False
-                        if step > self.controlled_vehicles[vehicle_id].deadline:
-                            deadlines_missed.append(vehicle_id)
-                            miss = True
-                        end_number += 1
+                if profiler is not None:
+                    profiler.end_phase("vehicle_scan")
+                self.num_decisions += len(vehicles_to_direct)
+                if worker is None:
+                    vehicle_decisions_by_id = self.route_controller.make_decisions(vehicles_to_direct, self.connection_info)
+                    if profiler is not None:
+                        profiler.end_phase("make_decisions")
+                        profiler.record_decisions(controller_name, len(vehicles_to_direct))
+                    self.apply_decisions(vehicle_decisions_by_id, controlled_in_simulation, step)
+                else:
+                    while decided and decided[0][0] <= step:
+                        _, vehicle_decisions_by_id, decided_edges = decided.popleft()
+                        self.apply_decisions(vehicle_decisions_by_id, controlled_in_simulation, step, decided_edges)
+                    # submitted every step like in serial mode, even with an empty batch, so that policies
+                    # updating their weights from connection_info.changed_edges see the changes of every step
+                    in_flight = (step + self.pipeline_lag,
+                                 worker.submit(self.route_controller.make_decisions, vehicles_to_direct,
+                                               self.connection_info),
+                                 {vehicle.vehicle_id: vehicle.current_edge for vehicle in vehicles_to_direct})
+
+                if profiler is not None:
+                    profiler.end_phase("change_target")
+
+                for vehicle_id in arrived_controlled:
+                    #print the raw result out to the terminal
+                    arrived_at_destination = False
+                    if self.controlled_vehicles[vehicle_id].local_destination == self.controlled_vehicles[vehicle_id].destination:
+                        arrived_at_destination = True
+                    time_span = step - self.controlled_vehicles[vehicle_id].start_time
+                    total_time += time_span
+                    miss = False
+                    if step > self.controlled_vehicles[vehicle_id].deadline:
+                        deadlines_missed.append(vehicle_id)
+                        miss = True
+                    end_number += 1
+                    if self.trip_sink is not None:
+                        self.trip_sink.write({"vehicle_id": vehicle_id,
+                                              "start_time": self.controlled_vehicles[vehicle_id].start_time,
+                                              "arrival_time": step, "time_span": time_span,
+                                              "deadline": self.controlled_vehicles[vehicle_id].deadline,
+                                              "deadline_missed": miss,
+                                              "reached_destination": arrived_at_destination})
+                    if self.verbose:
                         print("Vehicle {} reaches the destination: {}, timespan: {}, deadline missed: {}"\
                             .format(vehicle_id, arrived_at_destination, time_span, miss))
-                        #if not arrived_at_destination:
-                            #print("{} - {}".format(self.controlled_vehicles[vehicle_id].local_destination, self.controlled_vehicles[vehicle_id].destination))
+                    #if not arrived_at_destination:
+                        #print("{} - {}".format(self.controlled_vehicles[vehicle_id].local_destination, self.controlled_vehicles[vehicle_id].destination))
 
+                if profiler is not None:
+                    profiler.end_phase("arrivals")
                 traci.simulationStep()
+                if profiler is not None:
+                    profiler.end_phase("simulation_step")
                 step += 1
 
                 if step > MAX_SIMULATION_STEPS:
@@ -153,6 +277,13 @@ class StrSumo:
         except ValueError as err:
             print('Exception caught.')
             print(err)
+        finally:
+            if worker is not None:
+                worker.shutdown()
+            if self.trip_sink is not None:
+                self.trip_sink.close()
+            if profiler is not None:
+                profiler.finish()
 
         num_deadlines_missed = len(deadlines_missed)
         data = [total_time, end_number, num_deadlines_missed]
@@ -163,7 +294,88 @@ class StrSumo:
 
         return total_time, end_number, num_deadlines_missed
 
-    def get_edge_vehicle_counts(self):
-        for edge in self.connection_info.edge_list:
-            self.connection_info.edge_vehicle_count[edge] = traci.edge.getLastStepVehicleNumber(edge)
+    def apply_decisions(self, vehicle_decisions_by_id, controlled_in_simulation, step, decided_edges=None):
+        """
+        Sets the local targets (traci.vehicle.changeTarget) and full routes (traci.vehicle.setRoute) decided by
+        make_decisions for the controlled vehicles still in the simulation.
+        :param decided_edges: {vehicle_id: edge the decision was made on} for pipelined decisions, the decisions
+                              of vehicles no longer on that edge, or no longer in the simulation, are dropped
+                              and counted in num_stale_decisions
+        """
+        for vehicle_id, decision in vehicle_decisions_by_id.items():
+            # if decision not in self.connection_info.outgoing_edges_dict[self.controlled_vehicles[vehicle_id].current_edge]:
+            #     raise ValueError(f'{decision} does not lead to a valid edge from edge '
+            #                      f'{self.controlled_vehicles[vehicle_id].current_edge}')
+            #
+            # current_edge_of_vehicle = self.controlled_vehicles[vehicle_id].current_edge
+            # target_edge = self.connection_info.outgoing_edges_dict[current_edge_of_vehicle][decision]
+            if vehicle_id not in controlled_in_simulation:
+                if decided_edges is not None:
+                    self.num_stale_decisions += 1
+                continue
+            vehicle = self.controlled_vehicles[vehicle_id]
+            if decided_edges is not None and decided_edges.get(vehicle_id) != vehicle.current_edge:
+                # a newer decision for the new edge is on its way
+                self.num_stale_decisions += 1
+                continue
+            if isinstance(decision, FullRoute):
+                traci.vehicle.setRoute(vehicle_id, decision.edges)
+                vehicle.route = decision.edges
+                vehicle.route_position = 0
+                vehicle.route_step = step
+                vehicle.local_destination = decision.edges[-1]
+            else:
+                #print("Changing the target of {} to {} with length {}".format(vehicle_id, decision, self.connection_info.edge_length_dict[decision]))
+                traci.vehicle.changeTarget(vehicle_id, decision)
+                vehicle.route = None
+                vehicle.local_destination = decision
+            self.num_route_writes += 1
+
+    def follows_route(self, vehicle, step, replan_requests):
+        """
+        True if vehicle needs no new decision on vehicle.current_edge: it follows the FullRoute it was given,
+        no replan was requested and the route is younger than replan_interval. Advances vehicle.route_position.
+        """
+        route = vehicle.route
+        if route is None or vehicle.vehicle_id in replan_requests:
+            return False
+        if self.replan_interval is not None and step - vehicle.route_step >= self.replan_interval:
+            return False
+        try:
+            vehicle.route_position = route.index(vehicle.current_edge, vehicle.route_position)
+        except ValueError:
+            # left the route, e.g. teleported
+            return False
+        return True
+
+    def get_edge_vehicle_counts(self, step=0):
+        """
+        Stores the number of vehicles on every edge in connection_info.edge_vehicle_counts (and the
+        densities in connection_info.edge_densities) and the edges whose count changed since the last call in connection_info.changed_edges
+        :param step: current step, for the reconciliation of the local counts every reconcile_interval steps
+        """
+        occupancy = self.state.occupancy if self.local_edge_counts else None
+        if occupancy is None:
+            counts = self.sumo_edge_vehicle_counts(self.state)
+        else:
+            if self.reconcile_interval is not None and step % self.reconcile_interval == 0:
+                self.edge_count_drift += occupancy.reconcile(self.sumo_edge_vehicle_counts())
+                self.num_reconciliations += 1
+            counts = occupancy.count_array()
+        self.connection_info.set_edge_vehicle_counts(counts)
 
+    def get_edge_travel_times(self):
+        """
+        Updates travel_time_model, and with it connection_info.edge_travel_times, from the mean speeds and
+        occupancies of the edges of connection_info.edge_list, read in bulk from the state
+        """
+        self.travel_time_model.update(*self.state.edge_speed_arrays())
+
+    def sumo_edge_vehicle_counts(self, state=None):
+        """
+        :param state: state to read the counts from, None to ask traci.edge for each edge
+        :return: NumPy array of the vehicle numbers of the edges of connection_info.edge_list in that order
+        """
+        edge_list = self.connection_info.edge_list
+        edge_vehicle_count = traci.edge.getLastStepVehicleNumber if state is None else state.edge_vehicle_count
+        return np.fromiter((edge_vehicle_count(edge) for edge in edge_list), dtype=np.int64, count=len(edge_list))
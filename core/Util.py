@@ -1,5 +1,8 @@
 import os
 import sys
+import hashlib
+from collections.abc import MutableMapping
+import numpy as np
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
     sys.path.append(tools)
@@ -8,6 +11,52 @@ else:
 from sumolib import net
 import sumolib
 
+def file_hash(file_name):
+    """
+    :param file_name: path of the file to hash
+    :return: SHA-1 hex digest of the file contents, used to key files derived from a net file
+    """
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EdgeArrayView(MutableMapping):
+    """
+    Dict view {edge_id: value} of an array indexed by edge index; reads and writes go to the array.
+    :param array: NumPy array indexed by edge index
+    :param edge_index_dict: {edge_id: edge index}
+    :param on_set: called with the edge index after a value was written, None if nothing depends on it
+    """
+    def __init__(self, array, edge_index_dict, on_set=None):
+        self.array = array
+        self.edge_index_dict = edge_index_dict
+        self.on_set = on_set
+
+    def __getitem__(self, edge_id):
+        return self.array[self.edge_index_dict[edge_id]].item()
+
+    def __setitem__(self, edge_id, value):
+        edge_index = self.edge_index_dict[edge_id]
+        self.array[edge_index] = value
+        if self.on_set is not None:
+            self.on_set(edge_index)
+
+    def __delitem__(self, edge_id):
+        raise TypeError("Edges cannot be removed from an edge array view")
+
+    def __iter__(self):
+        return iter(self.edge_index_dict)
+
+    def __len__(self):
+        return len(self.edge_index_dict)
+
+    def __contains__(self, edge_id):
+        return edge_id in self.edge_index_dict
+
+
 class Vehicle:
     def __init__(self, vehicle_id, destination, start_time, deadline):
         """
@@ -24,6 +73,27 @@ class Vehicle:
         self.current_edge = ""
         self.current_speed = 0.0
         self.local_destination = ""
+        # full route set by a FullRoute decision, None while steered by local targets
+        self.route = None
+        self.route_position = 0  # index of current_edge in route
+        self.route_step = 0  # step the route was set in
+
+
+class FullRoute:
+    """
+    Decision of make_decisions setting the whole route of a vehicle (traci.vehicle.setRoute) instead of
+    a local target (traci.vehicle.changeTarget). StrSumo does not ask for a new decision while the vehicle
+    follows the route, only when it leaves the route, when the controller asks for it with
+    RouteController.request_replan, or after StrSumo's replan_interval.
+    :param edges: [edge_id] from the current edge of the vehicle to its destination
+    """
+    __slots__ = ["edges"]
+
+    def __init__(self, edges):
+        self.edges = list(edges)
+
+    def __repr__(self):
+        return "FullRoute({})".format(self.edges)
 
 
 class ConnectionInfo:
@@ -34,52 +104,77 @@ class ConnectionInfo:
         - out_going_edges_dict {edge_id: {direction: out_edge}}
         - edge_length_dict {edge_id: edge_length}
         - edge_index_dict {edge_index_dict} keep track of edge ids by an index
-        - edge_vehicle_count {edge_id: number of vehicles at edge}
+        - edge_vehicle_count {edge_id: number of vehicles at edge}, a view of edge_vehicle_counts
+        - changed_edges [edge_id] edges whose vehicle count changed at the last update of edge_vehicle_count
         - edge_list [edge_id]
+    and as NumPy arrays indexed by edge index (see edge_index_dict):
+        - edge_lengths
+        - edge_speeds: speed limit (free-flow speed) in m/s
+        - edge_travel_times: travel time in s, the free-flow time edge_lengths / edge_speeds until a
+          TravelTimeModel (see core/travel_time.py) updates it from the simulation
+        - edge_vehicle_counts: number of vehicles at edge
+        - edge_densities: edge_vehicle_counts / edge_lengths
+        - edge_list_indices: edge index of each edge of edge_list, e.g. edge_densities[edge_list_indices]
+          gives the densities in edge_list order
+    Other members:
+        - compiled_network: CompiledNetwork the collections were built from
+        - state_sync: per-step vehicle and edge state of the running simulation (see core/state_sync.py),
+          set by StrSumo, None outside of a simulation
     :param net_file: file name of a SUMO network file, e.g. 'test.net.xml'
+    :param use_cache: load the compiled network stored next to net_file (see core/compiled_network.py)
+                      instead of parsing net_file
     """
-    def __init__(self, net_file):
+    def __init__(self, net_file, use_cache=True):
+        from core.compiled_network import load_compiled_network, compile_network
         self.net_filename = net_file
-        net = sumolib.net.readNet(net_file)
+        network = load_compiled_network(net_file) if use_cache else compile_network(net_file)
+        self.compiled_network = network
         self.outgoing_edges_dict = {}
         self.edge_length_dict = {}
         self.edge_index_dict = {}
-        self.edge_vehicle_count = {}
+        self.changed_edges = []
         self.edge_list = []
-
-        edge_index = 0
-
-        edges = net.getEdges()
+        self.state_sync = None
 
         # collect edge information into dictionaries
-        for current_edge in edges:
-            current_edge_id = current_edge.getID()
-
+        for edge_index, current_edge_id in enumerate(network.edge_ids):
             # add edge to edge list if it allows passenger vehicles
             # "passenger" is a SUMO defined vehicle class
-            if current_edge.allows("passenger"):
+            if network.allows(edge_index, "passenger"):
                 self.edge_list.append(current_edge_id)
+            self.edge_index_dict[current_edge_id] = edge_index
+            self.outgoing_edges_dict[current_edge_id] = {}
+            self.edge_length_dict[current_edge_id] = network.edge_lengths[edge_index]
+
+        # collect outgoing edges by direction
+        edge_ids = network.edge_ids
+        for from_index, to_index, direction in zip(network.connection_from, network.connection_to,
+                                                   network.connection_direction):
+            if network.allows(to_index, "passenger"):
+                self.outgoing_edges_dict[edge_ids[from_index]][direction] = edge_ids[to_index]
+
+        self.edge_lengths = np.array(network.edge_lengths, dtype=np.float64)
+        self.edge_speeds = np.array(network.edge_speeds, dtype=np.float64)
+        self.edge_travel_times = self.edge_lengths / self.edge_speeds
+        self.edge_vehicle_counts = np.zeros(len(edge_ids), dtype=np.int64)
+        self.edge_densities = np.zeros(len(edge_ids), dtype=np.float64)
+        self.edge_list_indices = np.array([self.edge_index_dict[edge] for edge in self.edge_list], dtype=np.int64)
+        self.edge_vehicle_count = EdgeArrayView(self.edge_vehicle_counts, self.edge_index_dict, self.update_edge_density)
 
-            if current_edge_id in self.edge_index_dict.keys():
-                print(current_edge_id + "already exists!")
-            else:
-                self.edge_index_dict[current_edge_id] = edge_index
-                edge_index += 1
-            if current_edge_id in self.outgoing_edges_dict.keys():
-                print(current_edge_id + "already exists!")
-            else:
-                self.outgoing_edges_dict[current_edge_id] = {}
-            if current_edge_id in self.edge_length_dict.keys():
-                print(current_edge_id + "already exists!")
-            else:
-                self.edge_length_dict[current_edge_id] = current_edge.getLength()
-
-            # collect outgoing edges by direction
-            outgoing_edges = current_edge.getOutgoing()
-            for current_outgoing_edge in outgoing_edges:
-                if not current_outgoing_edge.allows("passenger"):
-                    continue
-                connections = current_edge.getConnections(current_outgoing_edge)
-                for connection in connections:
-                    direction = connection.getDirection()
-                    self.outgoing_edges_dict[current_edge_id][direction] = current_outgoing_edge.getID()
+    def update_edge_density(self, edge_index):
+        self.edge_densities[edge_index] = self.edge_vehicle_counts[edge_index] / self.edge_lengths[edge_index]
+
+    def set_edge_vehicle_counts(self, counts):
+        """
+        Stores the vehicle counts of the edges of edge_list and updates the densities.
+        :param counts: NumPy array of the vehicle counts in edge_list order
+        :return: [edge_id] edges whose count changed, also stored in changed_edges
+        """
+        indices = self.edge_list_indices
+        changed = np.flatnonzero(self.edge_vehicle_counts[indices] != counts)
+        changed_indices = indices[changed]
+        self.edge_vehicle_counts[changed_indices] = counts[changed]
+        self.edge_densities[changed_indices] = counts[changed] / self.edge_lengths[changed_indices]
+        edge_list = self.edge_list
+        self.changed_edges = [edge_list[i] for i in changed.tolist()]
+        return self.changed_edges
@@ -0,0 +1,201 @@
+"""
+    Compiled form of a SUMO network file: the edges with their lengths, speed limits, lane counts
+    and allowed vehicle classes, and the direction-labelled connections between them, as flat lists indexed by
+    the position of the edge in the net file (the edge index of ConnectionInfo).
+
+    Parsing a net file with sumolib takes seconds on the larger maps; the compiled network
+    is stored next to the net file (<net file>.compiled) and loads in milliseconds. It is
+    recompiled automatically when the file was written by another NETWORK_FILE_VERSION or
+    for a net file with different content.
+"""
+
+import heapq
+import os
+import pickle
+import sys
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("No environment variable SUMO_HOME!")
+import sumolib
+from core.Util import file_hash
+
+NETWORK_FILE_VERSION = 2
+
+
+class CompiledEdge:
+    """
+    Stand-in for sumolib.net.edge.Edge offering the methods the vehicle generator uses.
+    """
+    __slots__ = ["network", "index", "id"]
+
+    def __init__(self, network, index):
+        self.network = network
+        self.index = index
+        self.id = network.edge_ids[index]
+
+    def getID(self):
+        return self.id
+
+    def getLength(self):
+        return self.network.edge_lengths[self.index]
+
+    def getSpeed(self):
+        return self.network.edge_speeds[self.index]
+
+    def getLaneNumber(self):
+        return self.network.edge_lane_counts[self.index]
+
+    def allows(self, vehicle_class):
+        return self.network.allows(self.index, vehicle_class)
+
+    def __repr__(self):
+        return '<edge id="{}"/>'.format(self.id)
+
+
+class CompiledNetwork:
+    """
+    Available collections:
+        - edge_ids [edge_id] by edge index
+        - edge_lengths [edge_length] by edge index
+        - edge_speeds [speed limit in m/s] by edge index
+        - edge_lane_counts [number of lanes] by edge index
+        - edge_allowed_classes [frozenset of vehicle classes allowed on any lane] by edge index
+        - connection_from, connection_to [edge index], connection_direction [direction]: the
+          connections in net file order, one entry per lane-to-lane connection
+        - outgoing [[edge index]] distinct successors of each edge, in net file order
+        - edges [CompiledEdge] by edge index
+    """
+    def __init__(self, edge_ids, edge_lengths, edge_speeds, edge_lane_counts, edge_allowed_classes,
+                 connection_from, connection_to, connection_direction):
+        self.edge_ids = edge_ids
+        self.edge_lengths = edge_lengths
+        self.edge_speeds = edge_speeds
+        self.edge_lane_counts = edge_lane_counts
+        self.edge_allowed_classes = edge_allowed_classes
+        self.connection_from = connection_from
+        self.connection_to = connection_to
+        self.connection_direction = connection_direction
+        self.edge_index_dict = {edge_id: i for i, edge_id in enumerate(edge_ids)}
+        self.outgoing = [[] for _ in edge_ids]
+        for from_index, to_index in zip(connection_from, connection_to):
+            successors = self.outgoing[from_index]
+            if to_index not in successors:
+                successors.append(to_index)
+        self.edges = [CompiledEdge(self, i) for i in range(len(edge_ids))]
+
+    def allows(self, edge_index, vehicle_class):
+        """
+        Same as sumolib.net.edge.Edge.allows: true if a lane of the edge allows vehicle_class.
+        """
+        if vehicle_class is None or vehicle_class == "ignoring":
+            return True
+        return vehicle_class in self.edge_allowed_classes[edge_index]
+
+    def getEdges(self):
+        return self.edges
+
+    def getEdge(self, edge_id):
+        return self.edges[self.edge_index_dict[edge_id]]
+
+    def getShortestPath(self, from_edge, to_edge):
+        """
+        Dijkstra over all connections by edge length, like sumolib.net.Net.getShortestPath
+        without a vehicle class.
+        :param from_edge: CompiledEdge
+        :param to_edge: CompiledEdge
+        :return: (tuple of CompiledEdge, length including both end edges), (None, inf) if unreachable
+        """
+        source = from_edge.index
+        target = to_edge.index
+        lengths = self.edge_lengths
+        distance = {source: lengths[source]}
+        previous = {}
+        queue = [(lengths[source], source)]
+        while queue:
+            cost, edge_index = heapq.heappop(queue)
+            if edge_index == target:
+                path = [edge_index]
+                while edge_index != source:
+                    edge_index = previous[edge_index]
+                    path.append(edge_index)
+                return tuple(self.edges[i] for i in reversed(path)), cost
+            if cost > distance[edge_index]:
+                continue
+            for successor in self.outgoing[edge_index]:
+                candidate = cost + lengths[successor]
+                if candidate < distance.get(successor, float('inf')):
+                    distance[successor] = candidate
+                    previous[successor] = edge_index
+                    heapq.heappush(queue, (candidate, successor))
+        return None, float('inf')
+
+
+def compile_network(net_file):
+    """
+    Parses net_file with sumolib.
+    :param net_file: the SUMO network file, e.g. 'test.net.xml'
+    :return: CompiledNetwork
+    """
+    net = sumolib.net.readNet(net_file)
+    edges = net.getEdges()
+    edge_ids = [edge.getID() for edge in edges]
+    edge_index_dict = {}
+    for i, edge_id in enumerate(edge_ids):
+        edge_index_dict.setdefault(edge_id, i)
+    edge_lengths = [edge.getLength() for edge in edges]
+    edge_speeds = [edge.getSpeed() for edge in edges]
+    edge_lane_counts = [edge.getLaneNumber() for edge in edges]
+    edge_allowed_classes = [frozenset().union(*(lane.getPermissions() for lane in edge.getLanes())) for edge in edges]
+    connection_from = []
+    connection_to = []
+    connection_direction = []
+    for i, edge in enumerate(edges):
+        for outgoing_edge in edge.getOutgoing():
+            for connection in edge.getConnections(outgoing_edge):
+                connection_from.append(i)
+                connection_to.append(edge_index_dict[outgoing_edge.getID()])
+                connection_direction.append(connection.getDirection())
+    return CompiledNetwork(edge_ids, edge_lengths, edge_speeds, edge_lane_counts, edge_allowed_classes,
+                           connection_from, connection_to, connection_direction)
+
+
+def network_file_name(net_file):
+    return net_file + ".compiled"
+
+
+def load_compiled_network(net_file, network_file=None):
+    """
+    Loads the compiled form of net_file, compiling and saving it if there is no valid file.
+    :param net_file: the SUMO network file, e.g. 'test.net.xml'
+    :param network_file: where the compiled network is stored, next to net_file by default
+    :return: CompiledNetwork
+    """
+    if network_file is None:
+        network_file = network_file_name(net_file)
+    net_hash = file_hash(net_file)
+    if os.path.exists(network_file):
+        try:
+            with open(network_file, 'rb') as f:
+                stored = pickle.load(f)
+            if stored["version"] == NETWORK_FILE_VERSION and stored["net_hash"] == net_hash:
+                return CompiledNetwork(stored["edge_ids"], stored["edge_lengths"], stored["edge_speeds"],
+                                       stored["edge_lane_counts"], stored["edge_allowed_classes"],
+                                       stored["connection_from"], stored["connection_to"],
+                                       stored["connection_direction"])
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError) as err:
+            print("Ignoring unreadable network file {}: {}".format(network_file, err))
+
+    network = compile_network(net_file)
+    stored = {"version": NETWORK_FILE_VERSION, "net_hash": net_hash, "edge_ids": network.edge_ids,
+              "edge_lengths": network.edge_lengths, "edge_speeds": network.edge_speeds,
+              "edge_lane_counts": network.edge_lane_counts, "edge_allowed_classes": network.edge_allowed_classes,
+              "connection_from": network.connection_from, "connection_to": network.connection_to,
+              "connection_direction": network.connection_direction}
+    try:
+        with open(network_file, 'wb') as f:
+            pickle.dump(stored, f, pickle.HIGHEST_PROTOCOL)
+    except OSError as err:
+        print("Could not save network file {}: {}".format(network_file, err))
+    return network
@@ -0,0 +1,355 @@
+"""
+    Contraction hierarchy over the turn graph of a ConnectionInfo.
+
+    Nodes are SUMO edges and arcs are the allowed turns, as in
+    core/shortest_path_engine.RoutingGraph. The hierarchy is built in two phases:
+        1. contraction: the nodes are ordered by nested dissection and contracted one by one. Every
+           in-neighbour/out-neighbour pair of a contracted node gets a shortcut, without
+           witness searches, so the shortcut topology does not depend on the weights.
+        2. customization: given the cost of entering each edge, the weight of every arc is
+           computed bottom-up in contraction order. This is cheap compared to phase 1,
+           so congestion weights can be refreshed every step.
+    The topology of phase 1 is persisted next to the net file and keyed by the hash of
+    the net file, so it is only computed once per map.
+"""
+
+import heapq
+import os
+import pickle
+from core.Util import file_hash
+from core.shortest_path_engine import INFINITY, NO_EDGE
+
+HIERARCHY_FILE_VERSION = 1
+
+
+class ContractionHierarchy:
+    """
+    Available collections:
+        - rank [int] contraction order by edge index
+        - arc_tail, arc_head [edge_index] of every hierarchy arc (original arcs and shortcuts)
+        - arc_original [arc_index] arc of the RoutingGraph, NO_EDGE for shortcuts
+        - arc_weight [cost] customized weight of every hierarchy arc
+        - arc_middle [edge_index] node the arc's shortest path goes through, NO_EDGE if the
+          arc is an original arc under the current weights
+        - upward_arcs [[arc_index]] arcs leaving each node towards a higher rank
+        - downward_arcs [[arc_index]] arcs entering each node from a higher rank
+    :param graph: RoutingGraph built from a ConnectionInfo
+    :param rank: contraction order by edge index; computed when None
+    :param arc_pairs: [(tail, head)] of the hierarchy arcs; computed when None
+    """
+    def __init__(self, graph, rank=None, arc_pairs=None):
+        self.graph = graph
+        if rank is None or arc_pairs is None:
+            rank, arc_pairs = contract(graph)
+        self.rank = rank
+        self.settled_count = 0
+
+        num_edges = graph.num_edges()
+        original_arcs = {}
+        for arc in range(len(graph.adjacency_target)):
+            original_arcs.setdefault((graph.adjacency_source[arc], graph.adjacency_target[arc]), arc)
+
+        self.arc_tail = []
+        self.arc_head = []
+        self.arc_original = []
+        self.arc_index = {}
+        self.upward_arcs = [[] for _ in range(num_edges)]
+        self.downward_arcs = [[] for _ in range(num_edges)]
+        for tail, head in arc_pairs:
+            arc = len(self.arc_tail)
+            self.arc_index[(tail, head)] = arc
+            self.arc_tail.append(tail)
+            self.arc_head.append(head)
+            self.arc_original.append(original_arcs.get((tail, head), NO_EDGE))
+            if rank[head] > rank[tail]:
+                self.upward_arcs[tail].append(arc)
+            else:
+                self.downward_arcs[head].append(arc)
+
+        # nodes in contraction order, with the lower triangles to relax during customization
+        self.contraction_order = sorted(range(num_edges), key=lambda edge_index: rank[edge_index])
+        self.arc_weight = []
+        self.arc_middle = []
+        self.customize()
+
+    def customize(self, weights=None):
+        """
+        Computes the weight of every hierarchy arc for the given edge costs.
+        :param weights: cost of entering each edge by edge index, edge lengths if None
+        """
+        if weights is None:
+            weights = self.graph.edge_lengths
+        arc_head = self.arc_head
+        arc_tail = self.arc_tail
+        arc_index = self.arc_index
+        arc_weight = [weights[arc_head[arc]] if original != NO_EDGE else INFINITY
+                      for arc, original in enumerate(self.arc_original)]
+        arc_middle = [NO_EDGE] * len(arc_weight)
+
+        # process the lower triangles (u -> v -> w, v contracted before u and w) bottom-up
+        for middle in self.contraction_order:
+            for incoming in self.downward_arcs[middle]:
+                incoming_weight = arc_weight[incoming]
+                if incoming_weight == INFINITY:
+                    continue
+                tail = arc_tail[incoming]
+                for outgoing in self.upward_arcs[middle]:
+                    head = arc_head[outgoing]
+                    if head == tail:
+                        continue
+                    new_weight = incoming_weight + arc_weight[outgoing]
+                    arc = arc_index[(tail, head)]
+                    if new_weight < arc_weight[arc]:
+                        arc_weight[arc] = new_weight
+                        arc_middle[arc] = middle
+        self.arc_weight = arc_weight
+        self.arc_middle = arc_middle
+
+    def set_weights(self, weights, changed_edges=None):
+        # the customization is cheap enough to redo completely
+        self.customize(weights)
+
+    def search(self, source, destination):
+        """
+        Bidirectional upward Dijkstra.
+        :param source: edge index the vehicle is on
+        :param destination: edge index of the destination
+        :return: (cost, [arc_index]) with arcs of the RoutingGraph, (INFINITY, None) if unreachable
+        """
+        if source == destination:
+            self.settled_count = 0
+            return 0.0, []
+        arc_weight = self.arc_weight
+        distances = ({source: 0.0}, {destination: 0.0})
+        parents = ({source: NO_EDGE}, {destination: NO_EDGE})
+        heaps = ([(0.0, source)], [(0.0, destination)])
+        settled = (set(), set())
+        adjacency = (self.upward_arcs, self.downward_arcs)
+        next_node = (self.arc_head, self.arc_tail)
+        best = INFINITY
+        meeting_node = NO_EDGE
+
+        while heaps[0] or heaps[1]:
+            # advance the direction with the smaller key; a direction is done once its key reaches best
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            current_distance, node = heapq.heappop(heaps[side])
+            if current_distance >= best:
+                heaps[side].clear()
+                continue
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+            other_distance = distances[1 - side].get(node)
+            if other_distance is not None and current_distance + other_distance < best:
+                best = current_distance + other_distance
+                meeting_node = node
+            distance = distances[side]
+            for arc in adjacency[side][node]:
+                neighbour = next_node[side][arc]
+                new_distance = current_distance + arc_weight[arc]
+                if new_distance < distance.get(neighbour, INFINITY):
+                    distance[neighbour] = new_distance
+                    parents[side][neighbour] = arc
+                    heapq.heappush(heaps[side], (new_distance, neighbour))
+        self.settled_count = len(settled[0]) + len(settled[1])
+
+        if meeting_node == NO_EDGE:
+            return INFINITY, None
+        hierarchy_arcs = []
+        node = meeting_node
+        while node != source:
+            arc = parents[0][node]
+            hierarchy_arcs.append(arc)
+            node = self.arc_tail[arc]
+        hierarchy_arcs.reverse()
+        node = meeting_node
+        while node != destination:
+            arc = parents[1][node]
+            hierarchy_arcs.append(arc)
+            node = self.arc_head[arc]
+
+        arcs = []
+        for arc in hierarchy_arcs:
+            self.unpack(arc, arcs)
+        return best, arcs
+
+    def unpack(self, arc, arcs):
+        """
+        Appends the RoutingGraph arcs represented by a hierarchy arc to arcs.
+        """
+        stack = [arc]
+        while stack:
+            arc = stack.pop()
+            middle = self.arc_middle[arc]
+            if middle == NO_EDGE:
+                arcs.append(self.arc_original[arc])
+            else:
+                # push the second half first so that the first half is unpacked first
+                stack.append(self.arc_index[(middle, self.arc_head[arc])])
+                stack.append(self.arc_index[(self.arc_tail[arc], middle)])
+
+    def route(self, source_edge, destination_edge):
+        """
+        :param source_edge: edge id the vehicle is on
+        :param destination_edge: edge id of the destination
+        :return: list of directions leading to destination_edge, empty if it is unreachable
+        """
+        graph = self.graph
+        cost, arcs = self.search(graph.edge_index_dict[source_edge], graph.edge_index_dict[destination_edge])
+        if arcs is None:
+            return []
+        return graph.arcs_to_directions(arcs)
+
+
+def nested_dissection_order(graph, leaf_size=8):
+    """
+    Orders the nodes of graph for contraction by recursive bisection of its undirected view.
+    A part is split at the smallest balanced breadth-first level counted from a peripheral
+    node; the nodes of that level form the separator and are ranked above both halves. Small
+    separators keep the number of shortcuts low even though no witness searches are done.
+    :param graph: RoutingGraph built from a ConnectionInfo
+    :param leaf_size: parts with at most this many nodes are not split further
+    :return: list of edge indices, lowest rank first
+    """
+    num_edges = graph.num_edges()
+    neighbours = [set() for _ in range(num_edges)]
+    for arc in range(len(graph.adjacency_target)):
+        tail, head = graph.adjacency_source[arc], graph.adjacency_target[arc]
+        if tail != head:
+            neighbours[tail].add(head)
+            neighbours[head].add(tail)
+
+    def levels_from(start, part):
+        level = {start: 0}
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for neighbour in neighbours[node]:
+                    if neighbour in part and neighbour not in level:
+                        level[neighbour] = level[node] + 1
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        return level
+
+    order = []
+    # each work item is (part, done); a part is emitted after the parts pushed above it
+    stack = [(set(range(num_edges)), False)]
+    while stack:
+        part, done = stack.pop()
+        if done or len(part) <= leaf_size:
+            order.extend(sorted(part, key=lambda node: len(neighbours[node])))
+            continue
+        start = next(iter(part))
+        level = levels_from(start, part)
+        if len(level) < len(part):
+            # disconnected part: its components are independent
+            rest = part - set(level)
+            stack.append((rest, False))
+            stack.append((set(level), False))
+            continue
+        # restart from the farthest node to get a peripheral start and long, thin levels
+        start = max(level, key=level.get)
+        level = levels_from(start, part)
+        depth = max(level.values())
+        if depth < 2:
+            order.extend(sorted(part, key=lambda node: len(neighbours[node])))
+            continue
+        # cut at the smallest level that leaves at least a third of the rest on each side
+        level_sizes = [0] * (depth + 1)
+        for node_level in level.values():
+            level_sizes[node_level] += 1
+        cut = None
+        below = 0
+        for node_level in range(1, depth):
+            below += level_sizes[node_level - 1]
+            above = len(part) - below - level_sizes[node_level]
+            if 3 * min(below, above) >= below + above:
+                if cut is None or level_sizes[node_level] < level_sizes[cut]:
+                    cut = node_level
+        if cut is None:
+            cut = sorted(level.values())[len(level) // 2]
+            cut = min(max(cut, 1), depth - 1)
+        separator = set(node for node, node_level in level.items() if node_level == cut)
+        lower = set(node for node, node_level in level.items() if node_level < cut)
+        upper = set(node for node, node_level in level.items() if node_level > cut)
+        # the separator is contracted last, after both halves
+        stack.append((separator, True))
+        stack.append((upper, False))
+        stack.append((lower, False))
+    return order
+
+
+def contract(graph):
+    """
+    Contracts the nodes of graph in nested dissection order.
+    Every in-neighbour/out-neighbour pair of a contracted node is connected by a shortcut,
+    so the result is valid for any weights given to ContractionHierarchy.customize.
+    :param graph: RoutingGraph built from a ConnectionInfo
+    :return: (rank by edge index, [(tail, head)] of all arcs of the hierarchy)
+    """
+    num_edges = graph.num_edges()
+    successors = [set() for _ in range(num_edges)]
+    predecessors = [set() for _ in range(num_edges)]
+    for arc in range(len(graph.adjacency_target)):
+        tail, head = graph.adjacency_source[arc], graph.adjacency_target[arc]
+        if tail != head:
+            successors[tail].add(head)
+            predecessors[head].add(tail)
+    arc_pairs = set((tail, head) for tail in range(num_edges) for head in successors[tail])
+
+    rank = [0] * num_edges
+    for node_rank, node in enumerate(nested_dissection_order(graph)):
+        rank[node] = node_rank
+        for tail in predecessors[node]:
+            for head in successors[node]:
+                if head != tail and head not in successors[tail]:
+                    successors[tail].add(head)
+                    predecessors[head].add(tail)
+                    arc_pairs.add((tail, head))
+        # remove the node from the remaining graph
+        for tail in predecessors[node]:
+            successors[tail].discard(node)
+        for head in successors[node]:
+            predecessors[head].discard(node)
+        predecessors[node] = set()
+        successors[node] = set()
+    return rank, sorted(arc_pairs)
+
+
+def hierarchy_file_name(net_file):
+    return net_file + ".ch"
+
+
+def load_contraction_hierarchy(graph, net_file, hierarchy_file=None):
+    """
+    Loads the hierarchy of net_file, contracting and saving it if there is no valid file.
+    A file is valid if it was written by the same HIERARCHY_FILE_VERSION for a net file
+    with the same content hash.
+    :param graph: RoutingGraph built from the ConnectionInfo of net_file
+    :param net_file: the SUMO network file, e.g. 'test.net.xml'
+    :param hierarchy_file: where the hierarchy is stored, next to net_file by default
+    :return: ContractionHierarchy customized with the edge lengths
+    """
+    if hierarchy_file is None:
+        hierarchy_file = hierarchy_file_name(net_file)
+    net_hash = file_hash(net_file)
+    if os.path.exists(hierarchy_file):
+        try:
+            with open(hierarchy_file, 'rb') as f:
+                stored = pickle.load(f)
+            if stored["version"] == HIERARCHY_FILE_VERSION and stored["net_hash"] == net_hash \
+                    and stored["edge_ids"] == graph.edge_ids:
+                return ContractionHierarchy(graph, stored["rank"], stored["arc_pairs"])
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError) as err:
+            print("Ignoring unreadable hierarchy file {}: {}".format(hierarchy_file, err))
+
+    rank, arc_pairs = contract(graph)
+    stored = {"version": HIERARCHY_FILE_VERSION, "net_hash": net_hash, "edge_ids": graph.edge_ids,
+              "rank": rank, "arc_pairs": arc_pairs}
+    try:
+        with open(hierarchy_file, 'wb') as f:
+            pickle.dump(stored, f, pickle.HIGHEST_PROTOCOL)
+    except OSError as err:
+        print("Could not save hierarchy file {}: {}".format(hierarchy_file, err))
+    return ContractionHierarchy(graph, rank, arc_pairs)
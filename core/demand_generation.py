@@ -0,0 +1,117 @@
+"""
+    Writes the route file of a run in one pass: the random background trips, routed along the
+    fastest path at free flow like randomTrips.py -r does through duarouter, merged with the
+    controlled vehicles in order of departure.
+
+    Every input is a stream (a generator of vehicles), so the memory used does not grow with the
+    number of background vehicles. The file keeps the schema and vehicle IDs written by
+    target_vehicles_generator.generate_vehicles so far:
+        <routes>
+            <vehicle id="0" depart="0.00">
+                <route edges="..."/>
+            </vehicle>
+            ...
+        </routes>
+    i.e. the background vehicles are numbered by trip, the controlled vehicles are numbered on from
+    the number of trips and have their start edge as route, and a controlled vehicle departing at
+    the same time as background vehicles comes after them.
+
+    A vehicle is (vehicle_id, depart in seconds, depart as written, [edge_id]).
+"""
+
+import heapq
+import math
+import random
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import quoteattr
+from core.shortest_path_engine import ShortestPathEngine, get_routing_graph
+
+ROUTES_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                '<routes xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" ' \
+                'xsi:noNamespaceSchemaLocation="http://sumo.dlr.de/xsd/routes_file.xsd">\n'
+ROUTES_FOOTER = '</routes>\n'
+VEHICLE_FORMAT = '    <vehicle id={} depart={}>\n        <route edges={}/>\n    </vehicle>\n'
+BUFFER_SIZE = 1 << 16
+
+
+def trip_count(begin, end, period):
+    """
+    :return: number of trips departing every period seconds from begin until before end
+    """
+    return max(0, math.ceil((end - begin) / period))
+
+
+def random_trips(connection_info, begin, end, period, rng=None):
+    """
+    Trips between two distinct random edges of connection_info.edge_list, one every period seconds
+    like randomTrips.py -b begin -e end -p period; trip i has the ID str(i) and departs at
+    begin + i * period. Trips without a path are dropped, like duarouter does.
+    :param connection_info: ConnectionInfo of the map
+    :param rng: random.Random, the random module if None
+    :return: generator of vehicles in order of departure
+    """
+    if rng is None:
+        rng = random
+    graph = get_routing_graph(connection_info)
+    engine = ShortestPathEngine(graph)
+    network = connection_info.compiled_network
+    free_flow_times = [length / speed for length, speed in zip(network.edge_lengths, network.edge_speeds)]
+    edges = connection_info.edge_list
+    for i in range(trip_count(begin, end, period)):
+        depart = begin + i * period
+        source, destination = rng.sample(edges, 2)
+        source_index = graph.edge_index_dict[source]
+        _, arcs = engine.search(source_index, graph.edge_index_dict[destination], free_flow_times)
+        if arcs is not None:
+            yield str(i), depart, "{:.2f}".format(depart), graph.arcs_to_edges(source_index, arcs)
+
+
+def read_route_file(route_file):
+    """
+    Reads the vehicles of a route file written by duarouter (e.g. randomTrips.py -r) without
+    holding the file in memory.
+    :return: generator of vehicles in file order
+    """
+    events = ElementTree.iterparse(route_file, events=("start", "end"))
+    _, root = next(events)
+    for event, element in events:
+        if event == "end" and element.tag == "vehicle":
+            route = element.find("route")
+            yield element.get("id"), float(element.get("depart")), element.get("depart"), route.get("edges").split()
+            # drop the parsed vehicles from the tree
+            root.clear()
+
+
+def last_vehicle_id(route_file):
+    """
+    :return: ID of the last vehicle of route_file, None if it has none
+    """
+    vehicle_id = None
+    for vehicle in read_route_file(route_file):
+        vehicle_id = vehicle[0]
+    return vehicle_id
+
+
+def merge_by_depart(background, controlled):
+    """
+    :param background: vehicles in order of departure
+    :param controlled: vehicles in order of departure
+    :return: generator of all vehicles in order of departure, background vehicles first at equal times
+    """
+    return heapq.merge(background, controlled, key=lambda vehicle: vehicle[1])
+
+
+def write_route_file(route_file, vehicles):
+    """
+    :param route_file: file to write
+    :param vehicles: vehicles in order of departure, e.g. from merge_by_depart
+    :return: number of vehicles written
+    """
+    count = 0
+    with open(route_file, 'w', buffering=BUFFER_SIZE) as f:
+        f.write(ROUTES_HEADER)
+        for vehicle_id, depart, depart_text, edges in vehicles:
+            f.write(VEHICLE_FORMAT.format(quoteattr(vehicle_id), quoteattr(depart_text), quoteattr(" ".join(edges))))
+            count += 1
+        f.write(ROUTES_FOOTER)
+    return count
@@ -0,0 +1,165 @@
+"""
+    Incremental shortest paths for weights that change a little every step.
+
+    For every active destination a reverse shortest-path tree is kept consistent with
+    LPA* (Lifelong Planning A*). Each edge v has
+        - g(v): its current distance to the destination
+        - rhs(v): the one-step lookahead min over turns (v -> u) of weights[u] + g(u)
+    When the weight of an edge changes only its predecessors get a new rhs, and only the
+    edges whose distance actually changes are processed again. The search runs without a
+    heuristic until every edge is consistent, so the whole tree stays valid for all the
+    vehicles heading to the destination and the cost of a step scales with the number of
+    changed edges and the part of the tree they affect, not with the size of the map.
+"""
+
+import heapq
+from collections import OrderedDict
+from core.shortest_path_engine import INFINITY, NO_EDGE
+
+
+class DynamicShortestPathTree:
+    """
+    LPA* maintained shortest-path tree towards one destination.
+    :param engine: ShortestPathEngine used for the initial tree
+    :param destination: edge index of the destination
+    :param weights: cost of entering each edge by edge index; the list is shared with the
+                    owner, which calls update() with the edges it changed
+    """
+    def __init__(self, engine, destination, weights):
+        self.graph = engine.graph
+        self.destination = destination
+        self.weights = weights
+        tree = engine.reverse_tree(destination, weights)
+        self.distance = tree.distance  # g
+        self.lookahead = list(tree.distance)  # rhs
+        self.next_arc = tree.next_arc
+        self.queue = []
+        # number of edges processed by the last update, a measure of the repair work
+        self.repaired_count = 0
+
+    def update_edge(self, edge_index):
+        """
+        Recomputes rhs and the best turn of edge_index and queues it if it became inconsistent.
+        """
+        if edge_index == self.destination:
+            return
+        graph = self.graph
+        weights = self.weights
+        distance = self.distance
+        best = INFINITY
+        best_arc = NO_EDGE
+        for arc in range(graph.adjacency_start[edge_index], graph.adjacency_start[edge_index + 1]):
+            outgoing_edge = graph.adjacency_target[arc]
+            candidate = weights[outgoing_edge] + distance[outgoing_edge]
+            if candidate < best:
+                best = candidate
+                best_arc = arc
+        self.lookahead[edge_index] = best
+        self.next_arc[edge_index] = best_arc
+        if best != distance[edge_index]:
+            heapq.heappush(self.queue, (min(best, distance[edge_index]), edge_index))
+
+    def update(self, changed_edges):
+        """
+        Repairs the tree after the weights of changed_edges were modified.
+        :param changed_edges: edge indices whose weight changed
+        """
+        graph = self.graph
+        for edge_index in changed_edges:
+            # the turns into the changed edge now cost a different amount
+            for i in range(graph.reverse_start[edge_index], graph.reverse_start[edge_index + 1]):
+                self.update_edge(graph.adjacency_source[graph.reverse_arc[i]])
+
+        distance = self.distance
+        lookahead = self.lookahead
+        queue = self.queue
+        repaired = 0
+        while queue:
+            key, edge_index = heapq.heappop(queue)
+            if distance[edge_index] == lookahead[edge_index] or key != min(distance[edge_index], lookahead[edge_index]):
+                continue  # consistent again or stale queue entry
+            repaired += 1
+            if distance[edge_index] > lookahead[edge_index]:
+                # overconsistent: the distance decreased
+                distance[edge_index] = lookahead[edge_index]
+            else:
+                # underconsistent: the distance increased, recompute it from the successors
+                distance[edge_index] = INFINITY
+                self.update_edge(edge_index)
+            for i in range(graph.reverse_start[edge_index], graph.reverse_start[edge_index + 1]):
+                self.update_edge(graph.adjacency_source[graph.reverse_arc[i]])
+        self.repaired_count = repaired
+
+    def arcs_from(self, source):
+        """
+        :param source: edge index the vehicle is on
+        :return: [arc_index] leading to the destination, None if it is unreachable
+        """
+        if self.distance[source] == INFINITY:
+            return None
+        arcs = []
+        edge_index = source
+        adjacency_target = self.graph.adjacency_target
+        while edge_index != self.destination:
+            arc = self.next_arc[edge_index]
+            arcs.append(arc)
+            edge_index = adjacency_target[arc]
+        return arcs
+
+
+class DynamicShortestPaths:
+    """
+    One DynamicShortestPathTree per active destination, least recently used ones evicted
+    beyond max_trees. Answers the router interface of core/routers.py.
+    :param engine: ShortestPathEngine used for new trees
+    :param weights: cost of entering each edge by edge index, edge lengths if None
+    :param max_trees: number of destinations kept up to date
+    """
+    def __init__(self, engine, weights=None, max_trees=64):
+        self.engine = engine
+        self.graph = engine.graph
+        self.weights = list(weights) if weights is not None else list(engine.graph.edge_lengths)
+        self.max_trees = max_trees
+        self.trees = OrderedDict()
+        self.repaired_count = 0
+
+    def get_tree(self, destination):
+        tree = self.trees.get(destination)
+        if tree is None:
+            tree = DynamicShortestPathTree(self.engine, destination, self.weights)
+            self.trees[destination] = tree
+            if len(self.trees) > self.max_trees:
+                self.trees.popitem(last=False)
+        else:
+            self.trees.move_to_end(destination)
+        return tree
+
+    def search(self, source, destination):
+        """
+        :param source: edge index the vehicle is on
+        :param destination: edge index of the destination
+        :return: (cost, [arc_index]) of a shortest path, or (INFINITY, None) if unreachable
+        """
+        tree = self.get_tree(destination)
+        return tree.distance[source], tree.arcs_from(source)
+
+    def set_weights(self, weights, changed_edges=None):
+        """
+        :param weights: cost of entering each edge by edge index
+        :param changed_edges: edge indices whose weight changed since the last call; found by
+                              comparing all weights when None
+        """
+        own_weights = self.weights
+        if changed_edges is None:
+            changed_edges = [i for i, weight in enumerate(weights) if weight != own_weights[i]]
+        else:
+            changed_edges = [i for i in changed_edges if weights[i] != own_weights[i]]
+        if not changed_edges:
+            return
+        for edge_index in changed_edges:
+            own_weights[edge_index] = weights[edge_index]
+        repaired = 0
+        for tree in self.trees.values():
+            tree.update(changed_edges)
+            repaired += tree.repaired_count
+        self.repaired_count = repaired
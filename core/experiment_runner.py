@@ -0,0 +1,219 @@
+"""
+    Runs a matrix of experiments (maps x policies x vehicle counts x generation patterns x seeds)
+    in parallel and collects the results of StrSumo.run into one csv table.
+
+    Every cell runs in its own worker process with its own SUMO instance (separate TraCI label
+    and port) inside its own output directory, which holds the generated route file, the SUMO
+    outputs, the run summary, one record per controlled vehicle and the log of the cell.
+
+    Run from the main repository, e.g.:
+        python -m core.experiment_runner --policies dijkstra,random --vehicles 10:50,20:100 \
+            --patterns 1,3 --seeds 1,2,3 --workers 8 --output-dir experiments
+"""
+
+import contextlib
+import csv
+import glob
+import itertools
+import optparse
+import os
+import random
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("No environment variable SUMO_HOME!")
+from sumolib import checkBinary
+from sumolib.miscutils import getFreeSocketPort
+from core.simulation_backend import traci, use_backend, TRACI, BACKENDS
+from core.Util import ConnectionInfo
+from core.STR_SUMO import StrSumo
+from core.target_vehicles_generation_protocols import target_vehicles_generator
+
+DEFAULT_MAPS = "./configurations/maps/*.net.xml"
+POLICIES = ["dijkstra", "traveltime", "random", "mike", "qlearning"]
+RESULT_FIELDS = ["map", "policy", "num_controlled_vehicles", "num_uncontrolled_vehicles", "pattern", "seed",
+                 "total_time", "end_number", "deadlines_missed", "average_timespan", "wall_time", "error"]
+
+ExperimentCell = namedtuple("ExperimentCell", ["map_file", "policy", "num_controlled_vehicles",
+                                               "num_uncontrolled_vehicles", "pattern", "seed"])
+
+
+def experiment_matrix(map_files, policies, vehicle_counts, patterns, seeds):
+    """
+    :param map_files: [net file]
+    :param policies: [policy name], see POLICIES
+    :param vehicle_counts: [(number of controlled vehicles, number of uncontrolled vehicles)]
+    :param patterns: [generation pattern], see target_vehicles_generator.generate_vehicles
+    :param seeds: [random seed]
+    :return: [ExperimentCell] one per combination
+    """
+    return [ExperimentCell(map_file, policy, num_controlled, num_uncontrolled, pattern, seed)
+            for map_file, policy, (num_controlled, num_uncontrolled), pattern, seed
+            in itertools.product(map_files, policies, vehicle_counts, patterns, seeds)]
+
+
+def cell_name(cell):
+    map_name = os.path.basename(cell.map_file).replace(".net.xml", "")
+    return "{}_{}_{}x{}_p{}_s{}".format(map_name, cell.policy, cell.num_controlled_vehicles,
+                                        cell.num_uncontrolled_vehicles, cell.pattern, cell.seed)
+
+
+def make_policy(policy, connection_info, qlearning_model=None):
+    """
+    :param policy: policy name, see POLICIES
+    :param connection_info: ConnectionInfo of the map
+    :param qlearning_model: model file of the QLearningPolicy
+    :return: RouteController implementing the policy
+    """
+    # controllers are imported here so that e.g. keras is only needed for qlearning
+    if policy == "dijkstra":
+        from controller.DijkstraController import DijkstraPolicy
+        return DijkstraPolicy(connection_info)
+    if policy == "traveltime":
+        from controller.DijkstraController import TravelTimePolicy
+        return TravelTimePolicy(connection_info)
+    if policy == "random":
+        from controller.RouteController import RandomPolicy
+        return RandomPolicy(connection_info)
+    if policy == "mike":
+        from controller.myAlgo import MikeGorithm
+        return MikeGorithm(connection_info)
+    if policy == "qlearning":
+        if qlearning_model is None:
+            raise ValueError("The qlearning policy needs a model file (--qlearning-model)")
+        from controller.QLearningController import QLearningPolicy
+        return QLearningPolicy(connection_info, qlearning_model)
+    raise ValueError("Unknown policy {}, expected one of {}".format(policy, POLICIES))
+
+
+def run_cell(cell, output_dir, backend=TRACI, qlearning_model=None):
+    """
+    Runs one experiment in output_dir/<cell name>; meant to be called in a worker process.
+    :param cell: ExperimentCell
+    :param output_dir: directory of all experiment outputs
+    :param backend: simulation backend, see core/simulation_backend.py
+    :param qlearning_model: model file of the QLearningPolicy
+    :return: {field: value} result row, see RESULT_FIELDS
+    """
+    row = {"map": os.path.basename(cell.map_file), "policy": cell.policy,
+           "num_controlled_vehicles": cell.num_controlled_vehicles,
+           "num_uncontrolled_vehicles": cell.num_uncontrolled_vehicles,
+           "pattern": cell.pattern, "seed": cell.seed, "error": ""}
+    net_file = os.path.abspath(cell.map_file)
+    if qlearning_model is not None:
+        qlearning_model = os.path.abspath(qlearning_model)
+    cell_dir = os.path.abspath(os.path.join(output_dir, cell_name(cell)))
+    os.makedirs(cell_dir, exist_ok=True)
+    working_dir = os.getcwd()
+    start = time.perf_counter()
+    started = False
+    # the generator and SUMO write next to the working directory, so each cell gets its own
+    os.chdir(cell_dir)
+    try:
+        with open("run.log", "w") as log, contextlib.redirect_stdout(log):
+            use_backend(backend)
+            random.seed(cell.seed)
+            connection_info = ConnectionInfo(net_file)
+            scheduler = make_policy(cell.policy, connection_info, qlearning_model)
+            route_file = os.path.join(cell_dir, "str_sumo.rou.xml")
+            generator = target_vehicles_generator(net_file)
+            vehicle_list = generator.generate_vehicles(cell.num_controlled_vehicles, cell.num_uncontrolled_vehicles,
+                                                       cell.pattern, route_file, net_file)
+            if vehicle_list is None:
+                raise RuntimeError("Vehicle generation failed")
+            vehicles = {str(vehicle.vehicle_id): vehicle for vehicle in vehicle_list}
+            simulation = StrSumo(scheduler, connection_info, vehicles,
+                                 summary_file=os.path.join(cell_dir, "data.csv"),
+                                 trip_sink=os.path.join(cell_dir, "vehicle_trips.csv"), verbose=False)
+
+            sumo_command = [checkBinary('sumo'), "-n", net_file, "-r", route_file,
+                            "--seed", str(cell.seed), "--no-step-log", "true",
+                            "--tripinfo-output", os.path.join(cell_dir, "trips.trips.xml")]
+            if backend == TRACI:
+                traci.start(sumo_command, port=getFreeSocketPort(), label=cell_name(cell), stdout=log)
+            else:
+                traci.start(sumo_command)
+            started = True
+            total_time, end_number, deadlines_missed = simulation.run()
+        row["total_time"] = total_time
+        row["end_number"] = end_number
+        row["deadlines_missed"] = deadlines_missed
+        row["average_timespan"] = total_time / end_number if end_number else ""
+    except Exception:
+        row["error"] = traceback.format_exc().strip().splitlines()[-1]
+        with open(os.path.join(cell_dir, "error.log"), "w") as f:
+            f.write(traceback.format_exc())
+    finally:
+        if started:
+            traci.close()
+        os.chdir(working_dir)
+    row["wall_time"] = time.perf_counter() - start
+    return row
+
+
+def run_experiments(cells, output_dir, workers=None, backend=TRACI, qlearning_model=None,
+                    results_file=None):
+    """
+    Runs the cells on a process pool and writes one result row per cell.
+    :param cells: [ExperimentCell], e.g. from experiment_matrix()
+    :param output_dir: directory of all experiment outputs
+    :param workers: number of worker processes, the number of CPUs if None
+    :param backend: simulation backend, see core/simulation_backend.py
+    :param qlearning_model: model file of the QLearningPolicy
+    :param results_file: csv table of the results, output_dir/results.csv if None
+    :return: [{field: value}] result rows in the order of cells
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if results_file is None:
+        results_file = os.path.join(output_dir, "results.csv")
+    rows = [None] * len(cells)
+    # one cell per worker process at a time: libsumo allows only one simulation per process
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_cell, cell, output_dir, backend, qlearning_model): i
+                   for i, cell in enumerate(cells)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            rows[i] = future.result()
+            print("[{}/{}] {}: {}".format(done, len(cells), cell_name(cells[i]),
+                                          rows[i]["error"] or "{} arrived, {} deadlines missed".format(
+                                              rows[i]["end_number"], rows[i]["deadlines_missed"])))
+    with open(results_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def get_options():
+    opt_parser = optparse.OptionParser()
+    opt_parser.add_option("--maps", default=DEFAULT_MAPS,
+                          help="glob of the net files to run on, default: %default")
+    opt_parser.add_option("--policies", default="dijkstra,random,mike",
+                          help="comma separated policies out of " + ",".join(POLICIES) + ", default: %default")
+    opt_parser.add_option("--vehicles", default="10:50",
+                          help="comma separated controlled:uncontrolled vehicle counts, default: %default")
+    opt_parser.add_option("--patterns", default="1,2,3", help="comma separated generation patterns, default: %default")
+    opt_parser.add_option("--seeds", default="1", help="comma separated random seeds, default: %default")
+    opt_parser.add_option("--workers", type="int", default=None, help="worker processes, default: number of CPUs")
+    opt_parser.add_option("--output-dir", default="experiments", help="default: %default")
+    opt_parser.add_option("--backend", type="choice", choices=BACKENDS, default=TRACI, help="default: %default")
+    opt_parser.add_option("--qlearning-model", default=None, help="model file of the qlearning policy")
+    options, args = opt_parser.parse_args()
+    return options
+
+
+if __name__ == "__main__":
+    options = get_options()
+    map_files = sorted(glob.glob(options.maps))
+    vehicle_counts = [tuple(int(n) for n in counts.split(":")) for counts in options.vehicles.split(",")]
+    cells = experiment_matrix(map_files, options.policies.split(","), vehicle_counts,
+                              [int(p) for p in options.patterns.split(",")],
+                              [int(s) for s in options.seeds.split(",")])
+    print("Running {} experiments".format(len(cells)))
+    run_experiments(cells, options.output_dir, options.workers, options.backend, options.qlearning_model)
@@ -0,0 +1,340 @@
+"""
+    ALT routing: A* search with landmark lower bounds and the triangle inequality.
+
+    A few landmark edges are chosen by farthest-point selection over the RoutingGraph.
+    The distances from every landmark to every edge and from every edge to every landmark
+    (with the edge lengths as weights) are stored as NumPy arrays next to the net file,
+    keyed by the hash of the net file. For a target t, the triangle inequality gives
+        d(v, t) >= max over landmarks l of max(d(l, t) - d(l, v), d(v, l) - d(t, l))
+    which is a consistent A* potential as long as no edge weight is below its length.
+    Weights in other units (e.g. travel times) are supported by scaling the bounds with
+    the smallest weight/length ratio.
+"""
+
+import heapq
+import os
+import numpy as np
+from core.Util import file_hash
+from core.shortest_path_engine import ShortestPathEngine, INFINITY, NO_EDGE
+
+LANDMARK_FILE_VERSION = 1
+DEFAULT_NUM_LANDMARKS = 8
+
+
+def select_landmarks(graph, num_landmarks=DEFAULT_NUM_LANDMARKS):
+    """
+    Farthest-point selection: every new landmark is the edge farthest, in either direction,
+    from the landmarks chosen so far. Edges no landmark can reach or be reached from count
+    as farthest, so every connected part of the map gets a landmark.
+    :param graph: RoutingGraph built from a ConnectionInfo
+    :param num_landmarks: number of landmarks wanted
+    :return: (landmarks [edge_index], from_landmark, to_landmark) where
+             from_landmark[i, v] = d(landmarks[i], v) and to_landmark[i, v] = d(v, landmarks[i])
+    """
+    engine = ShortestPathEngine(graph)
+    num_edges = graph.num_edges()
+    # only edges with at least one turn can be on a route
+    candidates = np.array([graph.adjacency_start[v + 1] > graph.adjacency_start[v] or
+                           graph.reverse_start[v + 1] > graph.reverse_start[v] for v in range(num_edges)])
+    if not candidates.any():
+        return [], np.zeros((0, num_edges)), np.zeros((0, num_edges))
+
+    seed = int(np.argmax(candidates))
+    closeness = np.minimum(np.array(engine.distances_from(seed)), np.array(engine.reverse_tree(seed).distance))
+    landmarks = []
+    from_rows = []
+    to_rows = []
+    while len(landmarks) < min(num_landmarks, int(candidates.sum())):
+        landmark = int(np.argmax(np.where(candidates, closeness, -1.0)))
+        if landmark in landmarks:
+            break
+        landmarks.append(landmark)
+        from_rows.append(engine.distances_from(landmark))
+        to_rows.append(engine.reverse_tree(landmark).distance)
+        landmark_closeness = np.minimum(np.array(from_rows[-1]), np.array(to_rows[-1]))
+        closeness = landmark_closeness if len(landmarks) == 1 else np.minimum(closeness, landmark_closeness)
+    return landmarks, np.array(from_rows, dtype=np.float64), np.array(to_rows, dtype=np.float64)
+
+
+class LandmarkRouter:
+    """
+    Point-to-point A* (search_mode "alt") or bidirectional A* with average potentials
+    (search_mode "alt_bidirectional") guided by landmark distance tables.
+    :param graph: RoutingGraph built from a ConnectionInfo
+    :param landmarks: [edge_index] of the landmarks
+    :param from_landmark: NumPy array, from_landmark[i, v] = d(landmarks[i], v)
+    :param to_landmark: NumPy array, to_landmark[i, v] = d(v, landmarks[i])
+    :param bidirectional: search from both ends when True
+    """
+    def __init__(self, graph, landmarks, from_landmark, to_landmark, bidirectional=False):
+        self.graph = graph
+        self.landmarks = landmarks
+        self.from_landmark = from_landmark
+        self.to_landmark = to_landmark
+        self.bidirectional = bidirectional
+        # one tuple of landmark distances per edge, cheaper to evaluate lazily than NumPy columns
+        self.node_from_landmark = [tuple(column) for column in from_landmark.T.tolist()]
+        self.node_to_landmark = [tuple(column) for column in to_landmark.T.tolist()]
+        self.weights = graph.edge_lengths
+        self.bound_scale = 1.0
+        self.settled_count = 0
+
+    def set_weights(self, weights, changed_edges=None):
+        """
+        :param weights: cost of entering each edge by edge index
+        :param changed_edges: unused, the landmark bounds only depend on the smallest weight/length ratio
+        A zero weight makes the scale, and so every finite bound, zero: A* then searches like Dijkstra.
+        """
+        self.weights = weights
+        lengths = self.graph.edge_lengths
+        ratios = [weight / length for weight, length in zip(weights, lengths) if length > 0]
+        self.bound_scale = min(min(ratios), 1.0) if ratios else 1.0
+        if self.bound_scale < 0:
+            raise ValueError("Negative edge weights cannot be routed with landmarks")
+
+    def lower_bound_to(self, target):
+        """
+        :param target: edge index
+        :return: function giving a lower bound of d(v, target) for an edge index v
+        """
+        target_from = self.node_from_landmark[target]
+        target_to = self.node_to_landmark[target]
+        node_from = self.node_from_landmark
+        node_to = self.node_to_landmark
+        scale = self.bound_scale
+
+        def bound(v):
+            best = 0.0
+            for landmark_target, landmark_v, v_landmark, target_landmark in \
+                    zip(target_from, node_from[v], node_to[v], target_to):
+                # d(l, t) - d(l, v); an unreachable t means v cannot reach t either
+                if landmark_v != INFINITY:
+                    best = max(best, landmark_target - landmark_v)
+                if target_landmark != INFINITY:
+                    best = max(best, v_landmark - target_landmark)
+            # unreachable whatever the weights, and a zero scale must not turn it into nan
+            return INFINITY if best == INFINITY else best * scale
+        return bound
+
+    def lower_bound_from(self, source):
+        """
+        :param source: edge index
+        :return: function giving a lower bound of d(source, v) for an edge index v
+        """
+        source_from = self.node_from_landmark[source]
+        source_to = self.node_to_landmark[source]
+        node_from = self.node_from_landmark
+        node_to = self.node_to_landmark
+        scale = self.bound_scale
+
+        def bound(v):
+            best = 0.0
+            for landmark_v, landmark_source, source_landmark, v_landmark in \
+                    zip(node_from[v], source_from, source_to, node_to[v]):
+                # d(l, v) - d(l, s) and d(s, l) - d(v, l)
+                if landmark_source != INFINITY:
+                    best = max(best, landmark_v - landmark_source)
+                if v_landmark != INFINITY:
+                    best = max(best, source_landmark - v_landmark)
+            # unreachable whatever the weights, and a zero scale must not turn it into nan
+            return INFINITY if best == INFINITY else best * scale
+        return bound
+
+    def search(self, source, destination):
+        """
+        :param source: edge index the vehicle is on
+        :param destination: edge index of the destination
+        :return: (cost, [arc_index]) of a shortest path, or (INFINITY, None) if unreachable
+        """
+        if source == destination:
+            self.settled_count = 0
+            return 0.0, []
+        if self.bidirectional:
+            return self.bidirectional_search(source, destination)
+        return self.unidirectional_search(source, destination)
+
+    def unidirectional_search(self, source, destination):
+        graph = self.graph
+        weights = self.weights
+        adjacency_start = graph.adjacency_start
+        adjacency_target = graph.adjacency_target
+        potential = self.lower_bound_to(destination)
+        if potential(source) == INFINITY:
+            self.settled_count = 0
+            return INFINITY, None
+
+        distance = {source: 0.0}
+        predecessor_arc = {source: NO_EDGE}
+        settled = set()
+        heap = [(potential(source), 0.0, source)]
+        while heap:
+            key, current_distance, current_edge = heapq.heappop(heap)
+            if current_edge in settled:
+                continue
+            settled.add(current_edge)
+            if current_edge == destination:
+                break
+            for arc in range(adjacency_start[current_edge], adjacency_start[current_edge + 1]):
+                outgoing_edge = adjacency_target[arc]
+                new_distance = current_distance + weights[outgoing_edge]
+                if new_distance < distance.get(outgoing_edge, INFINITY):
+                    estimate = potential(outgoing_edge)
+                    if estimate == INFINITY:
+                        continue
+                    distance[outgoing_edge] = new_distance
+                    predecessor_arc[outgoing_edge] = arc
+                    heapq.heappush(heap, (new_distance + estimate, new_distance, outgoing_edge))
+        self.settled_count = len(settled)
+
+        if destination not in settled:
+            return INFINITY, None
+        arcs = []
+        edge_index = destination
+        while edge_index != source:
+            arc = predecessor_arc[edge_index]
+            arcs.append(arc)
+            edge_index = graph.adjacency_source[arc]
+        arcs.reverse()
+        return distance[destination], arcs
+
+    def bidirectional_search(self, source, destination):
+        """
+        Both searches use the average potential p(v) = (pi_t(v) - pi_s(v)) / 2, which gives
+        the forward and the backward search the same reduced arc costs; the search can stop
+        once the two smallest keys add up to the best path found.
+        """
+        graph = self.graph
+        weights = self.weights
+        to_destination = self.lower_bound_to(destination)
+        from_source = self.lower_bound_from(source)
+        potentials = {}
+
+        def potential(v):
+            value = potentials.get(v)
+            if value is None:
+                to_bound = to_destination(v)
+                from_bound = from_source(v)
+                if to_bound == INFINITY or from_bound == INFINITY:
+                    value = None  # v is on no path from source to destination
+                else:
+                    value = (to_bound - from_bound) / 2.0
+                potentials[v] = value
+            return value
+
+        if potential(source) is None or potential(destination) is None:
+            self.settled_count = 0
+            return INFINITY, None
+
+        # side 0 searches forward from source, side 1 backward from destination; the backward key uses -p
+        distances = ({source: 0.0}, {destination: 0.0})
+        parents = ({source: NO_EDGE}, {destination: NO_EDGE})
+        heaps = ([(potential(source), source)], [(-potential(destination), destination)])
+        settled = (set(), set())
+        sign = (1.0, -1.0)
+        best = INFINITY
+        meeting_edge = NO_EDGE
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            key, edge = heapq.heappop(heaps[side])
+            if edge in settled[side]:
+                continue
+            settled[side].add(edge)
+            current_distance = distances[side][edge]
+            other_distance = distances[1 - side].get(edge)
+            if other_distance is not None and current_distance + other_distance < best:
+                best = current_distance + other_distance
+                meeting_edge = edge
+
+            if side == 0:
+                # entering the next edge costs its weight
+                neighbours = ((arc, graph.adjacency_target[arc], weights[graph.adjacency_target[arc]])
+                              for arc in range(graph.adjacency_start[edge], graph.adjacency_start[edge + 1]))
+            else:
+                # the arc into the current edge costs the weight of the current edge
+                neighbours = ((arc, graph.adjacency_source[arc], weights[edge])
+                              for arc in (graph.reverse_arc[i] for i in
+                                          range(graph.reverse_start[edge], graph.reverse_start[edge + 1])))
+            for arc, neighbour, weight in neighbours:
+                new_distance = current_distance + weight
+                if new_distance < distances[side].get(neighbour, INFINITY):
+                    neighbour_potential = potential(neighbour)
+                    if neighbour_potential is None:
+                        continue
+                    distances[side][neighbour] = new_distance
+                    parents[side][neighbour] = arc
+                    heapq.heappush(heaps[side], (new_distance + sign[side] * neighbour_potential, neighbour))
+        self.settled_count = len(settled[0]) + len(settled[1])
+
+        if meeting_edge == NO_EDGE:
+            return INFINITY, None
+        arcs = []
+        edge = meeting_edge
+        while edge != source:
+            arc = parents[0][edge]
+            arcs.append(arc)
+            edge = graph.adjacency_source[arc]
+        arcs.reverse()
+        edge = meeting_edge
+        while edge != destination:
+            arc = parents[1][edge]
+            arcs.append(arc)
+            edge = graph.adjacency_target[arc]
+        return best, arcs
+
+    def route(self, source_edge, destination_edge):
+        """
+        :param source_edge: edge id the vehicle is on
+        :param destination_edge: edge id of the destination
+        :return: list of directions leading to destination_edge, empty if it is unreachable
+        """
+        graph = self.graph
+        cost, arcs = self.search(graph.edge_index_dict[source_edge], graph.edge_index_dict[destination_edge])
+        if arcs is None:
+            return []
+        return graph.arcs_to_directions(arcs)
+
+
+def landmark_file_name(net_file):
+    return net_file + ".landmarks.npz"
+
+
+def load_landmark_router(graph, net_file, bidirectional=False, num_landmarks=DEFAULT_NUM_LANDMARKS,
+                         landmark_file=None):
+    """
+    Loads the landmark tables of net_file, computing and saving them if there is no valid file.
+    A file is valid if it was written by the same LANDMARK_FILE_VERSION, for a net file with
+    the same content hash and with the same number of landmarks.
+    :param graph: RoutingGraph built from the ConnectionInfo of net_file
+    :param net_file: the SUMO network file, e.g. 'test.net.xml'
+    :param bidirectional: search from both ends when True
+    :param num_landmarks: number of landmarks to select
+    :param landmark_file: where the tables are stored, next to net_file by default
+    :return: LandmarkRouter weighted with the edge lengths
+    """
+    if landmark_file is None:
+        landmark_file = landmark_file_name(net_file)
+    net_hash = file_hash(net_file)
+    if os.path.exists(landmark_file):
+        try:
+            with np.load(landmark_file) as stored:
+                if int(stored["version"]) == LANDMARK_FILE_VERSION and str(stored["net_hash"]) == net_hash \
+                        and int(stored["num_landmarks"]) == num_landmarks \
+                        and stored["from_landmark"].shape[1] == graph.num_edges():
+                    return LandmarkRouter(graph, stored["landmarks"].tolist(), stored["from_landmark"],
+                                          stored["to_landmark"], bidirectional)
+        except (OSError, ValueError, KeyError) as err:
+            print("Ignoring unreadable landmark file {}: {}".format(landmark_file, err))
+
+    landmarks, from_landmark, to_landmark = select_landmarks(graph, num_landmarks)
+    try:
+        # np.savez appends .npz to names without it, so write through a file object
+        with open(landmark_file, 'wb') as f:
+            np.savez(f, version=LANDMARK_FILE_VERSION, net_hash=net_hash, num_landmarks=num_landmarks,
+                     landmarks=np.array(landmarks, dtype=np.int64), from_landmark=from_landmark,
+                     to_landmark=to_landmark)
+    except OSError as err:
+        print("Could not save landmark file {}: {}".format(landmark_file, err))
+    return LandmarkRouter(graph, landmarks, from_landmark, to_landmark, bidirectional)
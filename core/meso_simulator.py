@@ -0,0 +1,520 @@
+"""
+    Queue-based mesoscopic traffic simulator standing in for SUMO, to screen routing policies in a
+    fraction of the time of a SUMO run before confirming the interesting ones with SUMO.
+
+    It implements the part of the TraCI API used by StrSumo.run, core/state_sync.py and the route
+    controllers:
+        - simulation: getTime, getMinExpectedNumber, getDepartedIDList, getArrivedIDList,
+          subscribe, getSubscriptionResults
+        - vehicle: getIDList, getIDCount, getRoadID, getSpeed, getMaxSpeed, getRoute, changeTarget,
+          setRoute, setColor, subscribe, getAllSubscriptionResults
+        - edge: getLastStepVehicleNumber, getLastStepMeanSpeed, getLastStepOccupancy, subscribe,
+          getAllSubscriptionResults
+    and start(), simulationStep() and close() like the traci module, so the testbed runs without
+    SUMO with the "meso" backend (python main.py --backend meso). start() reads the net and route
+    files from a sumocfg (-c) or from -n/-r, and ignores the other SUMO options.
+
+    Model: every edge is a FIFO queue of at most length * lanes / JAM_SPACING vehicles. A vehicle
+    entering an edge can leave it after length / speed, where speed is the smaller of its maximum
+    speed and the speed limit of the edge reduced linearly with the occupancy (Greenshields). It
+    leaves once it is at the head of the queue, the edge has outflow capacity left (one vehicle
+    per lane every HEADWAY seconds) and the next edge of its route has room; a vehicle blocked for
+    TELEPORT_TIME seconds jumps to the next edge of its route with room, like SUMO's teleports.
+    The vehicle counts, outflow capacities and ready times of the queue heads are NumPy arrays,
+    so a step only visits the edges whose head can leave. Lanes, junction conflicts and traffic
+    lights are not modelled.
+"""
+
+import os
+import sys
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+import numpy as np
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("No environment variable SUMO_HOME!")
+import traci.constants as tc
+from traci.exceptions import TraCIException
+from core.Util import ConnectionInfo
+from core.shortest_path_engine import ShortestPathEngine, get_routing_graph
+
+STEP_LENGTH = 1.0
+JAM_SPACING = 7.5  # vehicle length plus minimum gap in m
+HEADWAY = 2.0  # s between two vehicles leaving the same lane
+MIN_SPEED_FACTOR = 0.1  # speed on a full edge relative to the speed limit
+TELEPORT_TIME = 300.0  # s a vehicle waits for room on the next edge before it teleports
+DEFAULT_MAX_SPEED = 55.55  # SUMO's default passenger car
+EDGE_VARIABLES = [tc.LAST_STEP_VEHICLE_NUMBER, tc.LAST_STEP_MEAN_SPEED, tc.LAST_STEP_OCCUPANCY]
+
+
+class MesoSimulation:
+    """
+    :param connection_info: ConnectionInfo of the net file
+    :param route_files: [route file], e.g. written by target_vehicles_generator.generate_vehicles
+    :param begin: simulation time before the first step in seconds
+    :param end: simulation time at which getMinExpectedNumber drops to 0, None to run until every
+                vehicle arrived
+    :param step_length: seconds per simulation step
+    """
+    def __init__(self, connection_info, route_files=(), begin=0.0, end=None, step_length=STEP_LENGTH):
+        network = connection_info.compiled_network
+        self.connection_info = connection_info
+        self.edge_ids = network.edge_ids
+        self.edge_index_dict = connection_info.edge_index_dict
+        self.lengths = list(network.edge_lengths)
+        self.speed_limits = list(network.edge_speeds)
+        lanes = np.array(network.edge_lane_counts, dtype=np.float64)
+        self.capacities = np.maximum(1, np.floor(np.array(self.lengths) * lanes / JAM_SPACING)).astype(np.int64)
+        self.capacity_array = self.capacities.astype(np.float64)
+        self.capacities = self.capacities.tolist()
+        self.speed_limit_array = np.array(self.speed_limits, dtype=np.float64)
+        self.outflows = lanes * step_length / HEADWAY
+        self.max_outflow_budgets = np.maximum(lanes, 1.0)
+        self.outflow_budgets = self.max_outflow_budgets.copy()
+        self.counts = np.zeros(len(self.edge_ids), dtype=np.int64)
+        self.head_ready_times = np.full(len(self.edge_ids), np.inf)
+        self.queues = [deque() for _ in self.edge_ids]
+        # changeTarget routes by free-flow travel time, like SUMO without rerouting devices
+        self.graph = get_routing_graph(connection_info)
+        self.engine = ShortestPathEngine(self.graph)
+        self.free_flow_times = [length / speed for length, speed in zip(self.lengths, self.speed_limits)]
+        self.outgoing = network.outgoing
+
+        # vehicles by slot, a slot is never reused
+        self.slot_ids = []
+        self.routes = []
+        self.route_positions = []
+        self.ready_times = []
+        self.speeds = []
+        self.max_speeds = []
+        self.slots = {}  # {vehicle_id: slot} of the vehicles in the network, in insertion order
+        self.colors = {}
+        # [(depart, vehicle_id, [edge index], max speed)] sorted by depart, inserted from next_pending on
+        self.pending = []
+        self.next_pending = 0
+        self.waiting = []  # due vehicles whose first edge is full
+
+        self.time = begin
+        self.end = end
+        self.step_length = step_length
+        self.departed_ids = []
+        self.arrived_ids = []
+        self.teleports = 0
+        # {name: NumPy array} of per-edge values computed for the current step, see edge_mean_speeds
+        self.edge_values = {}
+        self.simulation_subscriptions = []
+        self.vehicle_subscriptions = {}
+        self.edge_subscriptions = {}
+        self.simulation = SimulationDomain(self)
+        self.vehicle = VehicleDomain(self)
+        self.edge = EdgeDomain(self)
+        for route_file in route_files:
+            self.load_routes(route_file)
+
+    @classmethod
+    def from_command(cls, command):
+        """
+        :param command: SUMO command line, e.g. ["sumo", "-c", "myconfig.sumocfg"]; only the
+                        configuration, net and route files, begin, end and step length are read
+        :return: MesoSimulation
+        """
+        settings = {"net-file": None, "route-files": "", "begin": "0", "end": None, "step-length": str(STEP_LENGTH)}
+        options = {"-c": "configuration-file", "--configuration-file": "configuration-file",
+                   "-n": "net-file", "--net-file": "net-file", "-r": "route-files", "--route-files": "route-files",
+                   "-b": "begin", "--begin": "begin", "-e": "end", "--end": "end", "--step-length": "step-length"}
+        route_dir = ""
+        for flag, value in zip(command, command[1:]):
+            option = options.get(flag)
+            if option == "configuration-file":
+                config_dir = os.path.dirname(value)
+                for element in ElementTree.parse(value).getroot().iter():
+                    if element.tag in settings and element.get("value") is not None:
+                        settings[element.tag] = element.get("value")
+                if settings["net-file"] is not None:
+                    settings["net-file"] = os.path.join(config_dir, settings["net-file"])
+                route_dir = config_dir
+            elif option is not None:
+                settings[option] = value
+                if option == "route-files":
+                    route_dir = ""
+        if settings["net-file"] is None:
+            raise TraCIException("No net file given in {}".format(command))
+        route_files = [os.path.join(route_dir, route_file) for route_file in settings["route-files"].split(",")
+                       if route_file]
+        return cls(ConnectionInfo(settings["net-file"]), route_files, float(settings["begin"]),
+                   None if settings["end"] is None else float(settings["end"]), float(settings["step-length"]))
+
+    def load_routes(self, route_file):
+        """
+        Reads the vehicles (with an embedded or referenced route), trips, routes and vehicle types
+        of a SUMO route file; flows are not supported.
+        :param route_file: e.g. written by target_vehicles_generator.generate_vehicles
+        """
+        max_speeds = {}
+        routes = {}
+        for element in ElementTree.parse(route_file).getroot():
+            if element.tag == "vType":
+                max_speeds[element.get("id")] = float(element.get("maxSpeed", DEFAULT_MAX_SPEED))
+            elif element.tag == "route":
+                routes[element.get("id")] = element.get("edges").split()
+            elif element.tag in ("vehicle", "trip"):
+                if element.tag == "trip":
+                    edges = self.trip_route(element)
+                elif element.find("route") is not None:
+                    edges = element.find("route").get("edges").split()
+                else:
+                    edges = routes[element.get("route")]
+                if not edges:
+                    print("Skipping vehicle {} of {} without a route".format(element.get("id"), route_file))
+                    continue
+                for edge in edges:
+                    if edge not in self.edge_index_dict:
+                        raise ValueError("Vehicle {} of {} uses unknown edge {}".format(element.get("id"), route_file,
+                                                                                        edge))
+                self.pending.append((float(element.get("depart")), element.get("id"),
+                                     [self.edge_index_dict[edge] for edge in edges],
+                                     max_speeds.get(element.get("type"), DEFAULT_MAX_SPEED)))
+            elif element.tag == "flow":
+                print("Skipping flow {} of {}, flows are not supported".format(element.get("id"), route_file))
+        # stable, so vehicles departing together keep the file order like in SUMO
+        self.pending[self.next_pending:] = sorted(self.pending[self.next_pending:], key=lambda vehicle: vehicle[0])
+
+    def trip_route(self, trip):
+        edges = [trip.get("from")] + trip.get("via", "").split() + [trip.get("to")]
+        route = [edges[0]]
+        for source, destination in zip(edges, edges[1:]):
+            source_index = self.edge_index_dict[source]
+            _, arcs = self.engine.search(source_index, self.edge_index_dict[destination], self.free_flow_times)
+            if arcs is None:
+                return []
+            route.extend(self.graph.arcs_to_edges(source_index, arcs)[1:])
+        return route
+
+    def step(self):
+        """
+        Advances the simulation by step_length.
+        """
+        time = self.time
+        now = time + self.step_length
+        self.departed_ids = []
+        self.arrived_ids = []
+        np.minimum(self.outflow_budgets + self.outflows, self.max_outflow_budgets, out=self.outflow_budgets)
+        for edge in np.flatnonzero(self.head_ready_times <= now).tolist():
+            self.move_queue(edge, time, now)
+        self.insert_vehicles(time)
+        self.time = now
+        self.edge_values = {}
+
+    def move_queue(self, edge, time, now):
+        """
+        Moves the vehicles at the head of the queue of edge that can leave before now onto their next
+        edge, or out of the simulation at the end of their route.
+        """
+        queue = self.queues[edge]
+        counts = self.counts
+        capacities = self.capacities
+        budgets = self.outflow_budgets
+        while queue and budgets[edge] >= 1.0:
+            slot = queue[0]
+            ready_time = self.ready_times[slot]
+            if ready_time > now:
+                break
+            position = self.route_positions[slot] + 1
+            route = self.routes[slot]
+            if position < len(route) and counts[route[position]] >= capacities[route[position]]:
+                if now - ready_time < TELEPORT_TIME:
+                    break
+                # teleport to the next edge of the route with room, or out of the simulation at its end
+                while position < len(route) and counts[route[position]] >= capacities[route[position]]:
+                    position += 1
+                self.teleports += 1
+            if position == len(route):
+                vehicle_id = self.slot_ids[slot]
+                del self.slots[vehicle_id]
+                self.vehicle_subscriptions.pop(vehicle_id, None)
+                self.arrived_ids.append(vehicle_id)
+            else:
+                self.route_positions[slot] = position
+                self.enter(slot, route[position], max(ready_time, time))
+            queue.popleft()
+            counts[edge] -= 1
+            budgets[edge] -= 1.0
+        self.head_ready_times[edge] = self.ready_times[queue[0]] if queue else np.inf
+
+    def enter(self, slot, edge, entry_time):
+        self.counts[edge] += 1
+        occupancy = self.counts[edge] / self.capacities[edge]
+        speed = min(self.max_speeds[slot], self.speed_limits[edge] * max(MIN_SPEED_FACTOR, 1.0 - occupancy))
+        self.ready_times[slot] = entry_time + self.lengths[edge] / speed
+        self.speeds[slot] = speed
+        queue = self.queues[edge]
+        if not queue:
+            self.head_ready_times[edge] = self.ready_times[slot]
+        queue.append(slot)
+
+    def insert_vehicles(self, time):
+        """
+        Inserts the vehicles departing up to time whose first edge has room, the others wait.
+        """
+        pending = self.pending
+        while self.next_pending < len(pending) and pending[self.next_pending][0] <= time:
+            self.waiting.append(pending[self.next_pending])
+            self.next_pending += 1
+        still_waiting = []
+        for vehicle in self.waiting:
+            depart, vehicle_id, route, max_speed = vehicle
+            if self.counts[route[0]] >= self.capacities[route[0]]:
+                still_waiting.append(vehicle)
+                continue
+            slot = len(self.slot_ids)
+            self.slot_ids.append(vehicle_id)
+            self.routes.append(route)
+            self.route_positions.append(0)
+            self.ready_times.append(0.0)
+            self.speeds.append(0.0)
+            self.max_speeds.append(max_speed)
+            self.slots[vehicle_id] = slot
+            self.departed_ids.append(vehicle_id)
+            self.enter(slot, route[0], max(depart, time))
+        self.waiting = still_waiting
+
+    def min_expected_number(self):
+        if self.end is not None and self.time >= self.end:
+            return 0
+        return len(self.slots) + len(self.waiting) + len(self.pending) - self.next_pending
+
+    def slot(self, vehicle_id):
+        try:
+            return self.slots[vehicle_id]
+        except KeyError:
+            raise TraCIException("Vehicle '{}' is not known".format(vehicle_id))
+
+    def current_edge(self, slot):
+        return self.routes[slot][self.route_positions[slot]]
+
+    def change_target(self, vehicle_id, edge_id):
+        """
+        Replaces the rest of the route with the fastest path at free flow to edge_id.
+        """
+        slot = self.slot(vehicle_id)
+        if edge_id not in self.edge_index_dict:
+            raise TraCIException("Edge '{}' is not known".format(edge_id))
+        current = self.current_edge(slot)
+        target = self.edge_index_dict[edge_id]
+        _, arcs = self.engine.search(current, target, self.free_flow_times)
+        if arcs is None:
+            raise TraCIException("Route replacement failed for {}".format(vehicle_id))
+        adjacency_target = self.graph.adjacency_target
+        self.routes[slot] = [current] + [adjacency_target[arc] for arc in arcs]
+        self.route_positions[slot] = 0
+
+    def set_route(self, vehicle_id, edge_ids):
+        """
+        Replaces the route with edge_ids, which must start with the current edge and follow connections.
+        """
+        slot = self.slot(vehicle_id)
+        unknown = [edge_id for edge_id in edge_ids if edge_id not in self.edge_index_dict]
+        if unknown:
+            raise TraCIException("Edge '{}' is not known".format(unknown[0]))
+        route = [self.edge_index_dict[edge_id] for edge_id in edge_ids]
+        if not route or route[0] != self.current_edge(slot) or \
+                any(to_edge not in self.outgoing[from_edge] for from_edge, to_edge in zip(route, route[1:])):
+            raise TraCIException("Route replacement failed for {}".format(vehicle_id))
+        self.routes[slot] = route
+        self.route_positions[slot] = 0
+
+    def speed(self, slot):
+        # vehicles waiting at the end of the edge stand still
+        return self.speeds[slot] if self.ready_times[slot] > self.time else 0.0
+
+    def edge_mean_speeds(self):
+        """
+        :return: NumPy array of the mean speed of the vehicles on every edge, counting the vehicles waiting at
+                 the end of the edge as standing, and the speed limit of the empty edges, like SUMO; computed
+                 once per step, so that polling every edge is not quadratic in the number of edges
+        """
+        mean_speeds = self.edge_values.get("mean_speeds")
+        if mean_speeds is not None:
+            return mean_speeds
+        mean_speeds = self.speed_limit_array.copy()
+        speeds = self.speeds
+        ready_times = self.ready_times
+        time = self.time
+        for edge in np.flatnonzero(self.counts).tolist():
+            queue = self.queues[edge]
+            mean_speeds[edge] = sum([speeds[slot] for slot in queue if ready_times[slot] > time]) / len(queue)
+        self.edge_values["mean_speeds"] = mean_speeds
+        return mean_speeds
+
+    def edge_occupancies(self):
+        """
+        :return: NumPy array of the occupancy of every edge in %, the share of its capacity in use, computed once
+                 per step
+        """
+        occupancies = self.edge_values.get("occupancies")
+        if occupancies is None:
+            occupancies = self.edge_values["occupancies"] = 100.0 * self.counts / self.capacity_array
+        return occupancies
+
+
+class SimulationDomain:
+    def __init__(self, simulation):
+        self.sim = simulation
+        self.getters = {tc.VAR_TIME: self.getTime, tc.VAR_DEPARTED_VEHICLES_IDS: self.getDepartedIDList,
+                        tc.VAR_ARRIVED_VEHICLES_IDS: self.getArrivedIDList,
+                        tc.VAR_MIN_EXPECTED_VEHICLES: self.getMinExpectedNumber}
+
+    def getTime(self):
+        return self.sim.time
+
+    def getMinExpectedNumber(self):
+        return self.sim.min_expected_number()
+
+    def getDepartedIDList(self):
+        return tuple(self.sim.departed_ids)
+
+    def getArrivedIDList(self):
+        return tuple(self.sim.arrived_ids)
+
+    def subscribe(self, varIDs, begin=None, end=None):
+        for variable in varIDs:
+            if variable not in self.getters:
+                raise TraCIException("Simulation variable {} is not supported".format(variable))
+        self.sim.simulation_subscriptions = list(varIDs)
+
+    def getSubscriptionResults(self, objectID=None):
+        return {variable: self.getters[variable]() for variable in self.sim.simulation_subscriptions}
+
+
+class VehicleDomain:
+    def __init__(self, simulation):
+        self.sim = simulation
+        self.getters = {tc.VAR_ROAD_ID: self.getRoadID, tc.VAR_SPEED: self.getSpeed,
+                        tc.VAR_MAXSPEED: self.getMaxSpeed, tc.VAR_ROUTE: self.getRoute}
+
+    def getIDList(self):
+        return tuple(self.sim.slots)
+
+    def getIDCount(self):
+        return len(self.sim.slots)
+
+    def getRoadID(self, vehID):
+        sim = self.sim
+        return sim.edge_ids[sim.current_edge(sim.slot(vehID))]
+
+    def getSpeed(self, vehID):
+        return self.sim.speed(self.sim.slot(vehID))
+
+    def getMaxSpeed(self, vehID):
+        return self.sim.max_speeds[self.sim.slot(vehID)]
+
+    def getRoute(self, vehID):
+        sim = self.sim
+        return tuple(sim.edge_ids[edge] for edge in sim.routes[sim.slot(vehID)])
+
+    def changeTarget(self, vehID, edgeID):
+        self.sim.change_target(vehID, edgeID)
+
+    def setRoute(self, vehID, edgeList):
+        self.sim.set_route(vehID, edgeList)
+
+    def setColor(self, vehID, color):
+        self.sim.colors[vehID] = color
+
+    def subscribe(self, objectID, varIDs, begin=None, end=None):
+        for variable in varIDs:
+            if variable not in self.getters:
+                raise TraCIException("Vehicle variable {} is not supported".format(variable))
+        self.sim.slot(objectID)
+        self.sim.vehicle_subscriptions[objectID] = list(varIDs)
+
+    def getAllSubscriptionResults(self):
+        # subscriptions of arrived vehicles are dropped, like in SUMO
+        return {vehicle_id: {variable: self.getters[variable](vehicle_id) for variable in variables}
+                for vehicle_id, variables in self.sim.vehicle_subscriptions.items()}
+
+
+class EdgeDomain:
+    def __init__(self, simulation):
+        self.sim = simulation
+
+    def getIDList(self):
+        return tuple(self.sim.edge_ids)
+
+    def edge_index(self, edgeID):
+        try:
+            return self.sim.edge_index_dict[edgeID]
+        except KeyError:
+            raise TraCIException("Edge '{}' is not known".format(edgeID))
+
+    def getLastStepVehicleNumber(self, edgeID):
+        return int(self.sim.counts[self.edge_index(edgeID)])
+
+    def getLastStepMeanSpeed(self, edgeID):
+        return float(self.sim.edge_mean_speeds()[self.edge_index(edgeID)])
+
+    def getLastStepOccupancy(self, edgeID):
+        return float(self.sim.edge_occupancies()[self.edge_index(edgeID)])
+
+    def subscribe(self, objectID, varIDs, begin=None, end=None):
+        for variable in varIDs:
+            if variable not in EDGE_VARIABLES:
+                raise TraCIException("Edge variable {} is not supported".format(variable))
+        self.sim.edge_subscriptions[objectID] = (self.edge_index(objectID), list(varIDs))
+
+    def getAllSubscriptionResults(self):
+        # every variable of every edge at once, for the subscribed ones
+        variables = {variable for _, edge_variables in self.sim.edge_subscriptions.values()
+                     for variable in edge_variables}
+        values = {tc.LAST_STEP_VEHICLE_NUMBER: self.sim.counts.tolist()}
+        if tc.LAST_STEP_MEAN_SPEED in variables:
+            values[tc.LAST_STEP_MEAN_SPEED] = self.sim.edge_mean_speeds().tolist()
+        if tc.LAST_STEP_OCCUPANCY in variables:
+            values[tc.LAST_STEP_OCCUPANCY] = self.sim.edge_occupancies().tolist()
+        return {edge: {variable: values[variable][edge_index] for variable in edge_variables}
+                for edge, (edge_index, edge_variables) in self.sim.edge_subscriptions.items()}
+
+
+# the simulation of start(), used through the module functions and domains like the traci module
+_simulation = None
+DOMAINS = ["simulation", "vehicle", "edge"]
+
+
+def start(cmd, port=None, label="default", stdout=None, **kwargs):
+    """
+    Same signature as traci.start; port, label and the other options of traci.start are ignored.
+    :param cmd: SUMO command line, see MesoSimulation.from_command
+    """
+    global _simulation
+    _simulation = MesoSimulation.from_command(cmd)
+    return _simulation
+
+
+def simulationStep(step=0.0):
+    """
+    :param step: run until this time, one step if 0 like traci.simulationStep
+    """
+    simulation = get_simulation()
+    simulation.step()
+    while simulation.time < step:
+        simulation.step()
+
+
+def close(wait=True):
+    global _simulation
+    _simulation = None
+
+
+def get_simulation():
+    if _simulation is None:
+        raise TraCIException("Not connected, call start() first")
+    return _simulation
+
+
+def __getattr__(name):
+    # the domains of the running simulation, e.g. core.meso_simulator.vehicle
+    if name in DOMAINS:
+        return getattr(get_simulation(), name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
@@ -83,3 +83,30 @@ def getEdgesInfo(net):
                 out_dict[current_edge_id][dir_now] = current_out_edge.getID()
 
     return [length_dict, out_dict, index_dict, edge_list]
+
+
+def getCompiledEdgesInfo(network):
+    """
+        param @network <core.compiled_network.CompiledNetwork>: the compiled form of a map network.
+        
+        Same as getEdgesInfo for a compiled network, without parsing the net file. The edges
+        in [3] are of type core.compiled_network.CompiledEdge.
+    """
+    out_dict = {}
+    length_dict = {}
+    index_dict = {}
+    edge_list = []
+    for current_edge in network.getEdges():
+        current_edge_id = current_edge.getID()
+        if current_edge.allows("passenger"):
+            edge_list.append(current_edge)
+        index_dict[current_edge_id] = current_edge.index
+        out_dict[current_edge_id] = {}
+        length_dict[current_edge_id] = current_edge.getLength()
+    edge_ids = network.edge_ids
+    for from_index, to_index, dir_now in zip(network.connection_from, network.connection_to,
+                                             network.connection_direction):
+        if network.allows(to_index, "passenger"):
+            out_dict[edge_ids[from_index]][dir_now] = edge_ids[to_index]
+
+    return [length_dict, out_dict, index_dict, edge_list]
@@ -0,0 +1,179 @@
+"""
+    Forward pass of trained Keras models in plain NumPy, so that QLearningPolicy runs without
+    importing keras/TensorFlow.
+
+    A model is a stack of dense layers and activations stored in a .npz weights file made by
+    export_keras_model(). The weights can be stored as
+        - float32: exact Keras outputs up to rounding
+        - float16: half the file size
+        - int8: a quarter of the file size, symmetric quantisation with one scale per output unit
+    The computation is always done in float32, small batches are dominated by call overhead and
+    NumPy has no fast float16/int8 matrix products.
+
+    Export a model from the main repository with:
+        python -m core.numpy_model test/rl-high-all-fixed-late.h5 rl-high-all-fixed-late.npz [float32|float16|int8]
+"""
+
+import sys
+import numpy as np
+
+MODEL_FILE_VERSION = 1
+PRECISIONS = ["float32", "float16", "int8"]
+DENSE = "dense"
+ACTIVATION = "activation"
+
+
+def relu(x, alpha):
+    return np.maximum(x, 0.0)
+
+
+def leaky_relu(x, alpha):
+    return np.where(x > 0.0, x, alpha * x)
+
+
+def sigmoid(x, alpha):
+    # same as 1 / (1 + exp(-x)) without overflowing for large negative x
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def tanh(x, alpha):
+    return np.tanh(x)
+
+
+def softmax(x, alpha):
+    e = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+
+def linear(x, alpha):
+    return x
+
+
+ACTIVATIONS = {"relu": relu, "leaky_relu": leaky_relu, "sigmoid": sigmoid, "tanh": tanh, "softmax": softmax,
+               "linear": linear}
+
+
+class NumpyModel:
+    """
+    :param layers: [(kind, kernel, bias, activation, alpha)] in order; kernel and bias are None for
+                   activation layers, alpha is the slope of leaky_relu
+    """
+    def __init__(self, layers):
+        for kind, kernel, bias, activation, alpha in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError("Unsupported activation {}".format(activation))
+        self.layers = [(kind,
+                        None if kernel is None else np.asarray(kernel, dtype=np.float32),
+                        None if bias is None else np.asarray(bias, dtype=np.float32),
+                        ACTIVATIONS[activation], np.float32(alpha))
+                       for kind, kernel, bias, activation, alpha in layers]
+
+    def predict(self, x):
+        """
+        :param x: one input per row
+        :return: one output per row, like keras Model.predict
+        """
+        x = np.asarray(x, dtype=np.float32)
+        for kind, kernel, bias, activation, alpha in self.layers:
+            if kind == DENSE:
+                x = x @ kernel + bias
+            x = activation(x, alpha)
+        return x
+
+
+def keras_layers(model):
+    """
+    :param model: keras Sequential model of Dense, activation and Dropout layers
+    :return: [(kind, kernel, bias, activation, alpha)] for NumpyModel
+    """
+    layers = []
+    for layer in model.layers:
+        name = type(layer).__name__
+        config = layer.get_config()
+        if name == "Dense":
+            kernel, bias = layer.get_weights()
+            layers.append((DENSE, kernel, bias, config["activation"], 0.0))
+        elif name == "LeakyReLU":
+            alpha = config.get("negative_slope", config.get("alpha", 0.3))
+            layers.append((ACTIVATION, None, None, "leaky_relu", alpha))
+        elif name == "ReLU":
+            layers.append((ACTIVATION, None, None, "relu", 0.0))
+        elif name == "Activation":
+            layers.append((ACTIVATION, None, None, config["activation"], 0.0))
+        elif name in ("Dropout", "InputLayer"):
+            continue  # nothing to do at inference
+        else:
+            raise ValueError("Cannot export layer {} of type {}".format(layer.name, name))
+    return layers
+
+
+def quantize(kernel):
+    """
+    :return: (int8 kernel, float32 scale per output unit) with kernel ~ int8 kernel * scale
+    """
+    scale = np.max(np.abs(kernel), axis=0) / 127.0
+    scale[scale == 0.0] = 1.0
+    return np.round(kernel / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def save_numpy_model(layers, weights_file, precision="float32"):
+    """
+    :param layers: [(kind, kernel, bias, activation, alpha)]
+    :param weights_file: the .npz file to write
+    :param precision: storage of the kernels, one of PRECISIONS
+    """
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision {}, expected one of {}".format(precision, PRECISIONS))
+    arrays = {"version": np.array(MODEL_FILE_VERSION), "precision": np.array(precision),
+              "kinds": np.array([layer[0] for layer in layers]),
+              "activations": np.array([layer[3] for layer in layers]),
+              "alphas": np.array([layer[4] for layer in layers], dtype=np.float32)}
+    for i, (kind, kernel, bias, activation, alpha) in enumerate(layers):
+        if kind != DENSE:
+            continue
+        kernel = np.asarray(kernel, dtype=np.float32)
+        if precision == "int8":
+            arrays["kernel_{}".format(i)], arrays["scale_{}".format(i)] = quantize(kernel)
+        else:
+            arrays["kernel_{}".format(i)] = kernel.astype(precision)
+        arrays["bias_{}".format(i)] = np.asarray(bias, dtype=np.float32)
+    with open(weights_file, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def load_numpy_model(weights_file):
+    """
+    :param weights_file: .npz file written by save_numpy_model or export_keras_model
+    :return: NumpyModel
+    """
+    with np.load(weights_file) as stored:
+        if int(stored["version"]) != MODEL_FILE_VERSION:
+            raise ValueError("{} was written by model file version {}, expected {}".format(
+                weights_file, int(stored["version"]), MODEL_FILE_VERSION))
+        layers = []
+        for i, (kind, activation, alpha) in enumerate(zip(stored["kinds"], stored["activations"], stored["alphas"])):
+            kernel = bias = None
+            if kind == DENSE:
+                kernel = stored["kernel_{}".format(i)].astype(np.float32)
+                if "scale_{}".format(i) in stored:
+                    kernel *= stored["scale_{}".format(i)]
+                bias = stored["bias_{}".format(i)]
+            layers.append((str(kind), kernel, bias, str(activation), float(alpha)))
+    return NumpyModel(layers)
+
+
+def export_keras_model(model_file, weights_file, precision="float32"):
+    """
+    Converts a Keras model file into a weights file for load_numpy_model; needs keras.
+    :param model_file: the Keras model, e.g. 'test/rl-high-all-fixed-late.h5'
+    :param weights_file: the .npz file to write
+    :param precision: storage of the kernels, one of PRECISIONS
+    """
+    from keras.models import load_model
+    save_numpy_model(keras_layers(load_model(model_file, compile=False)), weights_file, precision)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("Usage: python -m core.numpy_model <keras model file> <weights file> [float32|float16|int8]")
+    export_keras_model(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else "float32")
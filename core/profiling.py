@@ -0,0 +1,193 @@
+"""
+    Opt-in instrumentation of StrSumo.run.
+
+    StepProfiler times the phases of every simulation step with time.perf_counter_ns:
+        - decision_wait: waiting for the make_decisions worker (StrSumo pipeline_lag only)
+        - state_update: reading the TraCI state of the step (core/state_sync.py)
+        - edge_counts: get_edge_vehicle_counts
+        - vehicle_scan: finding the controlled vehicles that changed edges
+        - make_decisions: the route controller (serial mode only)
+        - change_target: applying the decisions with traci.vehicle.changeTarget (and handing the
+          vehicles to the make_decisions worker with pipeline_lag)
+        - arrivals: bookkeeping of the arrived vehicles
+        - simulation_step: traci.simulationStep, i.e. SUMO itself
+    and the decision latency per vehicle of the route controller (make_decisions time divided by
+    the number of vehicles decided). Every series goes into a Histogram with HDR-style log-linear
+    buckets, reported with percentiles at the end of the run.
+
+    Optionally the steps profile_steps[0] to profile_steps[1] (inclusive) run under cProfile and
+    the stats are dumped to profile_file, e.g. for snakeviz or python -m pstats.
+
+    StrSumo does nothing of this without a profiler, so the overhead when it is off is one
+    `if profiler is not None` per phase.
+"""
+
+import cProfile
+import io
+import json
+import math
+import time
+
+PHASES = ["decision_wait", "state_update", "edge_counts", "vehicle_scan", "make_decisions", "change_target",
+          "arrivals", "simulation_step"]
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+class Histogram:
+    """
+    Log-linear histogram of non-negative integer values (HDR histogram layout): values below
+    2^sub_bucket_bits are counted exactly, larger values in buckets whose width is 2^-sub_bucket_bits
+    of their magnitude, i.e. with a relative error below 1/2^sub_bucket_bits (< 1% for 7 bits).
+    :param sub_bucket_bits: resolution of the buckets
+    """
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        """
+        :return: (shift, sub bucket) of value; the bucket covers [sub << shift, (sub + 1) << shift)
+        """
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return shift, value >> shift
+
+    def record(self, value):
+        value = int(value)
+        key = self.bucket(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """
+        :return: upper end of the bucket holding the value at percent (clamped to max), None if empty
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(percent / 100.0 * self.count))
+        seen = 0
+        for shift, sub in sorted(self.counts, key=lambda key: key[1] << key[0]):
+            seen += self.counts[(shift, sub)]
+            if seen >= rank:
+                return min(((sub + 1) << shift) - 1, self.max)
+        return self.max
+
+    def buckets(self):
+        """
+        :return: [(lowest value, highest value, count)] of the non-empty buckets in value order
+        """
+        return [(sub << shift, ((sub + 1) << shift) - 1, self.counts[(shift, sub)])
+                for shift, sub in sorted(self.counts, key=lambda key: key[1] << key[0])]
+
+    def summary(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else None,
+                "min": self.min, "max": self.max,
+                "percentiles": {str(p): self.percentile(p) for p in PERCENTILES}}
+
+
+class StepProfiler:
+    """
+    :param profile_steps: (first step, last step) to run under cProfile, None for no cProfile
+    :param profile_file: file the cProfile stats are dumped to
+    :param report_file: json file the histograms are written to by finish(), None to only print them
+    """
+    def __init__(self, profile_steps=None, profile_file="str_sumo.prof", report_file=None):
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.decision_latency = {}
+        self.profile_steps = profile_steps
+        self.profile_file = profile_file
+        self.report_file = report_file
+        self.profile = None
+        self.step = 0
+        self.last = 0
+        self.last_duration = 0
+
+    def start_step(self, step):
+        """
+        Called at the beginning of every step; starts and stops the cProfile window.
+        """
+        self.step = step
+        if self.profile_steps is not None:
+            first, last = self.profile_steps
+            if step == first:
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+            elif step == last + 1:
+                self.stop_profile()
+        self.last = time.perf_counter_ns()
+
+    def end_phase(self, phase):
+        """
+        Records the time since the previous end_phase (or start_step) as phase.
+        """
+        now = time.perf_counter_ns()
+        self.last_duration = now - self.last
+        self.phases[phase].record(self.last_duration)
+        self.last = now
+
+    def record_decisions(self, controller_name, num_vehicles):
+        """
+        Records the per-vehicle latency of the make_decisions phase; called right after its end_phase.
+        :param controller_name: e.g. the class name of the route controller
+        :param num_vehicles: number of vehicles decided
+        """
+        if num_vehicles == 0:
+            return
+        histogram = self.decision_latency.get(controller_name)
+        if histogram is None:
+            histogram = self.decision_latency[controller_name] = Histogram()
+        histogram.record(self.last_duration // num_vehicles)
+
+    def stop_profile(self):
+        if self.profile is None:
+            return
+        self.profile.disable()
+        self.profile.dump_stats(self.profile_file)
+        self.profile = None
+
+    def report(self):
+        """
+        :return: {"phases": {phase: summary}, "decision_latency_per_vehicle": {controller: summary},
+                  "buckets": {phase: buckets}}, all times in ns
+        """
+        return {"phases": {phase: histogram.summary() for phase, histogram in self.phases.items()},
+                "decision_latency_per_vehicle": {name: histogram.summary()
+                                                 for name, histogram in self.decision_latency.items()},
+                "buckets": {phase: histogram.buckets() for phase, histogram in self.phases.items()}}
+
+    def finish(self):
+        """
+        Called at the end of the run: stops cProfile, prints the percentiles and writes the report.
+        """
+        self.stop_profile()
+        print(self.format_report())
+        if self.report_file is not None:
+            with open(self.report_file, 'w') as f:
+                json.dump(self.report(), f, indent=2)
+
+    def format_report(self):
+        out = io.StringIO()
+        header = "{:<32}{:>10}{:>12}".format("phase (us)", "count", "mean") + \
+                 "".join("{:>12}".format("p" + str(p)) for p in PERCENTILES) + "{:>12}".format("max")
+        out.write(header + "\n")
+        rows = [(phase, histogram) for phase, histogram in self.phases.items()] + \
+               [("decision/vehicle " + name, histogram) for name, histogram in self.decision_latency.items()]
+        for name, histogram in rows:
+            if histogram.count == 0:
+                continue
+            summary = histogram.summary()
+            values = [summary["mean"]] + [summary["percentiles"][str(p)] for p in PERCENTILES] + [summary["max"]]
+            out.write("{:<32}{:>10}".format(name, histogram.count) +
+                      "".join("{:12.1f}".format(value / 1000.0) for value in values) + "\n")
+        if self.profile_steps is not None:
+            out.write("cProfile stats of steps {}-{} in {}\n".format(self.profile_steps[0], self.profile_steps[1],
+                                                                   self.profile_file))
+        return out.getvalue()
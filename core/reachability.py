@@ -0,0 +1,227 @@
+"""
+    Which edges can be reached from which, answered in constant time.
+
+    The strongly connected components of the edge graph (every connection, like
+    getShortestPath without a vehicle class) are found once per network with an iterative
+    Tarjan search. Every edge of a component reaches every other edge of it, so reachability
+    between edges is reachability between components in the condensation, which is a DAG:
+    each component keeps the set of components it reaches as a bitset (a Python int), built
+    in reverse topological order, and the set of components reaching it the same way.
+
+    The vehicle generator used to draw random start and destination edges and reject the
+    pairs without a path, one shortest path search each; PairSampler draws from the
+    reachable pairs only, so it never rejects.
+"""
+
+import bisect
+import itertools
+import random
+
+
+def strongly_connected_components(successors):
+    """
+    Iterative Tarjan search.
+    :param successors: [[node]] successors of each node 0..n-1
+    :return: (component [component index] by node, number of components); components are
+             numbered in reverse topological order, i.e. every successor of a component has a
+             lower or equal index
+    """
+    num_nodes = len(successors)
+    component = [-1] * num_nodes
+    order = [-1] * num_nodes
+    low_link = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    stack = []
+    num_components = 0
+    counter = 0
+    for root in range(num_nodes):
+        if order[root] != -1:
+            continue
+        order[root] = low_link[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        # (node, position of the next successor to visit)
+        call_stack = [(root, 0)]
+        while call_stack:
+            node, position = call_stack[-1]
+            node_successors = successors[node]
+            if position < len(node_successors):
+                call_stack[-1] = (node, position + 1)
+                successor = node_successors[position]
+                if order[successor] == -1:
+                    order[successor] = low_link[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    call_stack.append((successor, 0))
+                elif on_stack[successor] and order[successor] < low_link[node]:
+                    low_link[node] = order[successor]
+                continue
+            call_stack.pop()
+            if call_stack:
+                parent = call_stack[-1][0]
+                if low_link[node] < low_link[parent]:
+                    low_link[parent] = low_link[node]
+            if low_link[node] == order[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = num_components
+                    if member == node:
+                        break
+                num_components += 1
+    return component, num_components
+
+
+class ReachabilityIndex:
+    """
+    Available collections:
+        - component [component index] by edge index
+        - members [[edge index]] by component, in edge index order
+        - reaches [bitset of the components reachable from it, itself included] by component
+        - reached_by [bitset of the components reaching it, itself included] by component
+    :param successors: [[edge index]] successors of each edge, e.g. CompiledNetwork.outgoing
+    :param edge_ids: [edge_id] by edge index
+    """
+    def __init__(self, successors, edge_ids):
+        self.edge_ids = edge_ids
+        self.edge_index_dict = {edge_id: i for i, edge_id in enumerate(edge_ids)}
+        self.component, num_components = strongly_connected_components(successors)
+        self.members = [[] for _ in range(num_components)]
+        for edge_index, c in enumerate(self.component):
+            self.members[c].append(edge_index)
+        condensation = [set() for _ in range(num_components)]
+        for edge_index, edge_successors in enumerate(successors):
+            c = self.component[edge_index]
+            for successor in edge_successors:
+                if self.component[successor] != c:
+                    condensation[c].add(self.component[successor])
+        # successors have lower indices, so one pass in index order sees them complete
+        self.reaches = [0] * num_components
+        for c in range(num_components):
+            bits = 1 << c
+            for successor in condensation[c]:
+                bits |= self.reaches[successor]
+            self.reaches[c] = bits
+        self.reached_by = [1 << c for c in range(num_components)]
+        for c in range(num_components - 1, -1, -1):
+            for successor in condensation[c]:
+                self.reached_by[successor] |= self.reached_by[c]
+
+    def num_components(self):
+        return len(self.members)
+
+    def index_of(self, edge):
+        """
+        :param edge: edge ID, or an edge of a sumolib.Net or of a compiled network
+        :return: edge index
+        """
+        if isinstance(edge, str):
+            return self.edge_index_dict[edge]
+        return self.edge_index_dict[edge.getID()]
+
+    def reachable(self, start, destination):
+        """
+        True if there is a path from start to destination; an edge reaches itself.
+        :param start: edge ID or edge, see index_of
+        :param destination: edge ID or edge, see index_of
+        """
+        return (self.reaches[self.component[self.index_of(start)]] >> self.component[self.index_of(destination)]) & 1 == 1
+
+
+def get_reachability_index(net):
+    """
+    Returns the ReachabilityIndex of net, building it on first use.
+    :param net: compiled network (see core/compiled_network.py) or sumolib.Net
+    """
+    index = getattr(net, "_reachability_index", None)
+    if index is None:
+        if hasattr(net, "outgoing"):
+            index = ReachabilityIndex(net.outgoing, net.edge_ids)
+        else:
+            edges = net.getEdges()
+            edge_ids = [edge.getID() for edge in edges]
+            position = {edge_id: i for i, edge_id in enumerate(edge_ids)}
+            index = ReachabilityIndex([[position[successor.getID()] for successor in edge.getOutgoing()]
+                                       for edge in edges], edge_ids)
+        net._reachability_index = index
+    return index
+
+
+class PairSampler:
+    """
+    Draws (start, destination) uniformly from the pairs of starts x destinations with a path
+    from start to destination, without rejection: a start is drawn with probability
+    proportional to the number of destinations it reaches, then one of those destinations.
+    Repeated elements count as often as they appear, like random.choice on the lists.
+    :param index: ReachabilityIndex of the network of the edges
+    :param starts: list of candidate start edges (IDs or edges)
+    :param destinations: list of candidate destination edges (IDs or edges)
+    :param distinct: leave out the pairs whose start and destination are the same edge
+    """
+    def __init__(self, index, starts, destinations, distinct=False):
+        self.index = index
+        self.starts = starts
+        self.distinct = distinct
+        component = index.component
+        self.start_indices = [index.index_of(start) for start in starts]
+        # the candidate destinations grouped by component, and where each edge is in its group
+        self.groups = {}
+        self.group_positions = {}
+        for destination in destinations:
+            edge_index = index.index_of(destination)
+            group = self.groups.setdefault(component[edge_index], [])
+            self.group_positions.setdefault(edge_index, []).append(len(group))
+            group.append(destination)
+        # per start component: (cumulative sizes, [component]) of the groups it reaches
+        self.reachable_groups = {}
+        counts = []
+        for edge_index in self.start_indices:
+            cumulative = self.reachable_from(component[edge_index])[0]
+            count = cumulative[-1] if cumulative else 0
+            if distinct:
+                count -= len(self.group_positions.get(edge_index, ()))
+            counts.append(count)
+        self.cumulative_counts = list(itertools.accumulate(counts))
+
+    def reachable_from(self, start_component):
+        reachable = self.reachable_groups.get(start_component)
+        if reachable is None:
+            bits = self.index.reaches[start_component]
+            components = [c for c in self.groups if (bits >> c) & 1]
+            reachable = (list(itertools.accumulate(len(self.groups[c]) for c in components)), components)
+            self.reachable_groups[start_component] = reachable
+        return reachable
+
+    def num_pairs(self):
+        """
+        :return: number of reachable (start, destination) pairs, counting repeated elements
+        """
+        return self.cumulative_counts[-1] if self.cumulative_counts else 0
+
+    def sample(self, rng=None):
+        """
+        :param rng: random.Random, the random module if None
+        :return: (start, destination) as given in the candidate lists
+        :raise ValueError: if no start reaches a destination
+        """
+        if rng is None:
+            rng = random
+        total = self.num_pairs()
+        if total <= 0:
+            raise ValueError("No candidate start edge reaches a candidate destination edge")
+        i = min(bisect.bisect_right(self.cumulative_counts, rng.random() * total), len(self.starts) - 1)
+        start_index = self.start_indices[i]
+        start_component = self.index.component[start_index]
+        cumulative, components = self.reachable_from(start_component)
+        k = rng.randrange(self.cumulative_counts[i] - (self.cumulative_counts[i - 1] if i else 0))
+        if self.distinct and start_index in self.group_positions:
+            # skip the entries of the start itself, all in the group of its own component
+            offset = cumulative[components.index(start_component) - 1] if components.index(start_component) else 0
+            for position in self.group_positions[start_index]:
+                if offset + position <= k:
+                    k += 1
+        position = bisect.bisect_right(cumulative, k)
+        group = self.groups[components[position]]
+        return self.starts[i], group[k - (cumulative[position - 1] if position else 0)]
@@ -0,0 +1,157 @@
+"""
+    Sinks that stream one record per arriving controlled vehicle out of StrSumo.run, so that long
+    runs keep bounded memory and leave the records written so far if they are interrupted.
+
+    Records are {field: value} with TRIP_FIELDS:
+        - vehicle_id
+        - start_time: step the vehicle was released
+        - arrival_time: step the vehicle arrived
+        - time_span: arrival_time - start_time
+        - deadline
+        - deadline_missed
+        - reached_destination: False if the vehicle left the simulation at another edge than its destination
+    Writes are buffered and flushed every flush_every records or flush_seconds seconds.
+    The format follows the file extension: .csv, .jsonl or .parquet (needs pyarrow).
+"""
+
+from abc import ABC, abstractmethod
+import csv
+import json
+import time
+
+TRIP_FIELDS = ["vehicle_id", "start_time", "arrival_time", "time_span", "deadline", "deadline_missed",
+               "reached_destination"]
+BUFFER_SIZE = 1 << 16
+
+
+class TripRecordSink(ABC):
+    """
+    Base class of the sinks, implement write_record(), flush_file() and close_file().
+    :param file_name: file the records are written to
+    :param flush_every: flush after this many records
+    :param flush_seconds: flush after a record if the last flush is older than this
+    """
+    def __init__(self, file_name, flush_every=1000, flush_seconds=5.0):
+        self.file_name = file_name
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+        self.records_written = 0
+
+    def write(self, record):
+        """
+        :param record: {field: value} with TRIP_FIELDS
+        """
+        self.write_record(record)
+        self.records_written += 1
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.flush_file()
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.close_file()
+
+    @abstractmethod
+    def write_record(self, record):
+        pass
+
+    @abstractmethod
+    def flush_file(self):
+        pass
+
+    @abstractmethod
+    def close_file(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvTripSink(TripRecordSink):
+    def __init__(self, file_name, flush_every=1000, flush_seconds=5.0):
+        super().__init__(file_name, flush_every, flush_seconds)
+        self.file = open(file_name, 'w', newline='', buffering=BUFFER_SIZE)
+        self.writer = csv.DictWriter(self.file, fieldnames=TRIP_FIELDS)
+        self.writer.writeheader()
+
+    def write_record(self, record):
+        self.writer.writerow(record)
+
+    def flush_file(self):
+        self.file.flush()
+
+    def close_file(self):
+        self.file.close()
+
+
+class JsonlTripSink(TripRecordSink):
+    def __init__(self, file_name, flush_every=1000, flush_seconds=5.0):
+        super().__init__(file_name, flush_every, flush_seconds)
+        self.file = open(file_name, 'w', buffering=BUFFER_SIZE)
+
+    def write_record(self, record):
+        self.file.write(json.dumps(record))
+        self.file.write("\n")
+
+    def flush_file(self):
+        self.file.flush()
+
+    def close_file(self):
+        self.file.close()
+
+
+class ParquetTripSink(TripRecordSink):
+    """
+    Every flush writes the buffered records as one row group; needs pyarrow.
+    """
+    def __init__(self, file_name, flush_every=10000, flush_seconds=30.0):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing trip records to {} needs pyarrow, use a .csv or .jsonl file "
+                              "instead".format(file_name))
+        super().__init__(file_name, flush_every, flush_seconds)
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([("vehicle_id", pyarrow.string()), ("start_time", pyarrow.float64()),
+                                      ("arrival_time", pyarrow.float64()), ("time_span", pyarrow.float64()),
+                                      ("deadline", pyarrow.float64()), ("deadline_missed", pyarrow.bool_()),
+                                      ("reached_destination", pyarrow.bool_())])
+        self.writer = pyarrow.parquet.ParquetWriter(file_name, self.schema)
+        self.records = []
+
+    def write_record(self, record):
+        self.records.append(record)
+
+    def flush_file(self):
+        if self.records:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(self.records, schema=self.schema))
+            self.records = []
+
+    def close_file(self):
+        self.writer.close()
+
+
+SINKS = {".csv": CsvTripSink, ".jsonl": JsonlTripSink, ".parquet": ParquetTripSink}
+
+
+def make_trip_sink(file_name, **kwargs):
+    """
+    :param file_name: file ending with .csv, .jsonl or .parquet
+    :param kwargs: flush_every and flush_seconds of the sink
+    :return: TripRecordSink writing to file_name
+    """
+    for extension, sink in SINKS.items():
+        if file_name.endswith(extension):
+            return sink(file_name, **kwargs)
+    raise ValueError("Unknown trip record format of {}, expected one of {}".format(file_name, list(SINKS)))
@@ -0,0 +1,44 @@
+"""
+    Selection of the shortest-path search used by the routing policies.
+
+    Every router answers point-to-point queries on the edge indices of a RoutingGraph:
+        - search(source, destination) -> (cost, [arc_index]), (INFINITY, None) if unreachable
+        - set_weights(weights, changed_edges=None) replaces the cost of entering each edge;
+          changed_edges optionally lists the edge indices that changed since the last call
+    Available search modes:
+        - "tree": destination-rooted shortest-path trees shared by all vehicles (default)
+        - "ch": contraction hierarchy, persisted next to the net file
+        - "alt": A* with landmark lower bounds, tables persisted next to the net file
+        - "alt_bidirectional": bidirectional A* with the same landmark tables
+        - "dynamic": destination-rooted trees repaired incrementally (LPA*) when weights change
+"""
+
+from core.shortest_path_engine import ShortestPathEngine, ShortestPathTreeCache, get_routing_graph
+from core.contraction_hierarchy import load_contraction_hierarchy
+from core.landmarks import load_landmark_router
+from core.dynamic_shortest_path import DynamicShortestPaths
+
+TREE = "tree"
+CONTRACTION_HIERARCHY = "ch"
+ALT = "alt"
+ALT_BIDIRECTIONAL = "alt_bidirectional"
+DYNAMIC = "dynamic"
+SEARCH_MODES = [TREE, CONTRACTION_HIERARCHY, ALT, ALT_BIDIRECTIONAL, DYNAMIC]
+
+
+def make_router(connection_info, search_mode=TREE):
+    """
+    :param connection_info: ConnectionInfo object of the map
+    :param search_mode: one of SEARCH_MODES
+    :return: router answering the queries of a policy, weighted with the edge lengths
+    """
+    graph = get_routing_graph(connection_info)
+    if search_mode == TREE:
+        return ShortestPathTreeCache(ShortestPathEngine(graph))
+    if search_mode == CONTRACTION_HIERARCHY:
+        return load_contraction_hierarchy(graph, connection_info.net_filename)
+    if search_mode in (ALT, ALT_BIDIRECTIONAL):
+        return load_landmark_router(graph, connection_info.net_filename, bidirectional=search_mode == ALT_BIDIRECTIONAL)
+    if search_mode == DYNAMIC:
+        return DynamicShortestPaths(ShortestPathEngine(graph))
+    raise ValueError("Unknown search mode {}, expected one of {}".format(search_mode, SEARCH_MODES))
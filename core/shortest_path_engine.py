@@ -0,0 +1,397 @@
+"""
+    Shortest-path engine shared by the routing policies.
+
+    The turn graph stored in a ConnectionInfo (edge -> {direction: out_edge}) is
+    compiled once into a compact integer form: every SUMO edge is a node numbered
+    by ConnectionInfo.edge_index_dict, every allowed turn is an arc stored in CSR
+    (compressed sparse row) arrays, and a per-direction turn table gives the
+    outgoing edge for each direction choice in O(1).
+
+    Costs are attached to the edge that is entered, i.e. travelling the arc
+    (u, v) costs weights[v]. With weights equal to the edge lengths this is the
+    cost model the original DijkstraPolicy used.
+"""
+
+import heapq
+from collections import OrderedDict
+
+STRAIGHT = "s"
+TURN_AROUND = "t"
+LEFT = "l"
+RIGHT = "r"
+SLIGHT_LEFT = "L"
+SLIGHT_RIGHT = "R"
+
+# column order of RoutingGraph.turn_table, same order as RouteController.direction_choices
+DIRECTIONS = [STRAIGHT, TURN_AROUND, SLIGHT_RIGHT, RIGHT, SLIGHT_LEFT, LEFT]
+
+INFINITY = float("inf")
+NO_EDGE = -1
+
+
+class RoutingGraph:
+    """
+    Compact integer representation of the turn graph of a ConnectionInfo.
+    Available collections:
+        - edge_ids [edge_id] edge id by edge index
+        - edge_index_dict {edge_id: edge_index}
+        - edge_lengths [edge_length] by edge index
+        - adjacency_start [arc_index] CSR offsets, the arcs leaving edge u are
+          adjacency_start[u] .. adjacency_start[u + 1] - 1
+        - adjacency_source, adjacency_target [edge_index] tail and head of every arc
+        - adjacency_direction [direction] SUMO direction of every arc
+        - reverse_start, reverse_arc: CSR of the incoming arcs, reverse_arc holds
+          indices into the forward arc arrays
+        - turn_table [[edge_index]] one row per edge, one column per entry of
+          DIRECTIONS, NO_EDGE where the turn does not exist
+    :param connection_info: ConnectionInfo object of the map
+    """
+    def __init__(self, connection_info):
+        self.edge_index_dict = connection_info.edge_index_dict
+        num_edges = len(self.edge_index_dict)
+        self.edge_ids = [None] * num_edges
+        for edge_id, edge_index in self.edge_index_dict.items():
+            self.edge_ids[edge_index] = edge_id
+        self.edge_lengths = [connection_info.edge_length_dict[edge_id] for edge_id in self.edge_ids]
+
+        self.adjacency_start = [0] * (num_edges + 1)
+        self.adjacency_source = []
+        self.adjacency_target = []
+        self.adjacency_direction = []
+        self.turn_table = []
+        direction_columns = {direction: column for column, direction in enumerate(DIRECTIONS)}
+
+        for edge_index, edge_id in enumerate(self.edge_ids):
+            turns = [NO_EDGE] * len(DIRECTIONS)
+            for direction, outgoing_edge in connection_info.outgoing_edges_dict.get(edge_id, {}).items():
+                target_index = self.edge_index_dict[outgoing_edge]
+                self.adjacency_source.append(edge_index)
+                self.adjacency_target.append(target_index)
+                self.adjacency_direction.append(direction)
+                if direction in direction_columns:
+                    turns[direction_columns[direction]] = target_index
+            self.turn_table.append(turns)
+            self.adjacency_start[edge_index + 1] = len(self.adjacency_target)
+
+        # incoming arcs, used by searches rooted at a destination
+        self.reverse_start = [0] * (num_edges + 1)
+        for target_index in self.adjacency_target:
+            self.reverse_start[target_index + 1] += 1
+        for edge_index in range(num_edges):
+            self.reverse_start[edge_index + 1] += self.reverse_start[edge_index]
+        fill = self.reverse_start[:-1]
+        self.reverse_arc = [0] * len(self.adjacency_target)
+        for arc, target_index in enumerate(self.adjacency_target):
+            self.reverse_arc[fill[target_index]] = arc
+            fill[target_index] += 1
+
+    def num_edges(self):
+        return len(self.edge_ids)
+
+    def arcs_to_directions(self, arcs):
+        """
+        :param arcs: list of arc indices forming a path
+        :return: the list of SUMO directions consumed by RouteController.compute_local_target
+        """
+        return [self.adjacency_direction[arc] for arc in arcs]
+
+    def arcs_to_edges(self, source, arcs):
+        """
+        :param source: edge index the path starts on
+        :param arcs: list of arc indices forming a path
+        :return: list of edge ids, starting with the source edge
+        """
+        return [self.edge_ids[source]] + [self.edge_ids[self.adjacency_target[arc]] for arc in arcs]
+
+    def path_cost(self, arcs, weights=None):
+        if weights is None:
+            weights = self.edge_lengths
+        return sum(weights[self.adjacency_target[arc]] for arc in arcs)
+
+
+def get_routing_graph(connection_info):
+    """
+    Returns the RoutingGraph of connection_info, building it on first use so that
+    all policies sharing a ConnectionInfo also share one compiled graph.
+    :param connection_info: ConnectionInfo object of the map
+    """
+    graph = getattr(connection_info, "_routing_graph", None)
+    if graph is None:
+        graph = RoutingGraph(connection_info)
+        connection_info._routing_graph = graph
+    return graph
+
+
+class ShortestPathEngine:
+    """
+    Binary-heap Dijkstra over a RoutingGraph.
+    The search keeps one predecessor arc per edge and stops as soon as the destination
+    is settled; the direction list is rebuilt only for that destination.
+    Distance and predecessor arrays are allocated once and invalidated with a search
+    stamp, so a query never pays for the size of the network up front.
+    :param graph: RoutingGraph built from a ConnectionInfo
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        num_edges = graph.num_edges()
+        self.distance = [INFINITY] * num_edges
+        self.predecessor_arc = [NO_EDGE] * num_edges
+        self.stamp = [0] * num_edges
+        self.current_stamp = 0
+        # number of edges settled by the last search, useful to compare search modes
+        self.settled_count = 0
+
+    def search(self, source, destination, weights=None):
+        """
+        :param source: edge index the vehicle is on
+        :param destination: edge index of the destination
+        :param weights: cost of entering each edge by edge index, edge lengths if None
+        :return: (cost, [arc_index]) of a shortest path, or (INFINITY, None) if the
+                 destination is unreachable
+        """
+        graph = self.graph
+        if weights is None:
+            weights = graph.edge_lengths
+        if source == destination:
+            self.settled_count = 0
+            return 0.0, []
+
+        self.current_stamp += 1
+        stamp = self.current_stamp
+        distance = self.distance
+        predecessor_arc = self.predecessor_arc
+        stamps = self.stamp
+        adjacency_start = graph.adjacency_start
+        adjacency_target = graph.adjacency_target
+
+        distance[source] = 0.0
+        predecessor_arc[source] = NO_EDGE
+        stamps[source] = stamp
+        heap = [(0.0, source)]
+        settled = 0
+        while heap:
+            current_distance, current_edge = heapq.heappop(heap)
+            if current_distance > distance[current_edge]:
+                continue  # stale heap entry
+            settled += 1
+            if current_edge == destination:
+                break
+            for arc in range(adjacency_start[current_edge], adjacency_start[current_edge + 1]):
+                outgoing_edge = adjacency_target[arc]
+                new_distance = current_distance + weights[outgoing_edge]
+                if stamps[outgoing_edge] != stamp or new_distance < distance[outgoing_edge]:
+                    stamps[outgoing_edge] = stamp
+                    distance[outgoing_edge] = new_distance
+                    predecessor_arc[outgoing_edge] = arc
+                    heapq.heappush(heap, (new_distance, outgoing_edge))
+        self.settled_count = settled
+
+        if stamps[destination] != stamp:
+            return INFINITY, None
+        arcs = []
+        edge_index = destination
+        while edge_index != source:
+            arc = predecessor_arc[edge_index]
+            arcs.append(arc)
+            edge_index = graph.adjacency_source[arc]
+        arcs.reverse()
+        return distance[destination], arcs
+
+    def route(self, source_edge, destination_edge, weights=None):
+        """
+        :param source_edge: edge id the vehicle is on
+        :param destination_edge: edge id of the destination
+        :param weights: cost of entering each edge by edge index, edge lengths if None
+        :return: list of directions leading to destination_edge, empty if it is unreachable
+        """
+        graph = self.graph
+        cost, arcs = self.search(graph.edge_index_dict[source_edge], graph.edge_index_dict[destination_edge], weights)
+        if arcs is None:
+            return []
+        return graph.arcs_to_directions(arcs)
+
+    def distances_from(self, source, weights=None):
+        """
+        Runs a complete forward search from source.
+        :param source: edge index the search starts on
+        :param weights: cost of entering each edge by edge index, edge lengths if None
+        :return: [cost] from source to every edge by edge index, INFINITY if unreachable
+        """
+        graph = self.graph
+        if weights is None:
+            weights = graph.edge_lengths
+        distance = [INFINITY] * graph.num_edges()
+        adjacency_start = graph.adjacency_start
+        adjacency_target = graph.adjacency_target
+        distance[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            current_distance, current_edge = heapq.heappop(heap)
+            if current_distance > distance[current_edge]:
+                continue
+            for arc in range(adjacency_start[current_edge], adjacency_start[current_edge + 1]):
+                outgoing_edge = adjacency_target[arc]
+                new_distance = current_distance + weights[outgoing_edge]
+                if new_distance < distance[outgoing_edge]:
+                    distance[outgoing_edge] = new_distance
+                    heapq.heappush(heap, (new_distance, outgoing_edge))
+        return distance
+
+    def reverse_tree(self, destination, weights=None):
+        """
+        Runs one Dijkstra backwards from the destination over the incoming arcs.
+        :param destination: edge index of the destination
+        :param weights: cost of entering each edge by edge index, edge lengths if None
+        :return: ShortestPathTree holding the shortest path from every edge to destination
+        """
+        graph = self.graph
+        if weights is None:
+            weights = graph.edge_lengths
+        num_edges = graph.num_edges()
+        distance = [INFINITY] * num_edges
+        next_arc = [NO_EDGE] * num_edges
+        settled = bytearray(num_edges)
+        reverse_start = graph.reverse_start
+        reverse_arc = graph.reverse_arc
+        adjacency_source = graph.adjacency_source
+
+        distance[destination] = 0.0
+        heap = [(0.0, destination)]
+        while heap:
+            current_distance, current_edge = heapq.heappop(heap)
+            if settled[current_edge]:
+                continue
+            settled[current_edge] = 1
+            # every predecessor pays the cost of entering current_edge
+            new_distance = current_distance + weights[current_edge]
+            for i in range(reverse_start[current_edge], reverse_start[current_edge + 1]):
+                arc = reverse_arc[i]
+                incoming_edge = adjacency_source[arc]
+                if new_distance < distance[incoming_edge]:
+                    distance[incoming_edge] = new_distance
+                    next_arc[incoming_edge] = arc
+                    heapq.heappush(heap, (new_distance, incoming_edge))
+        self.settled_count = sum(settled)
+        return ShortestPathTree(graph, destination, distance, next_arc, settled)
+
+
+class ShortestPathTree:
+    """
+    Shortest paths from every edge towards one destination.
+    Available collections:
+        - distance [cost] to the destination by edge index, INFINITY if unreachable
+        - next_arc [arc_index] first arc of the shortest path leaving each edge
+        - settled bytearray of the edges reached by the search; the tree only depends
+          on the weights of these edges
+    """
+    def __init__(self, graph, destination, distance, next_arc, settled):
+        self.graph = graph
+        self.destination = destination
+        self.distance = distance
+        self.next_arc = next_arc
+        self.settled = settled
+
+    def arcs_from(self, source):
+        """
+        Walks up the tree from source.
+        :param source: edge index the vehicle is on
+        :return: [arc_index] leading to the destination, None if it is unreachable
+        """
+        if self.distance[source] == INFINITY:
+            return None
+        arcs = []
+        edge_index = source
+        adjacency_target = self.graph.adjacency_target
+        while edge_index != self.destination:
+            arc = self.next_arc[edge_index]
+            arcs.append(arc)
+            edge_index = adjacency_target[arc]
+        return arcs
+
+    def directions_from(self, source):
+        """
+        :param source: edge index the vehicle is on
+        :return: list of directions leading to the destination, empty if it is unreachable
+        """
+        arcs = self.arcs_from(source)
+        if arcs is None:
+            return []
+        return self.graph.arcs_to_directions(arcs)
+
+    def depends_on(self, edge_indices):
+        settled = self.settled
+        for edge_index in edge_indices:
+            if settled[edge_index]:
+                return True
+        return False
+
+
+class ShortestPathTreeCache:
+    """
+    LRU-bounded cache of destination-rooted shortest-path trees.
+    All vehicles heading to the same destination share one tree, so a routing step costs
+    one reverse search per distinct destination instead of one search per vehicle.
+    A tree is dropped only when the weight of an edge it depends on changes (see set_weights).
+    :param engine: ShortestPathEngine used to build the trees
+    :param weights: cost of entering each edge by edge index, edge lengths if None
+    :param max_trees: number of trees kept before the least recently used one is evicted
+    """
+    def __init__(self, engine, weights=None, max_trees=64):
+        self.engine = engine
+        self.graph = engine.graph
+        self.weights = list(weights) if weights is not None else list(engine.graph.edge_lengths)
+        self.max_trees = max_trees
+        self.trees = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_tree(self, destination):
+        """
+        :param destination: edge index of the destination
+        :return: ShortestPathTree rooted at destination under the current weights
+        """
+        tree = self.trees.get(destination)
+        if tree is not None:
+            self.hits += 1
+            self.trees.move_to_end(destination)
+            return tree
+        self.misses += 1
+        tree = self.engine.reverse_tree(destination, self.weights)
+        self.trees[destination] = tree
+        if len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+        return tree
+
+    def search(self, source, destination):
+        """
+        :param source: edge index the vehicle is on
+        :param destination: edge index of the destination
+        :return: (cost, [arc_index]) of a shortest path, or (INFINITY, None) if unreachable
+        """
+        tree = self.get_tree(destination)
+        return tree.distance[source], tree.arcs_from(source)
+
+    def set_weights(self, weights, changed_edges=None):
+        """
+        Replaces the edge weights and drops the trees that depend on an edge whose weight changed.
+        :param weights: cost of entering each edge by edge index
+        :param changed_edges: edge indices that may have changed; all edges are compared when None
+        :return: list of the edge indices whose weight changed
+        """
+        old_weights = self.weights
+        if changed_edges is None:
+            changed_edges = range(len(weights))
+        changed_edges = [i for i in changed_edges if weights[i] != old_weights[i]]
+        if changed_edges:
+            self.weights = list(weights)
+            self.invalidate(changed_edges)
+        return changed_edges
+
+    def invalidate(self, changed_edges):
+        """
+        :param changed_edges: edge indices whose weight changed since the trees were built
+        """
+        for destination in [d for d, tree in self.trees.items() if tree.depends_on(changed_edges)]:
+            del self.trees[destination]
+            self.invalidations += 1
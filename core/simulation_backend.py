@@ -0,0 +1,103 @@
+"""
+    Selects the module that talks to SUMO, chosen at run time:
+        - "traci": SUMO runs as a separate process and every call is a socket round trip
+        - "libsumo": SUMO runs inside the Python process and every call is a function call;
+          no GUI, only one simulation per process
+        - "meso": the queue-based simulator of core/meso_simulator.py instead of SUMO, much
+          faster and much coarser, for screening policies
+    All offer the same API, so StrSumo and the route controllers import the proxy
+        from core.simulation_backend import traci
+    and work unchanged with any of them; use_backend() has to be called before the simulation starts.
+    Stand-ins offering the part of the API a caller needs (e.g. the TraCI stub of
+    benchmark/controller_benchmark.py) are added with register_backend().
+"""
+
+from contextlib import contextmanager
+import importlib
+import os
+import sys
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("No environment variable SUMO_HOME!")
+
+TRACI = "traci"
+LIBSUMO = "libsumo"
+MESO = "meso"
+BACKENDS = [TRACI, LIBSUMO, MESO]
+BACKEND_MODULES = {TRACI: "traci", LIBSUMO: "libsumo", MESO: "core.meso_simulator"}
+# {name: module or object} added by register_backend
+registered_backends = {}
+
+
+class SimulationBackend:
+    """
+    Forwards every attribute (start, close, simulationStep, vehicle, edge, ...) to the selected module.
+    :param name: one of BACKENDS
+    """
+    def __init__(self, name=TRACI):
+        self.name = None
+        self.module = None
+        self.use(name)
+
+    def use(self, name):
+        """
+        :param name: one of BACKENDS or a name given to register_backend
+        """
+        if name not in BACKENDS and name not in registered_backends:
+            raise ValueError("Unknown simulation backend {}, expected one of {}".format(
+                name, BACKENDS + list(registered_backends)))
+        if name == self.name:
+            return
+        if name in registered_backends:
+            self.module = registered_backends[name]
+        else:
+            self.module = importlib.import_module(BACKEND_MODULES[name])
+        self.name = name
+
+    def __getattr__(self, attribute):
+        # only called for attributes not defined above
+        return getattr(self.module, attribute)
+
+
+traci = SimulationBackend(os.environ.get("STR_SUMO_BACKEND", TRACI))
+
+
+def use_backend(name):
+    """
+    Selects the module used by StrSumo and the route controllers.
+    :param name: one of BACKENDS or a name given to register_backend
+    """
+    traci.use(name)
+
+
+def register_backend(name, module):
+    """
+    Makes a stand-in for SUMO selectable with use_backend(name).
+    :param name: name of the backend, must not be one of BACKENDS
+    :param module: module or object with the attributes of traci used by the caller (simulation, vehicle, ...)
+    """
+    if name in BACKENDS:
+        raise ValueError("{} is a built-in simulation backend".format(name))
+    registered_backends[name] = module
+    if traci.name == name:
+        traci.module = module
+
+
+def get_backend_name():
+    return traci.name
+
+
+@contextmanager
+def using_backend(name):
+    """
+    Selects the backend for the duration of a with block and restores the previous one afterwards.
+    :param name: one of BACKENDS or a name given to register_backend
+    """
+    previous = traci.name
+    use_backend(name)
+    try:
+        yield traci
+    finally:
+        use_backend(previous)
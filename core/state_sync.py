@@ -0,0 +1,264 @@
+"""
+    Per-step simulation state used by StrSumo.run and the routing policies.
+
+    Two interchangeable implementations are offered:
+        - TraciStateSync fetches everything through TraCI subscriptions: the simulation
+          time and the departed/arrived vehicles, the vehicle count of every edge, and the
+          road, speed and maximum speed of every vehicle arrive in one bulk response per
+          step. Only a departing vehicle costs one extra round trip, to subscribe to it. With
+          tracked_vehicles only those vehicles are subscribed to, and the set of vehicles in
+          the simulation is kept up to date from the departed and arrived vehicles, so a step
+          costs no work per untracked vehicle. With local_edge_counts the edges are not
+          subscribed to: every vehicle is subscribed to its road instead and EdgeOccupancy
+          counts the vehicles per edge from the road changes, departures and arrivals. With
+          edge_speeds the mean speed and occupancy of every edge come in the same response.
+        - TraciPollingState asks TraCI for every value when it is needed, which is what
+          StrSumo.run used to do; kept as a reference and for debugging.
+    Both expose after update():
+        - time: simulation time in seconds
+        - vehicle_ids: set of the vehicles in the simulation
+        - departed_ids: [vehicle_id] vehicles that entered the simulation since the last update,
+          at the first update all vehicles in the simulation
+        - arrived_ids: [vehicle_id] vehicles that arrived during the last step
+    and the accessors road_id(), speed(), max_speed(), edge_vehicle_count(), edge_mean_speed(),
+    edge_occupancy() and edge_speed_arrays(), the mean speeds and occupancies of all edges at once.
+"""
+
+import os
+import sys
+import numpy as np
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    sys.path.append(tools)
+else:
+    sys.exit("No environment variable SUMO_HOME!")
+from core.simulation_backend import traci
+import traci.constants as tc
+
+VEHICLE_VARIABLES = [tc.VAR_ROAD_ID, tc.VAR_SPEED, tc.VAR_MAXSPEED]
+EDGE_SPEED_VARIABLES = [tc.LAST_STEP_MEAN_SPEED, tc.LAST_STEP_OCCUPANCY]
+
+
+class EdgeOccupancy:
+    """
+    Number of vehicles on every edge of edge_list, kept up to date from the road of every vehicle:
+    a vehicle changing roads moves one count, a vehicle arriving removes one. Vehicles on other roads
+    (junctions, edges not in edge_list, teleports) are not counted, like LAST_STEP_VEHICLE_NUMBER.
+    :param edge_list: [edge_id] edges to count the vehicles of
+    """
+    def __init__(self, edge_list):
+        self.edge_list = edge_list
+        self.edge_positions = {edge: i for i, edge in enumerate(edge_list)}
+        self.counts = [0] * len(edge_list)
+        self.vehicle_roads = {}  # {vehicle_id: road_id}
+
+    def update(self, vehicle_results, arrived_ids):
+        """
+        :param vehicle_results: {vehicle_id: {VAR_ROAD_ID: road_id, ...}} of every vehicle in the simulation
+        :param arrived_ids: [vehicle_id] vehicles that left the simulation
+        """
+        counts = self.counts
+        edge_positions = self.edge_positions
+        vehicle_roads = self.vehicle_roads
+        for vehicle_id in arrived_ids:
+            position = edge_positions.get(vehicle_roads.pop(vehicle_id, None))
+            if position is not None:
+                counts[position] -= 1
+        for vehicle_id, values in vehicle_results.items():
+            road_id = values[tc.VAR_ROAD_ID]
+            old_road_id = vehicle_roads.get(vehicle_id)
+            if road_id != old_road_id:
+                vehicle_roads[vehicle_id] = road_id
+                position = edge_positions.get(old_road_id)
+                if position is not None:
+                    counts[position] -= 1
+                position = edge_positions.get(road_id)
+                if position is not None:
+                    counts[position] += 1
+
+    def count_array(self):
+        """
+        :return: NumPy array of the counts in edge_list order
+        """
+        return np.array(self.counts, dtype=np.int64)
+
+    def reconcile(self, counts):
+        """
+        Replaces the counts with the ones reported by the simulation.
+        :param counts: NumPy array of the vehicle counts in edge_list order
+        :return: number of vehicles the counts were off by, summed over the edges
+        """
+        drift = int(np.abs(self.count_array() - counts).sum())
+        if drift:
+            self.counts = counts.tolist()
+        return drift
+
+
+class TraciStateSync:
+    """
+    Subscription based state. Available collections after update():
+        - vehicle_road_ids {vehicle_id: edge_id}
+        - vehicle_speeds {vehicle_id: speed}
+        - vehicle_max_speeds {vehicle_id: max speed}
+        - edge_vehicle_counts {edge_id: number of vehicles at edge}, not with local_edge_counts
+        - edge_mean_speeds: NumPy array of the mean speed of the vehicles at each edge in edge_list order,
+          with edge_speeds
+        - edge_occupancies: NumPy array of the occupancy of each edge in % in edge_list order, with edge_speeds
+    The vehicle collections hold the tracked vehicles only.
+    :param edge_list: [edge_id] edges whose vehicle count is needed, e.g. ConnectionInfo.edge_list; empty if none
+    :param tracked_vehicles: container of the vehicle IDs whose road, speed and maximum speed are needed,
+                             e.g. the controlled vehicles; None for all vehicles
+    :param local_edge_counts: count the vehicles per edge in occupancy (an EdgeOccupancy) from the roads of
+                              all vehicles instead of subscribing to the vehicle number of every edge
+    :param edge_speeds: also subscribe to the mean speed and occupancy of every edge (see core/travel_time.py)
+    """
+    def __init__(self, edge_list, tracked_vehicles=None, local_edge_counts=False, edge_speeds=False):
+        self.edge_list = edge_list
+        self.tracked_vehicles = tracked_vehicles
+        self.occupancy = EdgeOccupancy(edge_list) if local_edge_counts else None
+        self.edge_variables = ([] if local_edge_counts else [tc.LAST_STEP_VEHICLE_NUMBER]) + \
+                              (EDGE_SPEED_VARIABLES if edge_speeds else [])
+        self.started = False
+        self.initial_ids = ()
+        self.time = 0.0
+        self.vehicle_ids = set()
+        self.departed_ids = []
+        self.arrived_ids = []
+        self.vehicle_road_ids = {}
+        self.vehicle_speeds = {}
+        self.vehicle_max_speeds = {}
+        self.edge_vehicle_counts = {}
+        self.edge_positions = {edge: position for position, edge in enumerate(edge_list)}
+        self.edge_mean_speeds = np.zeros(len(edge_list), dtype=np.float64)
+        self.edge_occupancies = np.zeros(len(edge_list), dtype=np.float64)
+
+    def start(self):
+        """
+        Subscribes to the simulation and edge variables; called by the first update().
+        """
+        traci.simulation.subscribe([tc.VAR_TIME, tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS])
+        if self.edge_variables:
+            for edge in self.edge_list:
+                traci.edge.subscribe(edge, self.edge_variables)
+        # vehicles already inserted before the subscriptions existed
+        self.initial_ids = traci.vehicle.getIDList()
+        self.started = True
+
+    def update(self):
+        """
+        Reads the subscription results of the last simulation step.
+        """
+        departed_ids = ()
+        if not self.started:
+            self.start()
+            departed_ids = tuple(self.initial_ids)
+        simulation_results = traci.simulation.getSubscriptionResults()
+        self.time = simulation_results.get(tc.VAR_TIME, self.time)
+        self.departed_ids = departed_ids + tuple(simulation_results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ()))
+        self.arrived_ids = simulation_results.get(tc.VAR_ARRIVED_VEHICLES_IDS, ())
+        tracked = self.tracked_vehicles
+        occupancy = self.occupancy
+        for vehicle_id in self.departed_ids:
+            if tracked is None or vehicle_id in tracked:
+                traci.vehicle.subscribe(vehicle_id, VEHICLE_VARIABLES)
+            elif occupancy is not None:
+                traci.vehicle.subscribe(vehicle_id, [tc.VAR_ROAD_ID])
+
+        # subscriptions of vehicles that left the simulation are dropped by SUMO
+        vehicle_results = traci.vehicle.getAllSubscriptionResults()
+        if occupancy is not None:
+            occupancy.update(vehicle_results, self.arrived_ids)
+            if tracked is not None:
+                vehicle_results = {vehicle_id: values for vehicle_id, values in vehicle_results.items()
+                                   if vehicle_id in tracked}
+        if tracked is None:
+            self.vehicle_ids = set(vehicle_results)
+        else:
+            # departures first: a vehicle may depart and arrive within the same step
+            self.vehicle_ids.update(self.departed_ids)
+            self.vehicle_ids.difference_update(self.arrived_ids)
+        self.vehicle_road_ids = {vehicle_id: values[tc.VAR_ROAD_ID] for vehicle_id, values in vehicle_results.items()}
+        self.vehicle_speeds = {vehicle_id: values[tc.VAR_SPEED] for vehicle_id, values in vehicle_results.items()}
+        self.vehicle_max_speeds = {vehicle_id: values[tc.VAR_MAXSPEED] for vehicle_id, values in vehicle_results.items()}
+
+        if self.edge_variables:
+            edge_results = traci.edge.getAllSubscriptionResults()
+            if occupancy is None:
+                self.edge_vehicle_counts = {edge: values[tc.LAST_STEP_VEHICLE_NUMBER]
+                                            for edge, values in edge_results.items()}
+            if tc.LAST_STEP_MEAN_SPEED in self.edge_variables:
+                edge_values = [edge_results[edge] for edge in self.edge_list]
+                self.edge_mean_speeds = np.fromiter((values[tc.LAST_STEP_MEAN_SPEED] for values in edge_values),
+                                                    dtype=np.float64, count=len(edge_values))
+                self.edge_occupancies = np.fromiter((values[tc.LAST_STEP_OCCUPANCY] for values in edge_values),
+                                                    dtype=np.float64, count=len(edge_values))
+
+    def road_id(self, vehicle_id):
+        return self.vehicle_road_ids[vehicle_id]
+
+    def speed(self, vehicle_id):
+        return self.vehicle_speeds[vehicle_id]
+
+    def max_speed(self, vehicle_id):
+        return self.vehicle_max_speeds[vehicle_id]
+
+    def edge_vehicle_count(self, edge):
+        if self.occupancy is not None:
+            return self.occupancy.counts[self.occupancy.edge_positions[edge]]
+        return self.edge_vehicle_counts[edge]
+
+    def edge_mean_speed(self, edge):
+        return self.edge_mean_speeds[self.edge_positions[edge]].item()
+
+    def edge_occupancy(self, edge):
+        return self.edge_occupancies[self.edge_positions[edge]].item()
+
+    def edge_speed_arrays(self):
+        """
+        :return: (mean speeds, occupancies) as NumPy arrays in edge_list order
+        """
+        return self.edge_mean_speeds, self.edge_occupancies
+
+
+class TraciPollingState:
+    """
+    Same interface as TraciStateSync, every value is one TraCI call.
+    """
+    def __init__(self, edge_list=None, tracked_vehicles=None, edge_speeds=False):
+        self.edge_list = edge_list or []
+        self.time = 0.0
+        self.vehicle_ids = set()
+        self.departed_ids = []
+        self.arrived_ids = []
+
+    def update(self):
+        self.time = traci.simulation.getTime()
+        vehicle_ids = traci.vehicle.getIDList()
+        self.departed_ids = [vehicle_id for vehicle_id in vehicle_ids if vehicle_id not in self.vehicle_ids]
+        self.vehicle_ids = set(vehicle_ids)
+        self.arrived_ids = traci.simulation.getArrivedIDList()
+
+    def road_id(self, vehicle_id):
+        return traci.vehicle.getRoadID(vehicle_id)
+
+    def speed(self, vehicle_id):
+        return traci.vehicle.getSpeed(vehicle_id)
+
+    def max_speed(self, vehicle_id):
+        return traci.vehicle.getMaxSpeed(vehicle_id)
+
+    def edge_vehicle_count(self, edge):
+        return traci.edge.getLastStepVehicleNumber(edge)
+
+    def edge_mean_speed(self, edge):
+        return traci.edge.getLastStepMeanSpeed(edge)
+
+    def edge_occupancy(self, edge):
+        return traci.edge.getLastStepOccupancy(edge)
+
+    def edge_speed_arrays(self):
+        edge_list = self.edge_list
+        return (np.fromiter((traci.edge.getLastStepMeanSpeed(edge) for edge in edge_list), dtype=np.float64,
+                            count=len(edge_list)),
+                np.fromiter((traci.edge.getLastStepOccupancy(edge) for edge in edge_list), dtype=np.float64,
+                            count=len(edge_list)))
@@ -13,6 +13,9 @@ import sys
 import xml.dom.minidom 
 from core import Util
 from core import network_map_data_structures
+from core import compiled_network
+from core import demand_generation
+from core import reachability
 
 
 # CHECK VERSION INFORMATION AND SET UP VERSION REFERENCE VARIABLES:
@@ -68,10 +71,12 @@ class target_vehicles_generator:
         self.out_dict = None
         self.index_dict = None
         self.edge_list = None
-        self.net = network_map_data_structures.getNetInfo(net_file)
-        [self.length_dict, self.out_dict, self.index_dict, self.edge_list] = network_map_data_structures.getEdgesInfo(self.net)
+        # the compiled network stands in for the sumolib.Net, see core/compiled_network.py
+        self.net = compiled_network.load_compiled_network(net_file)
+        [self.length_dict, self.out_dict, self.index_dict, self.edge_list] = network_map_data_structures.getCompiledEdgesInfo(self.net)
 
         self.__current_target_xml_file__ = ""
+        self.__pair_samplers__ = {}
 
 
     def generate_target_vehicles(self, num_vehicles, target_xml_file, pattern=None):
@@ -107,8 +112,8 @@ class target_vehicles_generator:
         __error_message__ = None
         # Call appropriate member functions according to the pattern specified:
         if type(pattern) is tuple:
-            if type(pattern[0]) is sumolib.net.edge.Edge:
-                if type(pattern[1]) is sumolib.net.edge.Edge:
+            if __is_edge__(pattern[0]):
+                if __is_edge__(pattern[1]):
                     # -- CASE 1. --
                     vehicles_info = None
                     while vehicles_info is None:
@@ -116,12 +121,16 @@ class target_vehicles_generator:
                 else:
                     __error_message__ = "Invalid pattern for generating random vehicles: The 1st element of " + str(pattern) + " is not an instance of sumolib.net.edge.Edge!"
             elif type(pattern[0]) is list:
-                if type(pattern[1]) is sumolib.net.edge.Edge:
+                if __is_edge__(pattern[1]):
                     # -- CASE 2. --
                     vehicles_info = self.generate_with_ranged_starts_one_dest(num_vehicles, pattern[0], pattern[1])
+                    if vehicles_info is None:
+                        __error_message__ = "Invalid pattern for generating random vehicles: No start point of " + str(pattern) + " reaches the destination!"
                 elif type(pattern[1]) is list:
                     # -- CASE 3. --
                     vehicles_info = self.generate_with_ranged_starts_ranged_dests(num_vehicles, pattern[0], pattern[1])
+                    if vehicles_info is None:
+                        __error_message__ = "Invalid pattern for generating random vehicles: No start point of " + str(pattern) + " reaches a destination!"
                 else:
                     __error_message__ = "Invalid pattern for generating random vehicles: The 1st element of " + str(pattern) + " is not an instance of sumolib.net.edge.Edge or a list of such instances!"
             else:
@@ -197,6 +206,8 @@ class target_vehicles_generator:
             Function to generate @num_vehicles sets of target-vehicle information,
             stored in @vehicles_info. Each target-vehicle is generated with a randomly
             selected start-point from @start_point_lst and with the destination @destination.
+            The start-points are selected among those with a path to @destination; if there
+            are none, the returned value is None.
             
             IMPORTANT: This function should only be called in contexts that assign a file
             name (type <str>) to @target_vehicles_generator.__current_target_xml_file__.
@@ -206,6 +217,15 @@ class target_vehicles_generator:
             to the wrong target-xml output file.
         """
         vehicles_info = []
+        # Only the start-points with a path to @destination are drawn, so no pair is rejected:
+        index = reachability.get_reachability_index(self.net)
+        start_point_lst = [s for s in start_point_lst if index.reachable(s, destination)]
+        if not start_point_lst:
+            
+            ### UNCOMMENT TO DEBUG ###
+            print("No path to", destination.getID())
+            
+            return None
         # Generate @num_vehicle start-points using a random choice function:
         assigned_start_point_lst = None
         if CURRENT_PY_VERSION == PY_VERSION3:
@@ -215,20 +235,8 @@ class target_vehicles_generator:
         
         # TODO: Generate vehicle ID's:
         current_ID = target_vehicles_generator.target_vehicles_output_dict[self.__current_target_xml_file__]
-        i = 0
-        while i < num_vehicles:
-            valid_pair = True
-            if not validate_path(self.net, assigned_start_point_lst[i], destination):
-                valid_pair = False
-                
-                ### UNCOMMENT TO DEBUG ###
-                print("No path from", assigned_start_point_lst[i].getID(), "to", destination.getID())
-                
-                assigned_start_point_lst[i] = random.choice(start_point_lst)
-                continue
-            
-            vehicles_info.append( (current_ID + i, (assigned_start_point_lst[i], destination), valid_pair) )
-            i += 1
+        for i in range(num_vehicles):
+            vehicles_info.append( (current_ID + i, (assigned_start_point_lst[i], destination), True) )
         
         # TODO: The tuple elements for the information of a vehicle are to be determined.
         return vehicles_info
@@ -248,7 +256,8 @@ class target_vehicles_generator:
             Function to generate @num_vehicles sets of target-vehicle information,
             stored in @vehicles_info. Each target-vehicle is generated with a randomly
             selected start-point from @start_point_lst and with a randomly selected
-            destination from @destination_lst.
+            destination from @destination_lst, drawn uniformly from the pairs with a path
+            (see core/reachability.py); if there are none, the returned value is None.
             
             IMPORTANT: This function should only be called in contexts that assign a file
             name (type <str>) to @target_vehicles_generator.__current_target_xml_file__.
@@ -258,33 +267,19 @@ class target_vehicles_generator:
             to the wrong target-xml output file.
         """
         vehicles_info = []
-        # Generate @num_vehicle start-points and destinations using a random choice function:
-        assigned_start_point_lst = None
-        assigned_destination_lst = None
-        if CURRENT_PY_VERSION == PY_VERSION3:
-            assigned_start_point_lst = random.choices(start_point_lst, k=num_vehicles)
-            assigned_destination_lst = random.choices(destination_lst, k=num_vehicles)
-        else:
-            assigned_start_point_lst = __random_choices_with_rp__(start_point_lst, num_vehicles)
-            assigned_destination_lst = __random_choices_with_rp__(destination_lst, num_vehicles)
+        # Generate @num_vehicle pairs of start-points and destinations with a path:
+        sampler = reachability.PairSampler(reachability.get_reachability_index(self.net), start_point_lst, destination_lst)
+        if sampler.num_pairs() == 0:
+            
+            ### UNCOMMENT TO DEBUG ###
+            print("No path from the start points to the destinations")
+            
+            return None
         
         # TODO: Generate vehicle ID's:
         current_ID = target_vehicles_generator.target_vehicles_output_dict[self.__current_target_xml_file__]
-        i = 0
-        while i < num_vehicles:
-            valid_pair = True
-            if not validate_path(self.net, assigned_start_point_lst[i], assigned_destination_lst[i]):
-                valid_pair = False
-                
-                ### UNCOMMENT TO DEBUG ###
-                print("No path from", assigned_start_point_lst[i].getID(), "to", assigned_destination_lst[i].getID())
-                
-                assigned_start_point_lst[i] = random.choice(start_point_lst)
-                assigned_destination_lst[i] = random.choice(destination_lst)
-                continue
-            
-            vehicles_info.append( (current_ID + i, (assigned_start_point_lst[i], assigned_destination_lst[i]), valid_pair) )
-            i += 1
+        for i in range(num_vehicles):
+            vehicles_info.append( (current_ID + i, sampler.sample(), True) )
         
         # TODO: The tuple elements for the information of a vehicle are to be determined.
         return vehicles_info
@@ -300,7 +295,8 @@ class target_vehicles_generator:
             Function to generate @num_vehicles sets of target-vehicle information,
             stored in @vehicles_info. Each target-vehicle is generated with a randomly
             selected start-point from @target_vehicles_generator.edge_list and with a
-            randomly selected destination from @target_vehicles_generator.edge_list.
+            randomly selected destination from @target_vehicles_generator.edge_list,
+            drawn uniformly from the distinct pairs with a path (see core/reachability.py).
             
             IMPORTANT: This function should only be called in contexts that assign a file
             name (type <str>) to @target_vehicles_generator.__current_target_xml_file__.
@@ -314,19 +310,26 @@ class target_vehicles_generator:
         # Generate @num_vehicle tuple-pairs of start_points and destinations:
         # TODO: Generate vehicle ID's:
         current_ID = target_vehicles_generator.target_vehicles_output_dict[self.__current_target_xml_file__]
-        i = 0
-        while i < num_vehicles:
-            pair = random.sample(self.edge_list, 2)
-            if validate_path(self.net, pair[0], pair[1]):
-                vehicles_info.append( (current_ID + i, pair, True) )
-                i += 1
-            ### UNCOMMENT TO DEBUG ###
-            #else:
-                #print("No path from", pair[0].getID(), "to", pair[1].getID())
+        sampler = self.pair_sampler(distinct=True)
+        for i in range(num_vehicles):
+            vehicles_info.append( (current_ID + i, list(sampler.sample()), True) )
                 
         return vehicles_info
     
     
+    def pair_sampler(self, distinct=False):
+        """
+            param @distinct <bool>: leave out the pairs of an edge with itself.
+            
+            Returns the reachability.PairSampler of the pairs of edges of
+            @target_vehicles_generator.edge_list with a path, built on first use.
+        """
+        if distinct not in self.__pair_samplers__:
+            self.__pair_samplers__[distinct] = reachability.PairSampler(reachability.get_reachability_index(self.net),
+                                                                        self.edge_list, self.edge_list, distinct)
+        return self.__pair_samplers__[distinct]
+    
+    
     def random_select_edge_IDs(self, num_of_edges):
         """
             param @num_of_edges <int>: the number of distinct edge ID's desired.
@@ -359,7 +362,8 @@ class target_vehicles_generator:
         
         target_vehicles_generator.target_vehicles_output_dict[target_xml_file] = 0
 
-    def generate_vehicles(self, num_target_vehicles, num_random_vehicles, pattern, target_xml_file, net_xml_file):
+    def generate_vehicles(self, num_target_vehicles, num_random_vehicles, pattern, target_xml_file, net_xml_file,
+                          use_random_trips_script=False):
         """
             param @num_target_vehicles <int>: The number of target vehicles.
             param @num_random_vehicles <int>: The number of uncontrolled vehicles.
@@ -370,6 +374,9 @@ class target_vehicles_generator:
                 #3. ranged start points, ranged destination for all target vehicles
             -- CASES ENDS --
 
+            param @use_random_trips_script <bool>: generate the uncontrolled vehicles with SUMO's
+                                                   randomTrips.py instead of core/demand_generation.py.
+
             Returns the list of target vehicles if succeeds.
             Returns None if the generation fails with error infromation output to the console.
             The result will be written into the target_xml_file.
@@ -379,54 +386,49 @@ class target_vehicles_generator:
         #calculate the density of vehicles accordingly
         latest_release_time = 50.0 #a constant number for the latest release time of all vehicles
         num_random_vehicles *= 2 # this is done to compensate the loss when generating using scripts. Need to solve this later.
+                                 # kept for the in-process generator too, so that the traffic stays comparable
         density =  latest_release_time / float(num_random_vehicles)
         density = int(density * 100)/100.0
-        #copy the file randomTrips.py to the current directory
-        command_str = "cp $SUMO_HOME/tools/randomTrips.py ./"
-        if os.system(command_str) != 0:
-            print("ERROR: Failed to copy randomTrips.py to current directory.")
-            return None
-        #invoke randomTrips.py
-        command_str = "./randomTrips.py -n "+net_xml_file+" -e 50 -p "+str(density) +" -r "+target_xml_file
-        if os.system(command_str) != 0:
-            print("ERROR: Failed to invoke randomTrips.py.")
-            return None
-        #delete randomTrips.py
-        command_str = "rm ./randomTrips.py"
-        if os.system(command_str) != 0:
-            print("ERROR: Failed to remove randomTrips.py.")
-            return None
+        background_file = None
+        if use_random_trips_script:
+            background_file = target_xml_file + ".background.xml"
+            #copy the file randomTrips.py to the current directory
+            command_str = "cp $SUMO_HOME/tools/randomTrips.py ./"
+            if os.system(command_str) != 0:
+                print("ERROR: Failed to copy randomTrips.py to current directory.")
+                return None
+            #invoke randomTrips.py
+            command_str = "./randomTrips.py -n "+net_xml_file+" -e 50 -p "+str(density) +" -r "+background_file
+            if os.system(command_str) != 0:
+                print("ERROR: Failed to invoke randomTrips.py.")
+                return None
+            #delete randomTrips.py
+            command_str = "rm ./randomTrips.py"
+            if os.system(command_str) != 0:
+                print("ERROR: Failed to remove randomTrips.py.")
+                return None
         #insert the generated vehicles into the xml file
         #use id to find the vehicles and modify their information directly
+        #the start points and destinations are drawn among the pairs with a path, see core/reachability.py
         result_dict = None
         if pattern==1:
-            param_start = random.choice(self.edge_list)
-            param_dest = random.choice(self.edge_list)
-            while not validate_path(self.net, param_start, param_dest):
-                param_start = random.choice(self.edge_list)
-                param_dest = random.choice(self.edge_list)
-                ### UNCOMMENT TO DEBUG ###
-                #print("DEBUG: pattern 1 regenerating.")
+            param_start, param_dest = self.pair_sampler().sample()
             result_dict = self.generate_target_vehicles(num_target_vehicles, target_xml_file, (param_start, param_dest) )
         elif pattern==2:
-            param_start = __random_choices_with_rp__(self.edge_list, num_target_vehicles*2)
-            param_dest = random.choice(self.edge_list)
-            #all pairs must be valid
-            while not validate_path_start_points(self.net, param_start, param_dest):
-                param_start = __random_choices_with_rp__(self.edge_list, num_target_vehicles*2)
-                param_dest = random.choice(self.edge_list)
-                ### UNCOMMENT TO DEBUG ###
-                #print("DEBUG: pattern 2 regenerating.")
+            #all pairs must be valid: the start points are drawn among the edges reaching the destination
+            param_dest = self.pair_sampler().sample()[1]
+            index = reachability.get_reachability_index(self.net)
+            param_start = __random_choices_with_rp__([s for s in self.edge_list if index.reachable(s, param_dest)],
+                                                     num_target_vehicles*2)
             result_dict = self.generate_target_vehicles(num_target_vehicles, target_xml_file, (param_start, param_dest) )
         elif pattern==3:
-            param_start = __random_choices_with_rp__(self.edge_list, num_target_vehicles*2)
-            param_dest = __random_choices_with_rp__(self.edge_list, num_target_vehicles*2)
-            #at least one group of start points and one destination is valid towards each other
-            while not validate_path_starts_ends(self.net, param_start, param_dest):
-                param_start = __random_choices_with_rp__(self.edge_list, num_target_vehicles*2)
-                param_dest = __random_choices_with_rp__(self.edge_list, num_target_vehicles*2)
-                ### UNCOMMENT TO DEBUG ###
-                #print("DEBUG: pattern 3 regenerating.")
+            #at least one group of start points and one destination is valid towards each other:
+            #the start points are drawn among the edges reaching the first destination
+            first_dest = self.pair_sampler().sample()[1]
+            index = reachability.get_reachability_index(self.net)
+            param_start = __random_choices_with_rp__([s for s in self.edge_list if index.reachable(s, first_dest)],
+                                                     num_target_vehicles*2)
+            param_dest = [first_dest] + __random_choices_with_rp__(self.edge_list, num_target_vehicles*2 - 1)
             result_dict = self.generate_target_vehicles(num_target_vehicles, target_xml_file, (param_start, param_dest) )
         else:
             print("ERROR: Unknown pattern type.")
@@ -438,50 +440,32 @@ class target_vehicles_generator:
             return None
         #put the vehicle information into a list of Vehicle objects
         vehicle_list = []
+        controlled = []
         release_time = 0
         release_period = latest_release_time/float(num_target_vehicles)
 
-        #read the xml file
-        doc = xml.dom.minidom.parse(target_xml_file)
-        root = doc.documentElement
-        vs = root.getElementsByTagName("vehicle")
-        index = 0
-        print(len(vs))
-        id_now = int(vs.item(len(vs) - 1).getAttribute('id')) + 1
+        #the uncontrolled vehicles are streamed into the route file, see core/demand_generation.py
+        if background_file is None:
+            connection_info = Util.ConnectionInfo(net_xml_file)
+            id_now = demand_generation.trip_count(0.0, latest_release_time, density)
+            background = demand_generation.random_trips(connection_info, 0.0, latest_release_time, density,
+                                                        random.Random(random.getrandbits(32)))
+        else:
+            id_now = int(demand_generation.last_vehicle_id(background_file)) + 1
+            background = demand_generation.read_route_file(background_file)
         #deadline set arbitrarily between a certain range
         for r in result_lst:
-            #find the vehicle slot based on the depart time (departure time must be sorted in xml)
-            for i in range(index, len(vs)):
-                if float(vs.item(i).getAttribute('depart')) <= release_time:
-                    index = i
-                else:
-                    break
-            
-            #insert the vehicle into the xml file
-            #print(index)
-            temp_v = doc.createElement('vehicle')
-            temp_v.setAttribute('depart', str(release_time))
-            temp_v.setAttribute('id', str(id_now))
-            temp_r = doc.createElement('route')
-            temp_r.setAttribute('edges', r[1][0].getID()) #set the start edge as the route
-            temp_v.appendChild(temp_r)
-            if index == len(vs) - 1:
-                root.appendChild(temp_v)
-            else:
-                root.insertBefore(temp_v, vs[index+1])
-                #root.appendChild(temp_v)
-            #append the vehicle to the final vehicle list
             ddl_now = random.randint(500,1000)#randomly set ddl in a range for now
             v_now = Util.Vehicle(str(id_now), r[1][1].getID(), release_time, ddl_now)
             vehicle_list.append(v_now)
+            #the start edge is the route, STR_SUMO sets the targets
+            controlled.append((str(id_now), release_time, str(release_time), [r[1][0].getID()]))
             release_time += release_period
             id_now += 1
-            vs = root.getElementsByTagName("vehicle")
-        #write the vehicle information into the xml file
-        with open(target_xml_file, 'w') as f:
-            f.write(doc.toprettyxml())
-            f.flush()
-            f.close
+        #write the vehicles into the xml file, sorted by departure time
+        demand_generation.write_route_file(target_xml_file, demand_generation.merge_by_depart(background, controlled))
+        if background_file is not None:
+            os.remove(background_file)
         return vehicle_list
 
 
@@ -493,12 +477,11 @@ def validate_path(net, start_point, destination):
         param @destination <sumolib.net.edge.Edge>: a destination on the map from @net.
         
         Function to validate the existence of a path from @start_point to @destination,
-        using the shortest path algorithm offered by @net; returns True if such a path
-        exists, and False otherwise.
+        using the reachability index of @net (see core/reachability.py); returns True if
+        such a path exists, and False otherwise.
         
     """
-    shortestPath = net.getShortestPath(start_point, destination)
-    return shortestPath[0] != None
+    return reachability.get_reachability_index(net).reachable(start_point, destination)
     
 def validate_path_start_points(net, start_points, destination):
     """
@@ -507,13 +490,13 @@ def validate_path_start_points(net, start_points, destination):
         param @destination <sumolib.net.edge.Edge>: a destination on the map from @net.
         
         Function to validate the existence of a path from @start_point to @destination,
-        using the shortest path algorithm offered by @net; returns True if such a path
-        exists, and False otherwise.
+        using the reachability index of @net (see core/reachability.py); returns True if
+        such a path exists, and False otherwise.
     """
+    index = reachability.get_reachability_index(net)
     num = 0
     for s in start_points:
-        shortest_path = net.getShortestPath(s, destination)
-        if shortest_path[0]==None:
+        if not index.reachable(s, destination):
             return False
         num += 1
         if num >= len(start_points)/2:
@@ -527,8 +510,8 @@ def validate_path_starts_ends(net, start_points, destinations):
         param @destination <list of sumolib.net.edge.Edge>: a destination on the map from @net.
         
         Function to validate the existence of a path from @start_point to @destination,
-        using the shortest path algorithm offered by @net; returns True if such a path
-        exists, and False otherwise.
+        using the reachability index of @net (see core/reachability.py); returns True if
+        such a path exists, and False otherwise.
     """
     for d in destinations:
         if validate_path_start_points(net, start_points, d):
@@ -536,6 +519,12 @@ def validate_path_starts_ends(net, start_points, destinations):
     return False
     
 # Auxiliary Functions:
+def __is_edge__(value):
+    """
+        Returns True if @value is an edge of a sumolib.Net or of a compiled network.
+    """
+    return isinstance(value, (sumolib.net.edge.Edge, compiled_network.CompiledEdge))
+
 def __random_choices_with_rp__(lst, k=1):
     """
         param @lst <list>: a list of elements.
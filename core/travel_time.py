@@ -0,0 +1,61 @@
+"""
+    Time-dependent travel times of the edges, for routing on time instead of distance.
+
+    The free-flow travel time of an edge is its length divided by its speed limit, both from the
+    net file (ConnectionInfo.edge_lengths and edge_speeds). Every step StrSumo hands the mean
+    speed and occupancy of all edges of edge_list, read in one bulk subscription response
+    (LAST_STEP_MEAN_SPEED, LAST_STEP_OCCUPANCY, see core/state_sync.py), to TravelTimeModel.update,
+    which turns them into observed travel times and folds them into an exponential moving
+    average, all in a handful of NumPy operations over the whole edge list. The average is kept in
+    ConnectionInfo.edge_travel_times, indexed like the routing graph, so any router can take it as
+    edge weights (see TravelTimePolicy in controller/DijkstraController.py).
+"""
+
+import numpy as np
+
+# weight of the newest observation in the moving average
+DEFAULT_SMOOTHING = 0.2
+# m/s, floor of the mean speed so that a standing queue has a finite travel time
+MIN_SPEED = 0.5
+
+
+class TravelTimeModel:
+    """
+    Available arrays by edge index:
+        - free_flow_speeds: speed limit in m/s
+        - free_flow_times: edge length / speed limit in s
+        - travel_times: smoothed travel time in s, the same array as connection_info.edge_travel_times
+    and in edge_list order, from the last update:
+        - mean_speeds: mean speed of the vehicles on the edge in m/s
+        - occupancies: occupancy of the edge in %
+    :param connection_info: ConnectionInfo of the map; its edge_travel_times is reset to the free-flow times
+    :param smoothing: weight of the newest observation in the exponential moving average, 1 for no smoothing
+    :param min_speed: floor of the mean speeds in m/s
+    """
+    def __init__(self, connection_info, smoothing=DEFAULT_SMOOTHING, min_speed=MIN_SPEED):
+        self.smoothing = smoothing
+        self.min_speed = min_speed
+        self.edge_list_indices = connection_info.edge_list_indices
+        self.free_flow_speeds = connection_info.edge_speeds
+        self.free_flow_times = connection_info.edge_lengths / connection_info.edge_speeds
+        self.travel_times = connection_info.edge_travel_times
+        self.travel_times[:] = self.free_flow_times
+        self.lengths = connection_info.edge_lengths[self.edge_list_indices]
+        self.mean_speeds = self.free_flow_speeds[self.edge_list_indices]
+        self.occupancies = np.zeros(len(self.edge_list_indices), dtype=np.float64)
+
+    def update(self, mean_speeds, occupancies):
+        """
+        Folds the travel times observed in the last step into the moving average. An empty edge (occupancy 0)
+        is observed at its free-flow time, an occupied one at its length over the mean speed of its vehicles.
+        :param mean_speeds: NumPy array of the mean speeds (LAST_STEP_MEAN_SPEED) in edge_list order
+        :param occupancies: NumPy array of the occupancies (LAST_STEP_OCCUPANCY) in edge_list order
+        """
+        indices = self.edge_list_indices
+        self.mean_speeds = mean_speeds
+        self.occupancies = occupancies
+        observed = np.where(occupancies > 0, self.lengths / np.maximum(mean_speeds, self.min_speed),
+                            self.free_flow_times[indices])
+        smoothed = self.travel_times[indices]
+        smoothed += self.smoothing * (observed - smoothed)
+        self.travel_times[indices] = smoothed
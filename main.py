@@ -5,7 +5,7 @@ STR_SUMO.py, RouteController.py, Util.py, test.net.xml, test.rou.xml, myconfig.s
 import sched
 
 from matplotlib.pyplot import xlim
-from core.STR_SUMO import StrSumo
+from core.STR_SUMO import StrSumo, SUMMARY_FILE
 import os
 import sys
 from xml.dom.minidom import parse, parseString
@@ -16,6 +16,7 @@ from core.target_vehicles_generation_protocols import *
 import controller.myAlgo as myAlgo
 import controller.algoHelper as algoHelper
 import csv
+import optparse
 import pandas as pd
 
 if 'SUMO_HOME' in os.environ:
@@ -25,7 +26,8 @@ else:
     sys.exit("No environment variable SUMO_HOME!")
 
 from sumolib import checkBinary
-import traci
+from core.simulation_backend import traci, use_backend, BACKENDS
+from core.profiling import StepProfiler
 
 
 # use vehicle generation protocols to generate vehicle list
@@ -108,7 +110,12 @@ def test_Mike_policy(vehicles):
 
 def run_simulation(scheduler, vehicles):
 
-    simulation = StrSumo(scheduler, init_connection_info, vehicles)
+    profiler = None
+    if options.profile:
+        profile_steps = tuple(int(step) for step in options.profile_steps.split(":")) if options.profile_steps else None
+        profiler = StepProfiler(profile_steps, report_file=options.profile)
+    simulation = StrSumo(scheduler, init_connection_info, vehicles, summary_file=options.summary_file,
+                         trip_sink=options.trip_file, profiler=profiler)
 
     traci.start([sumo_binary, "-c", "./configurations/myconfig.sumocfg", \
                  "--tripinfo-output", "./configurations/trips.trips.xml", \
@@ -119,7 +126,25 @@ def run_simulation(scheduler, vehicles):
         str(end_number)))
     print(str(deadlines_missed) + ' deadlines missed.')
 
+def get_options():
+    opt_parser = optparse.OptionParser()
+    opt_parser.add_option("--backend", type="choice", choices=BACKENDS, default=traci.name,
+                          help="traci (SUMO in a separate process), libsumo (SUMO inside this process, faster) "
+                               "or meso (queue-based simulator of core/meso_simulator.py instead of SUMO, for screening)")
+    opt_parser.add_option("--summary-file", default=SUMMARY_FILE,
+                          help="csv file the totals of the run are written to, default: %default")
+    opt_parser.add_option("--trip-file", default=None,
+                          help="write one record per controlled vehicle to this .csv, .jsonl or .parquet file")
+    opt_parser.add_option("--profile", default=None,
+                          help="time the phases of every step and write the histograms to this json file")
+    opt_parser.add_option("--profile-steps", default=None,
+                          help="first:last step to run under cProfile (with --profile), stats in str_sumo.prof")
+    options, args = opt_parser.parse_args()
+    return options
+
 if __name__ == "__main__":
+    options = get_options()
+    use_backend(options.backend)
     # sumo_binary = checkBinary('sumo-gui')
     sumo_binary = checkBinary('sumo')#use this line if you do not want the UI of SUMO
 
@@ -0,0 +1,81 @@
+'''
+Tests for core/compiled_network.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME). Run from the main repository:
+    python -m pytest test/test_compiled_network.py
+Everything built from the compiled network must equal what is built from the parsed net file.
+'''
+import os
+import pickle
+import random
+import shutil
+import tempfile
+from core.Util import ConnectionInfo, file_hash
+from core import network_map_data_structures
+from core.compiled_network import load_compiled_network, compile_network
+
+NET_FILE = "./configurations/maps/test.net.xml"
+
+
+def test_collections_match_parsed_net():
+    cached = ConnectionInfo(NET_FILE)
+    parsed = ConnectionInfo(NET_FILE, use_cache=False)
+    assert cached.edge_list == parsed.edge_list
+    assert cached.edge_index_dict == parsed.edge_index_dict
+    assert cached.edge_length_dict == parsed.edge_length_dict
+    assert cached.outgoing_edges_dict == parsed.outgoing_edges_dict
+
+    net = network_map_data_structures.getNetInfo(NET_FILE)
+    length_dict, out_dict, index_dict, edge_list = network_map_data_structures.getEdgesInfo(net)
+    compiled = network_map_data_structures.getCompiledEdgesInfo(load_compiled_network(NET_FILE))
+    assert compiled[0] == length_dict and compiled[1] == out_dict and compiled[2] == index_dict
+    assert [edge.getID() for edge in compiled[3]] == [edge.getID() for edge in edge_list]
+    network = load_compiled_network(NET_FILE)
+    assert [network.getEdge(edge.getID()).getSpeed() for edge in edge_list] == [edge.getSpeed() for edge in edge_list]
+    assert [network.getEdge(edge.getID()).getLaneNumber() for edge in edge_list] == \
+        [edge.getLaneNumber() for edge in edge_list]
+    compiled_network = compile_network(NET_FILE)
+    for vehicle_class in ["passenger", "bus", "pedestrian", "bicycle"]:
+        assert [compiled_network.getEdge(edge.getID()).allows(vehicle_class) for edge in net.getEdges()] == \
+            [edge.allows(vehicle_class) for edge in net.getEdges()]
+
+
+def test_shortest_path_reachability_matches_sumolib():
+    random.seed(4)
+    net = network_map_data_structures.getNetInfo(NET_FILE)
+    network = load_compiled_network(NET_FILE)
+    edges = network.getEdges()
+    for _ in range(200):
+        start, destination = random.sample(edges, 2)
+        path, cost = network.getShortestPath(start, destination)
+        expected, expected_cost = net.getShortestPath(net.getEdge(start.getID()), net.getEdge(destination.getID()))
+        assert (path is None) == (expected is None)
+        if path is not None:
+            assert path[0] is start and path[-1] is destination
+            assert abs(cost - sum(edge.getLength() for edge in path)) < 1e-6
+
+
+def test_network_file_keyed_by_net_hash():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        net_file = os.path.join(temp_dir, "simple_grid1.net.xml")
+        shutil.copy("./configurations/maps/simple_grid1.net.xml", net_file)
+        built = load_compiled_network(net_file)
+        assert os.path.exists(net_file + ".compiled")
+        loaded = load_compiled_network(net_file)
+        assert loaded.edge_ids == built.edge_ids and loaded.connection_to == built.connection_to
+
+        # a modified net file must not reuse the stored network
+        with open(net_file, 'a') as f:
+            f.write("<!-- modified -->\n")
+        load_compiled_network(net_file)
+        with open(net_file + ".compiled", 'rb') as f:
+            assert pickle.load(f)["net_hash"] == file_hash(net_file)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_collections_match_parsed_net()
+    test_shortest_path_reachability_matches_sumolib()
+    test_network_file_keyed_by_net_hash()
+    print("TEST PASSED")
@@ -0,0 +1,82 @@
+'''
+Tests for core/contraction_hierarchy.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME). Run from the main repository:
+    python -m pytest test/test_contraction_hierarchy.py
+The hierarchy must return the same costs as ShortestPathEngine for the edge lengths and, after
+customization, for congestion weights, and its direction lists must be valid for ConnectionInfo.
+'''
+import os
+import pickle
+import random
+import shutil
+import tempfile
+from core.Util import ConnectionInfo, file_hash
+from core.shortest_path_engine import ShortestPathEngine, RoutingGraph
+from core.contraction_hierarchy import ContractionHierarchy, load_contraction_hierarchy
+
+NET_FILE = "./configurations/maps/test.net.xml"
+
+
+def check_against_engine(graph, hierarchy, weights, sources):
+    engine = ShortestPathEngine(graph)
+    for source in sources:
+        for destination in range(graph.num_edges()):
+            cost, arcs = engine.search(source, destination, weights)
+            hierarchy_cost, hierarchy_arcs = hierarchy.search(source, destination)
+            assert (arcs is None) == (hierarchy_arcs is None)
+            if arcs is None:
+                continue
+            assert abs(cost - hierarchy_cost) < 1e-6
+            assert abs(graph.path_cost(hierarchy_arcs, weights) - cost) < 1e-6
+
+
+def test_queries_match_dijkstra():
+    random.seed(4)
+    graph = RoutingGraph(ConnectionInfo(NET_FILE))
+    hierarchy = ContractionHierarchy(graph)
+    sources = random.sample(range(graph.num_edges()), 20)
+    check_against_engine(graph, hierarchy, graph.edge_lengths, sources)
+
+    # congestion weights only need a new customization
+    weights = [length + random.randint(0, 5) / length for length in graph.edge_lengths]
+    hierarchy.customize(weights)
+    check_against_engine(graph, hierarchy, weights, sources)
+
+
+def test_route_gives_valid_directions():
+    connection_info = ConnectionInfo(NET_FILE)
+    hierarchy = ContractionHierarchy(RoutingGraph(connection_info))
+    source = connection_info.edge_list[0]
+    for destination in connection_info.edge_list:
+        edge = source
+        for direction in hierarchy.route(source, destination):
+            edge = connection_info.outgoing_edges_dict[edge][direction]
+        assert edge == destination or hierarchy.route(source, destination) == []
+
+
+def test_hierarchy_file_keyed_by_net_hash():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        net_file = os.path.join(temp_dir, "test.net.xml")
+        shutil.copy(NET_FILE, net_file)
+        graph = RoutingGraph(ConnectionInfo(net_file))
+        built = load_contraction_hierarchy(graph, net_file)
+        assert os.path.exists(net_file + ".ch")
+        loaded = load_contraction_hierarchy(graph, net_file)
+        assert loaded.rank == built.rank and loaded.arc_index == built.arc_index
+
+        # a modified net file must not reuse the stored hierarchy
+        with open(net_file, 'a') as f:
+            f.write("<!-- modified -->\n")
+        load_contraction_hierarchy(graph, net_file)
+        with open(net_file + ".ch", 'rb') as f:
+            assert pickle.load(f)["net_hash"] == file_hash(net_file)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_queries_match_dijkstra()
+    test_route_gives_valid_directions()
+    test_hierarchy_file_keyed_by_net_hash()
+    print("TEST PASSED")
@@ -0,0 +1,69 @@
+'''
+Tests for core/demand_generation.py and target_vehicles_generator.generate_vehicles.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME), not SUMO itself. Run from the main repository:
+    python -m pytest test/test_demand_generation.py
+'''
+import os
+import random
+import tempfile
+from core.Util import ConnectionInfo
+from core import demand_generation
+from core.target_vehicles_generation_protocols import target_vehicles_generator
+
+NET_FILE = "./configurations/maps/simple_grid2.net.xml"
+
+
+def is_connected(connection_info, edges):
+    return all(next_edge in connection_info.outgoing_edges_dict[edge].values()
+               for edge, next_edge in zip(edges, edges[1:]))
+
+
+def test_random_trips_are_routed_and_numbered_by_departure():
+    connection_info = ConnectionInfo(NET_FILE)
+    trips = list(demand_generation.random_trips(connection_info, 0.0, 50.0, 0.5, random.Random(1)))
+    assert demand_generation.trip_count(0.0, 50.0, 0.5) == 100
+    assert 0 < len(trips) <= 100
+    for vehicle_id, depart, depart_text, edges in trips:
+        assert depart == int(vehicle_id) * 0.5 and depart_text == "{:.2f}".format(depart)
+        assert len(edges) >= 2 and edges[0] != edges[-1]
+        assert is_connected(connection_info, edges)
+
+
+def test_merge_writes_depart_sorted_file():
+    background = [(str(i), i * 2.0, "{:.2f}".format(i * 2.0), ["a", "b"]) for i in range(5)]
+    controlled = [("5", 0, "0", ["c"]), ("6", 4.0, "4.0", ["d"]), ("7", 9.0, "9.0", ["e"])]
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "test.rou.xml")
+        count = demand_generation.write_route_file(route_file,
+                                                   demand_generation.merge_by_depart(iter(background), controlled))
+        assert count == 8
+        written = list(demand_generation.read_route_file(route_file))
+        assert demand_generation.last_vehicle_id(route_file) == "7"
+    # controlled vehicles come after the background vehicles departing at the same time
+    assert [vehicle[0] for vehicle in written] == ["0", "5", "1", "2", "6", "3", "4", "7"]
+    assert written[4] == ("6", 4.0, "4.0", ["d"])
+
+
+def test_generate_vehicles_keeps_ids_and_order():
+    random.seed(3)
+    net_file = os.path.abspath(NET_FILE)
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "str_sumo.rou.xml")
+        generator = target_vehicles_generator(net_file)
+        vehicles = generator.generate_vehicles(5, 40, 3, route_file, net_file)
+        written = list(demand_generation.read_route_file(route_file))
+    first_id = demand_generation.trip_count(0.0, 50.0, int(50.0 / 80 * 100) / 100.0)
+    assert [vehicle.vehicle_id for vehicle in vehicles] == [str(first_id + i) for i in range(5)]
+    departs = [vehicle[1] for vehicle in written]
+    assert departs == sorted(departs)
+    assert len(set(vehicle[0] for vehicle in written)) == len(written)
+    routes = {vehicle[0]: vehicle[3] for vehicle in written}
+    for vehicle in vehicles:
+        assert len(routes[vehicle.vehicle_id]) == 1
+
+
+if __name__ == "__main__":
+    test_random_trips_are_routed_and_numbered_by_departure()
+    test_merge_writes_depart_sorted_file()
+    test_generate_vehicles_keeps_ids_and_order()
+    print("TEST PASSED")
@@ -0,0 +1,51 @@
+'''
+Tests for core/dynamic_shortest_path.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME). Run from the main repository:
+    python -m pytest test/test_dynamic_shortest_path.py
+After every batch of weight changes the repaired trees must equal trees recomputed from scratch.
+'''
+import random
+from core.Util import ConnectionInfo
+from core.shortest_path_engine import ShortestPathEngine, RoutingGraph, INFINITY
+from core.dynamic_shortest_path import DynamicShortestPaths
+
+
+def test_repaired_trees_match_recomputed_trees():
+    random.seed(8)
+    graph = RoutingGraph(ConnectionInfo("./configurations/maps/test.net.xml"))
+    engine = ShortestPathEngine(graph)
+    dynamic_paths = DynamicShortestPaths(engine)
+    destinations = random.sample(range(graph.num_edges()), 3)
+    for destination in destinations:
+        dynamic_paths.get_tree(destination)
+
+    weights = list(graph.edge_lengths)
+    for step in range(50):
+        changed_edges = random.sample(range(graph.num_edges()), random.randint(0, 10))
+        for edge_index in changed_edges:
+            # congestion weights grow and shrink with the vehicle counts
+            weights[edge_index] = graph.edge_lengths[edge_index] + random.randint(0, 5) / graph.edge_lengths[edge_index]
+        dynamic_paths.set_weights(weights, changed_edges)
+        for destination in destinations:
+            expected = engine.reverse_tree(destination, weights)
+            for source in range(graph.num_edges()):
+                cost, arcs = dynamic_paths.search(source, destination)
+                if expected.distance[source] == INFINITY:
+                    assert arcs is None
+                else:
+                    assert abs(cost - expected.distance[source]) < 1e-6
+                    assert abs(graph.path_cost(arcs, weights) - cost) < 1e-6
+
+
+def test_unchanged_weights_need_no_repair():
+    graph = RoutingGraph(ConnectionInfo("./configurations/maps/simple_grid1.net.xml"))
+    dynamic_paths = DynamicShortestPaths(ShortestPathEngine(graph))
+    dynamic_paths.get_tree(0)
+    dynamic_paths.set_weights(list(graph.edge_lengths), [0, 1, 2])
+    assert dynamic_paths.repaired_count == 0
+
+
+if __name__ == "__main__":
+    test_repaired_trees_match_recomputed_trees()
+    test_unchanged_weights_need_no_repair()
+    print("TEST PASSED")
@@ -0,0 +1,36 @@
+'''
+Tests for the NumPy edge arrays of ConnectionInfo in core/Util.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME). Run from the main repository:
+    python -m pytest test/test_edge_arrays.py
+'''
+import numpy as np
+from core.Util import ConnectionInfo
+
+NET_FILE = "./configurations/maps/simple_grid1.net.xml"
+
+
+def test_counts_update_densities_and_dict_view():
+    connection_info = ConnectionInfo(NET_FILE)
+    edge_list = connection_info.edge_list
+    counts = np.arange(len(edge_list), dtype=np.int64) % 3
+    changed_edges = connection_info.set_edge_vehicle_counts(counts)
+    assert changed_edges == [edge for edge, count in zip(edge_list, counts) if count != 0]
+    for edge, count in zip(edge_list, counts):
+        assert connection_info.edge_vehicle_count[edge] == count
+        assert connection_info.edge_vehicle_count.get(edge) == count
+        index = connection_info.edge_index_dict[edge]
+        assert connection_info.edge_densities[index] == count / connection_info.edge_length_dict[edge]
+    assert connection_info.set_edge_vehicle_counts(counts) == []
+
+    # writing through the dict view keeps the density up to date
+    edge = edge_list[0]
+    connection_info.edge_vehicle_count[edge] = 7
+    index = connection_info.edge_index_dict[edge]
+    assert connection_info.edge_vehicle_counts[index] == 7
+    assert connection_info.edge_densities[index] == 7 / connection_info.edge_length_dict[edge]
+    assert dict(connection_info.edge_vehicle_count).keys() == connection_info.edge_index_dict.keys()
+
+
+if __name__ == "__main__":
+    test_counts_update_densities_and_dict_view()
+    print("TEST PASSED")
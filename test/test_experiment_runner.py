@@ -0,0 +1,35 @@
+'''
+Tests for core/experiment_runner.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME). Run from the main repository:
+    python -m pytest test/test_experiment_runner.py
+'''
+import csv
+import os
+import tempfile
+from core.experiment_runner import experiment_matrix, cell_name, run_experiments, RESULT_FIELDS
+
+
+def test_matrix_has_one_cell_per_combination():
+    cells = experiment_matrix(["./configurations/maps/test.net.xml", "./configurations/maps/simple_grid1.net.xml"],
+                              ["dijkstra", "random"], [(10, 50), (20, 100)], [1, 3], [1, 2, 3])
+    assert len(cells) == 2 * 2 * 2 * 2 * 3
+    assert len(set(cell_name(cell) for cell in cells)) == len(cells)
+
+
+def test_failed_cells_are_reported_in_the_table():
+    cells = experiment_matrix(["./configurations/maps/simple_grid1.net.xml"], ["no_such_policy"], [(1, 2)], [1], [1, 2])
+    with tempfile.TemporaryDirectory() as output_dir:
+        rows = run_experiments(cells, output_dir, workers=2)
+        assert all(row["error"] for row in rows)
+        with open(os.path.join(output_dir, "results.csv")) as f:
+            table = list(csv.DictReader(f))
+        assert len(table) == len(cells)
+        assert list(table[0].keys()) == RESULT_FIELDS
+        for cell in cells:
+            assert os.path.exists(os.path.join(output_dir, cell_name(cell), "error.log"))
+
+
+if __name__ == "__main__":
+    test_matrix_has_one_cell_per_combination()
+    test_failed_cells_are_reported_in_the_table()
+    print("TEST PASSED")
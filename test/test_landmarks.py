@@ -0,0 +1,61 @@
+'''
+Tests for core/landmarks.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME). Run from the main repository:
+    python -m pytest test/test_landmarks.py
+Both A* variants must return shortest paths for the edge lengths, for congestion weights
+(never below the lengths) and for travel-time weights (scaled bounds).
+'''
+import os
+import random
+import shutil
+import tempfile
+from core.Util import ConnectionInfo
+from core.shortest_path_engine import ShortestPathEngine, RoutingGraph
+from core.landmarks import LandmarkRouter, select_landmarks, load_landmark_router
+
+NET_FILE = "./configurations/maps/test.net.xml"
+
+
+def test_alt_matches_dijkstra():
+    random.seed(6)
+    graph = RoutingGraph(ConnectionInfo(NET_FILE))
+    engine = ShortestPathEngine(graph)
+    landmarks, from_landmark, to_landmark = select_landmarks(graph, 4)
+    assert len(set(landmarks)) == 4
+    congestion_weights = [length + random.randint(0, 5) / length for length in graph.edge_lengths]
+    travel_time_weights = [length / random.uniform(5.0, 15.0) for length in graph.edge_lengths]
+    # bound scale 0
+    zero_weights = [0.0 if i % 7 == 0 else length for i, length in enumerate(graph.edge_lengths)]
+    for bidirectional in (False, True):
+        router = LandmarkRouter(graph, landmarks, from_landmark, to_landmark, bidirectional)
+        for weights in (graph.edge_lengths, congestion_weights, travel_time_weights, zero_weights):
+            router.set_weights(weights)
+            for source in random.sample(range(graph.num_edges()), 10):
+                for destination in range(graph.num_edges()):
+                    cost, arcs = engine.search(source, destination, weights)
+                    alt_cost, alt_arcs = router.search(source, destination)
+                    assert (arcs is None) == (alt_arcs is None)
+                    if arcs is not None:
+                        assert abs(cost - alt_cost) < 1e-6
+                        assert abs(graph.path_cost(alt_arcs, weights) - cost) < 1e-6
+
+
+def test_landmark_file_is_reused():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        net_file = os.path.join(temp_dir, "test.net.xml")
+        shutil.copy(NET_FILE, net_file)
+        graph = RoutingGraph(ConnectionInfo(net_file))
+        built = load_landmark_router(graph, net_file, num_landmarks=4)
+        assert os.path.exists(net_file + ".landmarks.npz")
+        loaded = load_landmark_router(graph, net_file, num_landmarks=4)
+        assert loaded.landmarks == built.landmarks
+        assert (loaded.from_landmark == built.from_landmark).all()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_alt_matches_dijkstra()
+    test_landmark_file_is_reused()
+    print("TEST PASSED")
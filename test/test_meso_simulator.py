@@ -0,0 +1,282 @@
+'''
+Tests for core/meso_simulator.py.
+Needs the maps in configurations/maps and traci/sumolib (SUMO_HOME), not SUMO itself. Run from the main repository:
+    python -m pytest test/test_meso_simulator.py
+'''
+import os
+import random
+import tempfile
+import numpy as np
+import traci.constants as tc
+from core.Util import ConnectionInfo, Vehicle, FullRoute
+from core.shortest_path_engine import ShortestPathEngine, get_routing_graph
+from core.meso_simulator import MesoSimulation
+from core.simulation_backend import traci, using_backend, MESO
+from core.STR_SUMO import StrSumo
+from core.state_sync import EdgeOccupancy
+from controller.DijkstraController import DijkstraPolicy, TravelTimePolicy
+from controller.ParallelController import ParallelPolicy
+from controller.myAlgo import MikeGorithm
+from traci.exceptions import TraCIException
+
+NET_FILE = "./configurations/maps/simple_grid2.net.xml"
+
+
+def write_route_file(route_file, connection_info, num_uncontrolled, num_controlled, seed):
+    """
+    Writes random routes like randomTrips.py, and the controlled vehicles with their start edge as
+    route like target_vehicles_generator.generate_vehicles.
+    :return: {vehicle_id: Vehicle} of the controlled vehicles
+    """
+    rng = random.Random(seed)
+    graph = get_routing_graph(connection_info)
+    engine = ShortestPathEngine(graph)
+    edges = connection_info.edge_list
+    vehicles = {}
+    lines = []
+    while len(lines) < num_uncontrolled + num_controlled:
+        source, destination = rng.sample(edges, 2)
+        _, arcs = engine.search(graph.edge_index_dict[source], graph.edge_index_dict[destination])
+        if arcs is None:
+            continue
+        vehicle_id = str(len(lines))
+        depart = len(lines) * 50.0 / (num_uncontrolled + num_controlled)
+        if len(lines) % (num_uncontrolled // num_controlled + 1) == 0 and len(vehicles) < num_controlled:
+            route = [source]
+            vehicles[vehicle_id] = Vehicle(vehicle_id, destination, depart, 1000)
+        else:
+            route = graph.arcs_to_edges(graph.edge_index_dict[source], arcs)
+        lines.append('    <vehicle id="{}" depart="{:.2f}">\n        <route edges="{}"/>\n    </vehicle>\n'.format(
+            vehicle_id, depart, " ".join(route)))
+    with open(route_file, 'w') as f:
+        f.write("<routes>\n" + "".join(lines) + "</routes>\n")
+    return vehicles
+
+
+def test_all_vehicles_arrive_without_exceeding_capacity():
+    connection_info = ConnectionInfo(NET_FILE)
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "test.rou.xml")
+        write_route_file(route_file, connection_info, 200, 1, 1)
+        simulation = MesoSimulation(connection_info, [route_file])
+    assert simulation.simulation.getMinExpectedNumber() == 200 + 1
+    arrived = set()
+    while simulation.simulation.getMinExpectedNumber() > 0 and simulation.time < 5000:
+        simulation.step()
+        arrived.update(simulation.simulation.getArrivedIDList())
+        assert (simulation.counts <= simulation.capacities).all()
+        assert simulation.counts.sum() == simulation.vehicle.getIDCount()
+    assert len(arrived) == 200 + 1
+
+
+def test_change_target_routes_to_the_new_edge():
+    connection_info = ConnectionInfo(NET_FILE)
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "test.rou.xml")
+        vehicles = write_route_file(route_file, connection_info, 0, 1, 2)
+        simulation = MesoSimulation(connection_info, [route_file])
+    simulation.step()
+    vehicle_id, vehicle = next(iter(vehicles.items()))
+    assert simulation.simulation.getDepartedIDList() == (vehicle_id,)
+    simulation.vehicle.changeTarget(vehicle_id, vehicle.destination)
+    route = simulation.vehicle.getRoute(vehicle_id)
+    assert route[0] == simulation.vehicle.getRoadID(vehicle_id) and route[-1] == vehicle.destination
+    while vehicle_id not in simulation.simulation.getArrivedIDList():
+        simulation.step()
+        if vehicle_id in simulation.slots:
+            assert simulation.vehicle.getRoadID(vehicle_id) in route
+
+
+def test_set_route_follows_the_given_edges():
+    connection_info = ConnectionInfo(NET_FILE)
+    with tempfile.TemporaryDirectory() as directory:
+        route_file = os.path.join(directory, "test.rou.xml")
+        vehicles = write_route_file(route_file, connection_info, 0, 1, 4)
+        simulation = MesoSimulation(connection_info, [route_file])
+    simulation.step()
+    vehicle_id, vehicle = next(iter(vehicles.items()))
+    graph = get_routing_graph(connection_info)
+    start = graph.edge_index_dict[simulation.vehicle.getRoadID(vehicle_id)]
+    _, arcs = ShortestPathEngine(graph).search(start, graph.edge_index_dict[vehicle.destination])
+    route = graph.arcs_to_edges(start, arcs)
+    for invalid_route in [route[1:], route[:1] + route[2:], route + ["unknown"]]:
+        if len(invalid_route) > 1:
+            try:
+                simulation.vehicle.setRoute(vehicle_id, invalid_route)
+                assert False, invalid_route
+            except TraCIException:
+                pass
+    simulation.vehicle.setRoute(vehicle_id, route)
+    assert list(simulation.vehicle.getRoute(vehicle_id)) == route
+    visited = []
+    while vehicle_id not in simulation.simulation.getArrivedIDList():
+        if vehicle_id in simulation.slots and simulation.vehicle.getRoadID(vehicle_id) not in visited:
+            visited.append(simulation.vehicle.getRoadID(vehicle_id))
+        simulation.step()
+    assert visited == route
+
+
+def run_str_sumo(use_subscriptions, directory, route_controller=None, **kwargs):
+    """
+    :return: ((total time, arrived, deadlines missed), controlled vehicles, StrSumo)
+    """
+    connection_info = ConnectionInfo(NET_FILE)
+    route_file = os.path.join(directory, "str_sumo.rou.xml")
+    vehicles = write_route_file(route_file, connection_info, 60, 10, 3)
+    if route_controller is None:
+        route_controller = DijkstraPolicy(connection_info)
+    else:
+        route_controller = route_controller(connection_info)
+    simulation = StrSumo(route_controller, connection_info, vehicles, use_subscriptions,
+                         summary_file=os.path.join(directory, "data.csv"), verbose=False, **kwargs)
+    traci.start(["sumo", "-n", NET_FILE, "-r", route_file, "--no-step-log", "true"])
+    try:
+        return simulation.run(), vehicles, simulation
+    finally:
+        traci.close()
+
+
+def test_str_sumo_runs_on_the_meso_backend():
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        subscribed, vehicles, _ = run_str_sumo(True, directory)
+        polled, _, _ = run_str_sumo(False, directory)
+    assert subscribed == polled
+    total_time, end_number, deadlines_missed = subscribed
+    assert end_number == len(vehicles)
+    assert all(vehicle.local_destination == vehicle.destination for vehicle in vehicles.values())
+
+
+def test_full_routes_cut_decisions():
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        local, _, local_run = run_str_sumo(True, directory)
+        full, vehicles, full_run = run_str_sumo(
+            True, directory, lambda connection_info: DijkstraPolicy(connection_info, full_route=True))
+        replanned, _, replanned_run = run_str_sumo(
+            True, directory, lambda connection_info: DijkstraPolicy(connection_info, full_route=True),
+            replan_interval=20)
+    assert full[1] == len(vehicles) and replanned[1] == len(vehicles)
+    assert all(vehicle.local_destination == vehicle.destination for vehicle in vehicles.values())
+    # one decision per vehicle without replans
+    assert full_run.num_decisions == full_run.num_route_writes == len(vehicles)
+    assert local_run.num_decisions > 2 * full_run.num_decisions
+    assert full_run.num_decisions < replanned_run.num_decisions < local_run.num_decisions
+
+
+def test_follows_route_until_replan():
+    connection_info = ConnectionInfo(NET_FILE)
+    simulation = StrSumo(DijkstraPolicy(connection_info), connection_info, {}, summary_file=os.devnull,
+                         verbose=False, replan_interval=10)
+    vehicle = Vehicle("v", "c", 0, 100)
+    requests = simulation.route_controller.replan_requests
+    vehicle.current_edge = "a"
+    assert not simulation.follows_route(vehicle, 0, requests)
+    vehicle.route, vehicle.route_step = ["a", "b", "c"], 0
+    vehicle.current_edge = "b"
+    assert simulation.follows_route(vehicle, 5, requests) and vehicle.route_position == 1
+    simulation.route_controller.request_replan("v")
+    assert not simulation.follows_route(vehicle, 5, requests)
+    requests.clear()
+    vehicle.current_edge = "x"
+    assert not simulation.follows_route(vehicle, 5, requests)
+    vehicle.current_edge = "c"
+    assert not simulation.follows_route(vehicle, 10, requests)
+
+
+def test_pipelined_decisions():
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        serial, vehicles, serial_run = run_str_sumo(True, directory)
+        pipelined, _, pipelined_run = run_str_sumo(True, directory, pipeline_lag=1)
+        full, full_vehicles, full_run = run_str_sumo(
+            True, directory, lambda connection_info: DijkstraPolicy(connection_info, full_route=True),
+            pipeline_lag=2)
+    assert pipelined[1] == full[1] == len(vehicles)
+    assert serial_run.num_stale_decisions == 0
+    # every decision is either applied or dropped as stale
+    assert pipelined_run.num_route_writes + pipelined_run.num_stale_decisions == pipelined_run.num_decisions
+    assert full_run.num_route_writes + full_run.num_stale_decisions == full_run.num_decisions
+    assert abs(pipelined[0] - serial[0]) <= 0.2 * serial[0]
+    connection_info = ConnectionInfo(NET_FILE)
+    try:
+        # the worker thread would poll traci alongside the simulation step
+        StrSumo(DijkstraPolicy(connection_info), connection_info, {}, use_subscriptions=False,
+                summary_file=os.devnull, verbose=False, pipeline_lag=1)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_pipelined_weights_follow_every_step():
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        runs = [run_str_sumo(True, directory, MikeGorithm, pipeline_lag=lag)[2] for lag in [0, 1]]
+    # the uncontrolled vehicles still move after the last controlled one arrived, in steps without a decision
+    for run in runs:
+        connection_info = run.connection_info
+        assert np.allclose(run.route_controller.weights, connection_info.edge_lengths + connection_info.edge_densities)
+
+
+def test_parallel_policy_runs_like_the_serial_one():
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        serial, _, _ = run_str_sumo(True, directory)
+        parallel, _, parallel_run = run_str_sumo(
+            True, directory, lambda connection_info: ParallelPolicy(connection_info, DijkstraPolicy, num_workers=2))
+        parallel_run.route_controller.close()
+    assert parallel == serial
+
+
+def test_local_edge_counts_match_sumo():
+    occupancy = EdgeOccupancy(["a", "b"])
+    occupancy.update({"1": {tc.VAR_ROAD_ID: "a"}, "2": {tc.VAR_ROAD_ID: "a"}, "3": {tc.VAR_ROAD_ID: ":junction"}}, [])
+    occupancy.update({"1": {tc.VAR_ROAD_ID: "b"}, "3": {tc.VAR_ROAD_ID: "b"}}, ["2"])
+    assert occupancy.counts == [0, 2]
+    assert occupancy.reconcile(np.array([1, 1])) == 2 and occupancy.counts == [1, 1]
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        polled, _, _ = run_str_sumo(True, directory, MikeGorithm)
+        local, _, local_run = run_str_sumo(True, directory, MikeGorithm, local_edge_counts=True,
+                                           reconcile_interval=1)
+        _, _, dijkstra_run = run_str_sumo(True, directory)
+    assert local == polled
+    assert local_run.num_reconciliations > 0 and local_run.edge_count_drift == 0
+    # DijkstraPolicy does not use the counts, no edge is subscribed to
+    assert not dijkstra_run.uses_edge_counts and dijkstra_run.state.edge_list == []
+
+
+def test_travel_time_policy_reads_the_edge_speeds():
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        subscribed, vehicles, run = run_str_sumo(True, directory, TravelTimePolicy)
+        polled, _, _ = run_str_sumo(False, directory, TravelTimePolicy)
+    assert subscribed == polled
+    assert subscribed[1] == len(vehicles)
+    assert all(vehicle.local_destination == vehicle.destination for vehicle in vehicles.values())
+    model = run.travel_time_model
+    assert model is not None and run.state.edge_list == run.connection_info.edge_list
+    # the arrays of the last step, passed on as they are
+    mean_speeds, occupancies = run.state.edge_speed_arrays()
+    assert model.mean_speeds is mean_speeds and model.occupancies is occupancies
+    assert len(mean_speeds) == len(run.connection_info.edge_list)
+    # the queues of the run are still in the moving average
+    assert not np.allclose(model.travel_times, model.free_flow_times)
+    assert (model.travel_times >= model.free_flow_times - 1e-9).all()
+
+
+def test_plans_dropped_after_arrival():
+    with using_backend(MESO), tempfile.TemporaryDirectory() as directory:
+        result, vehicles, run = run_str_sumo(True, directory)
+    controller = run.route_controller
+    assert result[1] == len(vehicles) and controller.plan_misses > 0
+    assert controller.plans == {} and controller.replan_requests == set()
+
+
+if __name__ == "__main__":
+    test_all_vehicles_arrive_without_exceeding_capacity()
+    test_change_target_routes_to_the_new_edge()
+    test_set_route_follows_the_given_edges()
+    test_str_sumo_runs_on_the_meso_backend()
+    test_full_routes_cut_decisions()
+    test_follows_route_until_replan()
+    test_pipelined_decisions()
+    test_pipelined_weights_follow_every_step()
+    test_parallel_policy_runs_like_the_serial_one()
+    test_local_edge_counts_match_sumo()
+    test_travel_time_policy_reads_the_edge_speeds()
+    test_plans_dropped_after_arrival()
+    print("TEST PASSED")
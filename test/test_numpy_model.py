@@ -0,0 +1,86 @@
+'''
+Tests for core/numpy_model.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME); the comparison with Keras is skipped
+when keras is not installed. Run from the main repository:
+    python -m pytest test/test_numpy_model.py
+test/rl-high-all-fixed-late.npz is test/rl-high-all-fixed-late.h5 exported with
+    python -m core.numpy_model test/rl-high-all-fixed-late.h5 test/rl-high-all-fixed-late.npz
+'''
+import os
+import random
+import tempfile
+import numpy as np
+import pytest
+from core.Util import ConnectionInfo, Vehicle
+from core.numpy_model import NumpyModel, DENSE, ACTIVATION, save_numpy_model, load_numpy_model, export_keras_model
+from controller.QLearningController import QLearningPolicy
+
+KERAS_MODEL = "./test/rl-high-all-fixed-late.h5"
+NUMPY_MODEL = "./test/rl-high-all-fixed-late.npz"
+
+
+def random_states(count, seed=0):
+    rng = np.random.RandomState(seed)
+    states = rng.rand(count, 154) * 0.2
+    states[:, 0] = rng.randint(0, 708, count)
+    states[:, 1:7] = rng.randint(0, 2, (count, 6))
+    return states
+
+
+def keras_predict(model, states):
+    # legacy .h5 files load with an extra time axis in Keras 3
+    if len(model.input_shape) == 3:
+        return model.predict(states[:, None, :], verbose=0)[:, 0, :]
+    return model.predict(states, verbose=0)
+
+
+def test_outputs_match_keras():
+    load_model = pytest.importorskip("keras.models").load_model
+    states = random_states(256)
+    expected = keras_predict(load_model(KERAS_MODEL, compile=False), states)
+    scale = np.max(np.abs(expected))
+    with tempfile.TemporaryDirectory() as directory:
+        for precision, tolerance in [("float32", 1e-5), ("float16", 1e-3), ("int8", 2e-2)]:
+            weights_file = os.path.join(directory, precision + ".npz")
+            export_keras_model(KERAS_MODEL, weights_file, precision)
+            outputs = load_numpy_model(weights_file).predict(states)
+            assert np.max(np.abs(outputs - expected)) <= tolerance * scale
+    assert np.max(np.abs(load_numpy_model(NUMPY_MODEL).predict(states) - expected)) <= 1e-5 * scale
+
+
+def test_reduced_precisions_stay_close():
+    rng = np.random.RandomState(1)
+    layers = [(DENSE, rng.randn(20, 32) * 0.3, rng.randn(32) * 0.1, "relu", 0.0),
+              (DENSE, rng.randn(32, 32) * 0.3, rng.randn(32) * 0.1, "linear", 0.0),
+              (ACTIVATION, None, None, "leaky_relu", 0.05),
+              (DENSE, rng.randn(32, 6) * 0.3, rng.randn(6) * 0.1, "sigmoid", 0.0)]
+    states = rng.rand(50, 20)
+    expected = NumpyModel(layers).predict(states)
+    with tempfile.TemporaryDirectory() as directory:
+        for precision, tolerance in [("float32", 1e-6), ("float16", 1e-2), ("int8", 5e-2)]:
+            weights_file = os.path.join(directory, precision + ".npz")
+            save_numpy_model(layers, weights_file, precision)
+            assert np.max(np.abs(load_numpy_model(weights_file).predict(states) - expected)) <= tolerance
+
+
+def test_batched_decisions_match_sequential():
+    random.seed(3)
+    connection_info = ConnectionInfo("./configurations/maps/test.net.xml")
+    counts = np.random.RandomState(2).randint(0, 6, len(connection_info.edge_list))
+    connection_info.set_edge_vehicle_counts(counts)
+    vehicles = []
+    for i in range(30):
+        vehicle = Vehicle(str(i), random.choice(connection_info.edge_list), 0, 600)
+        vehicle.current_edge = random.choice(connection_info.edge_list)
+        vehicles.append(vehicle)
+    sequential = QLearningPolicy(connection_info, NUMPY_MODEL, batched=False)
+    batched = QLearningPolicy(connection_info, NUMPY_MODEL, batched=True)
+    assert batched.make_decisions(vehicles, connection_info) == sequential.make_decisions(vehicles, connection_info)
+    assert batched.model_calls < sequential.model_calls
+
+
+if __name__ == "__main__":
+    test_outputs_match_keras()
+    test_reduced_precisions_stay_close()
+    test_batched_decisions_match_sequential()
+    print("TEST PASSED")
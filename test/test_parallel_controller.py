@@ -0,0 +1,96 @@
+'''
+Tests for ParallelPolicy in controller/ParallelController.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME), not SUMO itself. Run from the main repository:
+    python -m pytest test/test_parallel_controller.py
+'''
+import random
+import numpy as np
+from core.Util import ConnectionInfo, Vehicle, FullRoute
+from core.reachability import PairSampler, get_reachability_index
+from controller.DijkstraController import DijkstraPolicy
+from controller.myAlgo import MikeGorithm
+from controller.ParallelController import ParallelPolicy
+
+NET_FILE = "./configurations/maps/test.net.xml"
+
+
+class State:
+    """
+    The values of the current step the controllers read, see core/state_sync.py.
+    """
+    def __init__(self, vehicles):
+        self.time = 3.0
+        self.vehicle_ids = [vehicle.vehicle_id for vehicle in vehicles]
+
+    def max_speed(self, vehicle_id):
+        return 10.0 + int(vehicle_id) % 5
+
+
+def random_vehicles(connection_info, count):
+    rng = random.Random(0)
+    sampler = PairSampler(get_reachability_index(connection_info.compiled_network), connection_info.edge_list,
+                          connection_info.edge_list, distinct=True)
+    vehicles = []
+    for i in range(count):
+        source, destination = sampler.sample(rng)
+        vehicle = Vehicle(str(i), destination, 0.0, float(rng.randint(100, 1000)))
+        vehicle.current_edge = source
+        vehicle.current_speed = rng.uniform(0.0, 15.0)
+        vehicles.append(vehicle)
+    return vehicles
+
+
+def decide_both(policy_class, **policy_kwargs):
+    """
+    :return: [(serial decisions, parallel decisions)] of two steps with different vehicle counts
+    """
+    connection_info = ConnectionInfo(NET_FILE)
+    vehicles = random_vehicles(connection_info, 40)
+    connection_info.state_sync = State(vehicles)
+    serial = policy_class(connection_info, **policy_kwargs)
+    parallel = ParallelPolicy(connection_info, policy_class, num_workers=3, **policy_kwargs)
+    rng = np.random.RandomState(0)
+    steps = []
+    try:
+        for _ in range(2):
+            connection_info.set_edge_vehicle_counts(rng.poisson(20.0, len(connection_info.edge_list)))
+            steps.append((serial.make_decisions(vehicles, connection_info),
+                          parallel.make_decisions(vehicles, connection_info)))
+    finally:
+        parallel.close()
+    return steps
+
+
+def test_parallel_decisions_match_serial():
+    for serial, parallel in decide_both(MikeGorithm) + decide_both(DijkstraPolicy):
+        assert len(serial) == 40
+        assert serial == parallel
+
+
+def test_full_routes_and_split():
+    as_edges = lambda decisions: {vehicle_id: decision.edges if isinstance(decision, FullRoute) else decision
+                                  for vehicle_id, decision in decisions.items()}
+    for serial, parallel in decide_both(DijkstraPolicy, full_route=True):
+        assert any(isinstance(decision, FullRoute) for decision in parallel.values())
+        assert as_edges(serial) == as_edges(parallel)
+    connection_info = ConnectionInfo(NET_FILE)
+    policy = ParallelPolicy(connection_info, DijkstraPolicy, num_workers=3)
+    try:
+        assert policy.make_decisions([], connection_info) == {}
+        # forgotten vehicles go to their worker with the next batch, also an empty one
+        connection_info.state_sync = State([])
+        policy.request_replan("7")
+        policy.forget("7")
+        assert policy.replan_requests == set() and policy.forgotten[policy.worker_of("7")] == ["7"]
+        assert policy.make_decisions([], connection_info) == {}
+        assert not any(policy.forgotten)
+        shares = {policy.worker_of(str(i)) for i in range(40)}
+        assert shares == {0, 1, 2}
+    finally:
+        policy.close()
+
+
+if __name__ == "__main__":
+    test_parallel_decisions_match_serial()
+    test_full_routes_and_split()
+    print("TEST PASSED")
@@ -0,0 +1,93 @@
+'''
+Tests for the route plan cache of RouteController (plan_path) in DijkstraPolicy and MikeGorithm.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME), not SUMO itself. Run from the main repository:
+    python -m pytest test/test_plan_cache.py
+'''
+import numpy as np
+from core.Util import ConnectionInfo, Vehicle
+from core.shortest_path_engine import ShortestPathEngine, get_routing_graph, INFINITY
+from controller.DijkstraController import DijkstraPolicy
+from controller.myAlgo import MikeGorithm
+
+NET_FILE = "./configurations/maps/test.net.xml"
+
+
+class State:
+    """
+    The values of the current step the controllers read, see core/state_sync.py.
+    """
+    def __init__(self, vehicles):
+        self.time = 0.0
+        self.vehicle_ids = [vehicle.vehicle_id for vehicle in vehicles]
+
+    def max_speed(self, vehicle_id):
+        return 15.0
+
+
+def long_trip(connection_info):
+    """
+    :return: Vehicle on the first edge of a shortest path with at least 4 edges, and the path [edge_id]
+    """
+    graph = get_routing_graph(connection_info)
+    engine = ShortestPathEngine(graph)
+    for source in connection_info.edge_list:
+        for destination in connection_info.edge_list:
+            cost, arcs = engine.search(graph.edge_index_dict[source], graph.edge_index_dict[destination])
+            if cost != INFINITY and len(arcs) >= 3:
+                vehicle = Vehicle("v", destination, 0.0, 500.0)
+                vehicle.current_edge = source
+                return vehicle, graph.arcs_to_edges(graph.edge_index_dict[source], arcs)
+
+
+def test_dijkstra_reuses_the_plan_along_the_path():
+    connection_info = ConnectionInfo(NET_FILE)
+    vehicle, path = long_trip(connection_info)
+    connection_info.state_sync = State([vehicle])
+    cached = DijkstraPolicy(connection_info)
+    uncached = DijkstraPolicy(connection_info, plan_cache=False)
+    for edge in path[:-1]:
+        vehicle.current_edge = edge
+        assert cached.make_decisions([vehicle], connection_info) == uncached.make_decisions([vehicle], connection_info)
+    assert (cached.plan_misses, cached.plan_hits) == (1, len(path) - 2)
+    assert cached.updatedMean == uncached.updatedMean
+    assert (uncached.plan_misses, uncached.plan_hits) == (0, 0)
+    # leaving the path or changing the destination plans again
+    vehicle.current_edge = next(edge for edge in connection_info.edge_list if edge not in path)
+    cached.make_decisions([vehicle], connection_info)
+    assert cached.plan_misses == 2
+    vehicle.current_edge = path[0]
+    cached.make_decisions([vehicle], connection_info)
+    vehicle.destination = path[-2]
+    vehicle.current_edge = path[1]
+    cached.make_decisions([vehicle], connection_info)
+    assert cached.plan_misses == 4
+
+
+def test_congestion_drift_invalidates_the_plan():
+    connection_info = ConnectionInfo(NET_FILE)
+    vehicle, path = long_trip(connection_info)
+    connection_info.state_sync = State([vehicle])
+    counts = np.zeros(len(connection_info.edge_list), dtype=np.int64)
+    connection_info.set_edge_vehicle_counts(counts)
+    controller = MikeGorithm(connection_info)
+    controller.make_decisions([vehicle], connection_info)
+    # a small change on the path keeps the plan
+    counts = counts.copy()
+    counts[connection_info.edge_list.index(path[-1])] = 1
+    connection_info.set_edge_vehicle_counts(counts)
+    vehicle.current_edge = path[1]
+    controller.make_decisions([vehicle], connection_info)
+    assert (controller.plan_misses, controller.plan_hits) == (1, 1)
+    # a jam on the rest of the path plans again
+    counts = counts.copy()
+    counts[connection_info.edge_list.index(path[-1])] = int(connection_info.edge_length_dict[path[-1]])
+    connection_info.set_edge_vehicle_counts(counts)
+    vehicle.current_edge = path[2]
+    controller.make_decisions([vehicle], connection_info)
+    assert (controller.plan_misses, controller.plan_hits) == (2, 1)
+
+
+if __name__ == "__main__":
+    test_dijkstra_reuses_the_plan_along_the_path()
+    test_congestion_drift_invalidates_the_plan()
+    print("TEST PASSED")
@@ -0,0 +1,49 @@
+'''
+Tests for core/profiling.py. Run from the main repository:
+    python -m pytest test/test_profiling.py
+'''
+import json
+import math
+import os
+import random
+import tempfile
+from core.profiling import Histogram, StepProfiler, PHASES
+
+
+def test_histogram_percentiles_within_bucket_precision():
+    random.seed(5)
+    values = [random.randint(0, 10 ** 7) for _ in range(5000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    assert histogram.count == len(values) and histogram.min == values[0] and histogram.max == values[-1]
+    for percent in [50, 90, 99, 99.9]:
+        exact = values[max(0, math.ceil(len(values) * percent / 100) - 1)]
+        assert exact <= histogram.percentile(percent) <= exact * (1 + 1 / 2 ** 6) + 1
+    assert sum(count for low, high, count in histogram.buckets()) == len(values)
+
+
+def test_profiler_report_and_cprofile_window():
+    with tempfile.TemporaryDirectory() as directory:
+        profiler = StepProfiler(profile_steps=(2, 3), profile_file=os.path.join(directory, "run.prof"),
+                                report_file=os.path.join(directory, "report.json"))
+        for step in range(6):
+            profiler.start_step(step)
+            for phase in PHASES:
+                profiler.end_phase(phase)
+                if phase == "make_decisions":
+                    profiler.record_decisions("DijkstraPolicy", step)
+        profiler.finish()
+        assert os.path.exists(os.path.join(directory, "run.prof"))
+        with open(os.path.join(directory, "report.json")) as f:
+            report = json.load(f)
+        assert all(report["phases"][phase]["count"] == 6 for phase in PHASES)
+        # step 0 decided no vehicle
+        assert report["decision_latency_per_vehicle"]["DijkstraPolicy"]["count"] == 5
+
+
+if __name__ == "__main__":
+    test_histogram_percentiles_within_bucket_precision()
+    test_profiler_report_and_cprofile_window()
+    print("TEST PASSED")
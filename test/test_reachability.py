@@ -0,0 +1,98 @@
+'''
+Tests for core/reachability.py and its use by target_vehicles_generator.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME), not SUMO itself. Run from the main repository:
+    python -m pytest test/test_reachability.py
+'''
+import collections
+import os
+import random
+import tempfile
+from core.compiled_network import load_compiled_network
+from core.reachability import ReachabilityIndex, PairSampler, get_reachability_index, strongly_connected_components
+from core.target_vehicles_generation_protocols import target_vehicles_generator
+
+NET_FILE = "./configurations/maps/test.net.xml"
+
+
+def brute_force_reachable(successors, source):
+    seen = {source}
+    stack = [source]
+    while stack:
+        for successor in successors[stack.pop()]:
+            if successor not in seen:
+                seen.add(successor)
+                stack.append(successor)
+    return seen
+
+
+def test_components_on_small_graph():
+    # 0 <-> 1 -> 2 -> 3 -> 2, 4 alone, 5 -> 0
+    successors = [[1], [0, 2], [3], [2], [], [0]]
+    component, num_components = strongly_connected_components(successors)
+    assert num_components == 4
+    assert component[0] == component[1] and component[2] == component[3]
+    assert len({component[0], component[2], component[4], component[5]}) == 4
+    # reverse topological order
+    for node, node_successors in enumerate(successors):
+        assert all(component[successor] <= component[node] for successor in node_successors)
+    index = ReachabilityIndex(successors, [str(i) for i in range(6)])
+    for source in range(6):
+        reachable = brute_force_reachable(successors, source)
+        for destination in range(6):
+            assert index.reachable(str(source), str(destination)) == (destination in reachable)
+
+
+def test_matches_shortest_paths():
+    network = load_compiled_network(NET_FILE)
+    index = get_reachability_index(network)
+    assert get_reachability_index(network) is index
+    rng = random.Random(0)
+    edges = network.getEdges()
+    for _ in range(300):
+        start, destination = rng.choice(edges), rng.choice(edges)
+        assert index.reachable(start, destination) == (network.getShortestPath(start, destination)[0] is not None)
+    for source in rng.sample(range(len(edges)), 20):
+        reachable = brute_force_reachable(network.outgoing, source)
+        assert all(index.reachable(edges[source], edge) == (edge.index in reachable) for edge in edges)
+
+
+def test_sampler_is_uniform_over_reachable_pairs():
+    # one-way chain 0 -> 1 -> 2 -> 3: 6 distinct pairs out of 12
+    successors = [[1], [2], [3], []]
+    ids = ["a", "b", "c", "d"]
+    index = ReachabilityIndex(successors, ids)
+    sampler = PairSampler(index, ids, ids, distinct=True)
+    assert sampler.num_pairs() == 6
+    rng = random.Random(1)
+    counts = collections.Counter(sampler.sample(rng) for _ in range(6000))
+    assert set(counts) == {("a", "b"), ("a", "c"), ("a", "d"), ("b", "c"), ("b", "d"), ("c", "d")}
+    assert all(800 < count < 1200 for count in counts.values())
+    assert PairSampler(index, ids, ids).num_pairs() == 10
+    assert PairSampler(index, ["d"], ["a", "b"]).num_pairs() == 0
+    # repeated candidates count as often as they appear
+    assert PairSampler(index, ["a", "a"], ["b", "b", "a"], distinct=True).num_pairs() == 4
+
+
+def test_generator_draws_only_reachable_pairs():
+    random.seed(5)
+    net_file = os.path.abspath(NET_FILE)
+    generator = target_vehicles_generator(net_file)
+    index = get_reachability_index(generator.net)
+    with tempfile.TemporaryDirectory() as directory:
+        target_file = os.path.join(directory, "test.rou.xml")
+        for pattern in [None, (generator.edge_list[:50], generator.edge_list[-50:])]:
+            vehicles = generator.generate_target_vehicles(100, target_file, pattern)[
+                target_vehicles_generator.VEHICLES_INFO]
+            assert len(vehicles) == 100
+            assert all(index.reachable(start, destination) for _, (start, destination), _ in vehicles)
+        for pattern in [1, 2, 3]:
+            vehicles = generator.generate_vehicles(10, 10, pattern, target_file, net_file)
+            assert len(vehicles) == 10
+
+
+if __name__ == "__main__":
+    test_components_on_small_graph()
+    test_matches_shortest_paths()
+    test_sampler_is_uniform_over_reachable_pairs()
+    test_generator_draws_only_reachable_pairs()
+    print("TEST PASSED")
@@ -0,0 +1,65 @@
+'''
+Tests for core/result_sinks.py. The parquet sink test is skipped when pyarrow is not installed.
+Run from the main repository:
+    python -m pytest test/test_result_sinks.py
+'''
+import csv
+import json
+import os
+import tempfile
+import pytest
+from core.result_sinks import make_trip_sink, TRIP_FIELDS
+
+
+def trip_record(i):
+    return {"vehicle_id": str(i), "start_time": float(i), "arrival_time": float(i + 100), "time_span": 100.0,
+            "deadline": 600, "deadline_missed": i % 2 == 0, "reached_destination": True}
+
+
+def read_records(file_name):
+    with open(file_name) as f:
+        if file_name.endswith(".csv"):
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_flushed_periodically():
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in [".csv", ".jsonl"]:
+            file_name = os.path.join(directory, "trips" + extension)
+            sink = make_trip_sink(file_name, flush_every=10, flush_seconds=3600)
+            for i in range(25):
+                sink.write(trip_record(i))
+            # the first 20 records are visible before the sink is closed
+            assert len(read_records(file_name)) == 20
+            sink.close()
+            records = read_records(file_name)
+            assert len(records) == 25 and list(records[0].keys()) == TRIP_FIELDS
+            assert records[24]["vehicle_id"] == "24"
+
+
+def test_parquet_records():
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "trips.parquet")
+        with make_trip_sink(file_name, flush_every=10) as sink:
+            for i in range(25):
+                sink.write(trip_record(i))
+        table = pyarrow_parquet.read_table(file_name)
+        assert table.num_rows == 25 and table.column_names == TRIP_FIELDS
+
+
+def test_unknown_format_is_rejected():
+    try:
+        make_trip_sink("trips.txt")
+    except ValueError:
+        pass
+    else:
+        assert False, "expected ValueError"
+
+
+if __name__ == "__main__":
+    test_records_are_flushed_periodically()
+    test_parquet_records()
+    test_unknown_format_is_rejected()
+    print("TEST PASSED")
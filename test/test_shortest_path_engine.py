@@ -0,0 +1,112 @@
+'''
+Tests for core/shortest_path_engine.py.
+Needs the maps in configurations/maps and sumolib (SUMO_HOME). Run from the main repository:
+    python -m pytest test/test_shortest_path_engine.py
+The engine is compared against a plain dictionary based Dijkstra over ConnectionInfo, which is
+how DijkstraPolicy computed its paths before the engine existed.
+'''
+import heapq
+import random
+from core.Util import ConnectionInfo
+from core.shortest_path_engine import ShortestPathEngine, ShortestPathTreeCache, RoutingGraph, INFINITY
+
+MAPS = ["./configurations/maps/simple_grid1.net.xml", "./configurations/maps/complex_grid1.net.xml",
+        "./configurations/maps/test.net.xml"]
+
+
+def reference_distances(connection_info, source):
+    distances = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        distance, edge = heapq.heappop(heap)
+        if distance > distances[edge]:
+            continue
+        for outgoing_edge in connection_info.outgoing_edges_dict[edge].values():
+            new_distance = distance + connection_info.edge_length_dict[outgoing_edge]
+            if new_distance < distances.get(outgoing_edge, INFINITY):
+                distances[outgoing_edge] = new_distance
+                heapq.heappush(heap, (new_distance, outgoing_edge))
+    return distances
+
+
+def follow(connection_info, start_edge, decision_list):
+    edge = start_edge
+    length = 0.0
+    for direction in decision_list:
+        edge = connection_info.outgoing_edges_dict[edge][direction]
+        length += connection_info.edge_length_dict[edge]
+    return edge, length
+
+
+def test_routes_match_reference():
+    random.seed(1)
+    for net_file in MAPS:
+        connection_info = ConnectionInfo(net_file)
+        engine = ShortestPathEngine(RoutingGraph(connection_info))
+        for source in random.sample(connection_info.edge_list, 10):
+            distances = reference_distances(connection_info, source)
+            for destination in connection_info.edge_list:
+                decision_list = engine.route(source, destination)
+                if destination not in distances:
+                    assert decision_list == []
+                    continue
+                end_edge, length = follow(connection_info, source, decision_list)
+                assert end_edge == destination
+                assert abs(length - distances[destination]) < 1e-6
+
+
+def test_turn_table_matches_outgoing_edges():
+    connection_info = ConnectionInfo(MAPS[0])
+    graph = RoutingGraph(connection_info)
+    for edge, turns in connection_info.outgoing_edges_dict.items():
+        row = graph.turn_table[graph.edge_index_dict[edge]]
+        for column, direction in enumerate(["s", "t", "R", "r", "L", "l"]):
+            if direction in turns:
+                assert graph.edge_ids[row[column]] == turns[direction]
+            else:
+                assert row[column] == -1
+
+
+def test_reverse_tree_matches_forward_search():
+    random.seed(2)
+    connection_info = ConnectionInfo(MAPS[2])
+    graph = RoutingGraph(connection_info)
+    engine = ShortestPathEngine(graph)
+    weights = [length + random.random() for length in graph.edge_lengths]
+    for destination in random.sample(range(graph.num_edges()), 5):
+        tree = engine.reverse_tree(destination, weights)
+        for source in range(graph.num_edges()):
+            cost, arcs = engine.search(source, destination, weights)
+            assert (arcs is None) == (tree.arcs_from(source) is None)
+            if arcs is not None:
+                assert abs(tree.distance[source] - cost) < 1e-6
+                assert abs(graph.path_cost(tree.arcs_from(source), weights) - cost) < 1e-6
+
+
+def test_tree_cache_invalidation():
+    connection_info = ConnectionInfo(MAPS[0])
+    graph = RoutingGraph(connection_info)
+    cache = ShortestPathTreeCache(ShortestPathEngine(graph), max_trees=2)
+    cache.get_tree(0)
+    cache.get_tree(0)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # LRU eviction
+    cache.get_tree(1)
+    cache.get_tree(2)
+    assert list(cache.trees.keys()) == [1, 2]
+    # unchanged weights keep the trees, a changed weight drops the trees depending on it
+    assert cache.set_weights(graph.edge_lengths) == []
+    assert len(cache.trees) == 2
+    weights = list(graph.edge_lengths)
+    weights[1] += 10.0
+    cache.set_weights(weights)
+    assert 1 not in cache.trees
+    assert cache.get_tree(1).distance[1] == 0.0
+
+
+if __name__ == "__main__":
+    test_routes_match_reference()
+    test_turn_table_matches_outgoing_edges()
+    test_reverse_tree_matches_forward_search()
+    test_tree_cache_invalidation()
+    print("TEST PASSED")
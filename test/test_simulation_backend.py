@@ -0,0 +1,57 @@
+'''
+Tests for core/simulation_backend.py.
+Needs traci (SUMO_HOME); the libsumo part only runs when libsumo is installed. Run from the main repository:
+    python -m pytest test/test_simulation_backend.py
+'''
+import importlib.util
+from core.simulation_backend import SimulationBackend, TRACI, LIBSUMO, register_backend, using_backend, get_backend_name
+
+
+def test_backend_forwards_to_selected_module():
+    backend = SimulationBackend(TRACI)
+    import traci
+    assert backend.name == TRACI
+    assert backend.vehicle is traci.vehicle
+    assert backend.simulationStep is traci.simulationStep
+    if importlib.util.find_spec(LIBSUMO) is not None:
+        import libsumo
+        backend.use(LIBSUMO)
+        assert backend.vehicle is libsumo.vehicle
+
+
+def test_unknown_backend_is_rejected():
+    backend = SimulationBackend(TRACI)
+    try:
+        backend.use("sumo-gui")
+    except ValueError:
+        pass
+    else:
+        assert False, "expected ValueError"
+    assert backend.name == TRACI
+
+
+def test_registered_backend_is_selectable():
+    class Stub:
+        vehicle = "stub vehicle domain"
+    register_backend("test_stub", Stub)
+    backend = SimulationBackend(TRACI)
+    backend.use("test_stub")
+    assert backend.name == "test_stub"
+    assert backend.vehicle == "stub vehicle domain"
+    try:
+        register_backend(TRACI, Stub)
+    except ValueError:
+        pass
+    else:
+        assert False, "expected ValueError"
+    previous = get_backend_name()
+    with using_backend("test_stub") as selected:
+        assert get_backend_name() == "test_stub" and selected.vehicle == "stub vehicle domain"
+    assert get_backend_name() == previous
+
+
+if __name__ == "__main__":
+    test_backend_forwards_to_selected_module()
+    test_unknown_backend_is_rejected()
+    test_registered_backend_is_selectable()
+    print("TEST PASSED")
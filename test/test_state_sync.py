@@ -0,0 +1,105 @@
+'''
+Tests for the event bookkeeping of core/state_sync.py, on a scripted TraCI stand-in.
+Needs traci (SUMO_HOME), not SUMO itself. Run from the main repository:
+    python -m pytest test/test_state_sync.py
+'''
+import traci.constants as tc
+from core.simulation_backend import using_backend, register_backend
+from core.state_sync import TraciStateSync, VEHICLE_VARIABLES
+
+
+class ScriptedTraci:
+    """
+    Replays [(departed ids, arrived ids, {vehicle_id: edge_id})] one step per update of the state.
+    """
+    def __init__(self, steps):
+        self.steps = steps
+        self.step = -1
+        self.subscriptions = {}
+        self.simulation = self.Simulation(self)
+        self.vehicle = self.Vehicle(self)
+        self.edge = self.Edge()
+
+    class Simulation:
+        def __init__(self, stub):
+            self.stub = stub
+
+        def subscribe(self, varIDs):
+            pass
+
+        def getSubscriptionResults(self):
+            stub = self.stub
+            stub.step += 1
+            departed, arrived, _ = stub.steps[stub.step]
+            for vehicle_id in arrived:
+                stub.subscriptions.pop(vehicle_id, None)
+            return {tc.VAR_TIME: float(stub.step), tc.VAR_DEPARTED_VEHICLES_IDS: departed,
+                    tc.VAR_ARRIVED_VEHICLES_IDS: arrived}
+
+    class Vehicle:
+        def __init__(self, stub):
+            self.stub = stub
+
+        def getIDList(self):
+            return ()
+
+        def subscribe(self, vehicle_id, varIDs):
+            self.stub.subscriptions[vehicle_id] = list(varIDs)
+
+        def getAllSubscriptionResults(self):
+            stub = self.stub
+            roads = stub.steps[stub.step][2]
+            values = {tc.VAR_ROAD_ID: None, tc.VAR_SPEED: 10.0, tc.VAR_MAXSPEED: 20.0}
+            return {vehicle_id: {variable: roads[vehicle_id] if variable == tc.VAR_ROAD_ID else values[variable]
+                                 for variable in variables}
+                    for vehicle_id, variables in stub.subscriptions.items() if vehicle_id in roads}
+
+    class Edge:
+        def subscribe(self, edge, varIDs):
+            pass
+
+        def getAllSubscriptionResults(self):
+            return {}
+
+
+def run_steps(steps, **kwargs):
+    """
+    :return: (TraciStateSync, ScriptedTraci, [vehicle_ids after every update])
+    """
+    stub = ScriptedTraci(steps)
+    register_backend("scripted", stub)
+    with using_backend("scripted"):
+        state = TraciStateSync([], **kwargs)
+        vehicle_ids = []
+        for _ in steps:
+            state.update()
+            vehicle_ids.append(set(state.vehicle_ids))
+    return state, stub, vehicle_ids
+
+
+def test_tracked_vehicles_follow_departures_and_arrivals():
+    steps = [(("a", "b"), ("a",), {"b": "e1"}),
+             (("c",), (), {"b": "e2", "c": "e1"}),
+             (("d",), ("b", "d"), {"c": "e2"})]
+    state, stub, vehicle_ids = run_steps(steps, tracked_vehicles={"b", "d"})
+    # a and d depart and arrive within one step
+    assert vehicle_ids == [{"b"}, {"b", "c"}, {"c"}]
+    assert state.departed_ids == ("d",) and state.arrived_ids == ("b", "d")
+    # the untracked vehicles are counted, not subscribed to
+    assert "c" not in stub.subscriptions
+    assert state.vehicle_road_ids == {}
+
+
+def test_untracked_vehicles_subscribe_to_their_road_with_local_counts():
+    steps = [(("a", "b"), (), {"a": "e1", "b": "e1"}),
+             ((), ("a",), {"b": "e2"})]
+    state, stub, vehicle_ids = run_steps(steps, tracked_vehicles={"b"}, local_edge_counts=True)
+    assert vehicle_ids == [{"a", "b"}, {"b"}]
+    assert stub.subscriptions == {"b": VEHICLE_VARIABLES}
+    assert state.road_id("b") == "e2" and state.speed("b") == 10.0 and state.max_speed("b") == 20.0
+
+
+if __name__ == "__main__":
+    test_tracked_vehicles_follow_departures_and_arrivals()
+    test_untracked_vehicles_subscribe_to_their_road_with_local_counts()
+    print("TEST PASSED")
@@ -0,0 +1,76 @@
+'''
+Tests for core/travel_time.py and the edge speeds of core/meso_simulator.py.
+Needs the maps in configurations/maps and traci/sumolib (SUMO_HOME), not SUMO itself. Run from the main repository:
+    python -m pytest test/test_travel_time.py
+'''
+import numpy as np
+import traci.constants as tc
+from core.Util import ConnectionInfo
+from core.meso_simulator import MesoSimulation
+from core.travel_time import TravelTimeModel
+from traci.exceptions import TraCIException
+
+NET_FILE = "./configurations/maps/simple_grid2.net.xml"
+
+
+def test_free_flow_times():
+    connection_info = ConnectionInfo(NET_FILE)
+    connection_info.edge_travel_times[:] = 0.0
+    model = TravelTimeModel(connection_info)
+    for edge in connection_info.edge_list:
+        index = connection_info.edge_index_dict[edge]
+        assert np.isclose(model.free_flow_times[index],
+                          connection_info.edge_length_dict[edge] / connection_info.edge_speeds[index])
+    assert model.travel_times is connection_info.edge_travel_times
+    assert np.array_equal(model.travel_times, model.free_flow_times)
+
+
+def test_update_smooths_observed_times():
+    connection_info = ConnectionInfo(NET_FILE)
+    model = TravelTimeModel(connection_info, smoothing=0.5, min_speed=1.0)
+    indices = connection_info.edge_list_indices
+    lengths = connection_info.edge_lengths[indices]
+    free_flow = model.free_flow_times[indices].copy()
+    mean_speeds = np.full(len(indices), 2.0)
+    occupancies = np.zeros(len(indices))
+    # occupied at 2 m/s, standing (floored to min_speed) and empty
+    occupancies[:2] = 10.0
+    mean_speeds[1] = 0.0
+    model.update(mean_speeds, occupancies)
+    travel_times = connection_info.edge_travel_times[indices]
+    assert np.isclose(travel_times[0], free_flow[0] + 0.5 * (lengths[0] / 2.0 - free_flow[0]))
+    assert np.isclose(travel_times[1], free_flow[1] + 0.5 * (lengths[1] / 1.0 - free_flow[1]))
+    assert np.allclose(travel_times[2:], free_flow[2:])
+    # emptied edges decay back to free flow
+    for _ in range(50):
+        model.update(mean_speeds, np.zeros(len(indices)))
+    assert np.allclose(connection_info.edge_travel_times[indices], free_flow)
+
+
+def test_meso_edge_speeds_and_occupancies():
+    connection_info = ConnectionInfo(NET_FILE)
+    simulation = MesoSimulation(connection_info)
+    edge = connection_info.edge_list[0]
+    speed_limit = connection_info.edge_speeds[connection_info.edge_index_dict[edge]]
+    assert simulation.edge.getLastStepMeanSpeed(edge) == speed_limit
+    assert simulation.edge.getLastStepOccupancy(edge) == 0.0
+    # computed once per step for all edges
+    mean_speeds = simulation.edge_mean_speeds()
+    assert simulation.edge_mean_speeds() is mean_speeds and simulation.edge_occupancies() is simulation.edge_occupancies()
+    simulation.step()
+    assert simulation.edge_mean_speeds() is not mean_speeds
+    simulation.edge.subscribe(edge, [tc.LAST_STEP_MEAN_SPEED, tc.LAST_STEP_OCCUPANCY])
+    assert simulation.edge.getAllSubscriptionResults() == {
+        edge: {tc.LAST_STEP_MEAN_SPEED: speed_limit, tc.LAST_STEP_OCCUPANCY: 0.0}}
+    try:
+        simulation.edge.subscribe(edge, [tc.VAR_LENGTH])
+        assert False
+    except TraCIException:
+        pass
+
+
+if __name__ == "__main__":
+    test_free_flow_times()
+    test_update_smooths_observed_times()
+    test_meso_edge_speeds_and_occupancies()
+    print("TEST PASSED")